@@ -2,15 +2,22 @@ import React, { useState, useEffect } from "react";
 import Navbar from "../components/Navbar";
 import AdminNavbar from "../components/adminNav";
 
+const SCHEDULE_FIELDS = "_id,ward,lastEmptiedAt,predictedApproxTime,predictedEmptyingDateTime";
+const PAGE_SIZE = 200;
+
 const Schedule = () => {
   const [predictions, setPredictions] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [queryIndex, setQueryIndex] = useState("");
   const [singlePrediction, setSinglePrediction] = useState(null);
   const [error, setError] = useState("");
 
-  // Fetch all predictions on component mount
-  useEffect(() => {
-    fetch("http://127.0.0.1:5000/schedule")
+  // Only the columns rendered below, one page at a time
+  const fetchPage = (cursor) => {
+    const params = new URLSearchParams({ fields: SCHEDULE_FIELDS, limit: PAGE_SIZE });
+    if (cursor) params.set("cursor", cursor);
+    return fetch(`http://127.0.0.1:5000/schedule?${params}`)
       .then((response) => {
         if (!response.ok) {
           throw new Error("Failed to fetch predictions.");
@@ -18,14 +25,25 @@ const Schedule = () => {
         return response.json();
       })
       .then((data) => {
-        setPredictions(data.rec || []);
+        setPredictions((prev) => (cursor ? [...prev, ...(data.rec || [])] : data.rec || []));
+        setNextCursor(data.page?.nextCursor || null);
       })
       .catch((err) => {
         console.error(err);
         setError(err.message);
       });
+  };
+
+  // Fetch the first page of predictions on component mount
+  useEffect(() => {
+    fetchPage(null);
   }, []);
 
+  const loadMore = () => {
+    setLoadingMore(true);
+    fetchPage(nextCursor).finally(() => setLoadingMore(false));
+  };
+
   // Handle form submission for single prediction
   const handleSubmit = (e) => {
     e.preventDefault();
@@ -79,13 +97,25 @@ const Schedule = () => {
                 <td className="border border-gray-300 px-4 py-2">{item._id}</td>
                 <td className="border border-gray-300 px-4 py-2">{item.ward}</td>
                 <td className="border border-gray-300 px-4 py-2">{item.lastEmptiedAt}</td>
-                <td className="border border-gray-300 px-4 py-2">{item.predictedApproxTime.toFixed(2)}</td>
-                <td className="border border-gray-300 px-4 py-2">{item.predictedEmptyingDateTime}</td>
+                <td className="border border-gray-300 px-4 py-2">{item.predictedApproxTime != null ? item.predictedApproxTime.toFixed(2) : "—"}</td>
+                <td className="border border-gray-300 px-4 py-2">{item.predictedEmptyingDateTime ?? "—"}</td>
               </tr>
             ))}
           </tbody>
         </table>
       </div>
+
+      {nextCursor && (
+        <div className="text-center mt-4">
+          <button
+            onClick={loadMore}
+            disabled={loadingMore}
+            className="px-4 py-2 bg-blue-500 text-white rounded-lg hover:bg-blue-600 disabled:opacity-50"
+          >
+            {loadingMore ? "Loading..." : "Load more"}
+          </button>
+        </div>
+      )}
       
       {/* <h2 className="text-xl font-semibold mt-6 mb-4">Get Prediction for a Specific Bin</h2>
       <form onSubmit={handleSubmit} className="flex flex-col md:flex-row items-center gap-4">
@@ -0,0 +1,109 @@
+"""
+Micro-benchmark: row-wise DataFrame.apply vs the vectorized bin_math module.
+
+Runs the /schedule, /ml/forecast and /ml/priority computations on synthetic
+fleets and prints per-request latency for each path.
+
+Usage: python benchmarks/bench_bin_math.py [sizes...]
+"""
+
+import os
+import sys
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import bin_math  # noqa: E402
+
+
+def synthetic_bins(n, seed=42):
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp('2025-04-01 12:00:00')
+    return pd.DataFrame({
+        'totalCapacity': np.full(n, 100.0),
+        'realTimeCapacity': rng.integers(0, 101, n).astype(float),
+        'wasteQuantityPerDay': np.round(rng.uniform(5, 30, n), 2),
+        'lastEmptiedAt': now - pd.to_timedelta(rng.integers(0, 14 * 24 * 3600, n), unit='s'),
+        'status': rng.choice(['filled', 'partially_filled', 'empty', None], n),
+        'sensorEnabled': rng.random(n) < 0.7,
+    })
+
+
+def legacy(data, now):
+    data = data.copy()
+    data['predictedApproxTime'] = (data['totalCapacity'] - data['realTimeCapacity']) / (data['wasteQuantityPerDay'] / 24)
+    data['predictedEmptyingDateTime'] = data.apply(
+        lambda row: (row['lastEmptiedAt'] + timedelta(hours=row['predictedApproxTime'])).strftime('%Y-%m-%d %H:%M:%S'),
+        axis=1
+    )
+
+    def determine_status(row):
+        capacity_ratio = row['realTimeCapacity'] / row['totalCapacity']
+        if capacity_ratio >= 0.8:
+            return "filled"
+        elif 0.3 <= capacity_ratio < 0.8:
+            return "partially_filled"
+        return "empty"
+
+    data['newStatus'] = data.apply(determine_status, axis=1)
+
+    per_hour = (data['wasteQuantityPerDay'] / 24.0).replace({0.0: 1e-6})
+    data['hoursUntilFull'] = (data['totalCapacity'] - data['realTimeCapacity']) / per_hour
+    data['predictedFullDateTime'] = data.apply(
+        lambda row: (now + timedelta(hours=float(max(row['hoursUntilFull'], 0)))).strftime('%Y-%m-%d %H:%M:%S'),
+        axis=1
+    )
+
+    def status_weight(row):
+        status = row.get('status')
+        if not isinstance(status, str):
+            ratio = row['realTimeCapacity'] / max(row['totalCapacity'], 1e-6)
+            status = 'filled' if ratio >= 0.85 else ('partially_filled' if ratio >= 0.5 else 'empty')
+        return 3 if status == 'filled' else (2 if status == 'partially_filled' else 0)
+
+    data['statusW'] = data.apply(status_weight, axis=1)
+    return data
+
+
+def vectorized(data, now):
+    out = {}
+    out['predictedApproxTime'] = bin_math.hours_until_full(
+        data['totalCapacity'], data['realTimeCapacity'], data['wasteQuantityPerDay']
+    )
+    out['predictedEmptyingDateTime'] = bin_math.add_hours(data['lastEmptiedAt'], out['predictedApproxTime'])
+    out['newStatus'] = bin_math.fill_status(data['realTimeCapacity'], data['totalCapacity'])
+    out['hoursUntilFull'] = out['predictedApproxTime']
+    out['predictedFullDateTime'] = bin_math.add_hours(now, np.clip(out['hoursUntilFull'], 0, None))
+    out['statusW'] = bin_math.status_weight(data['status'], data['realTimeCapacity'], data['totalCapacity'])
+    return out
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(sizes):
+    now = pd.Timestamp('2025-04-01 12:00:00')
+    print(f"{'bins':>8} {'apply (ms)':>12} {'vectorized (ms)':>16} {'speedup':>8}")
+    for n in sizes:
+        data = synthetic_bins(n)
+        repeat = 3 if n <= 10_000 else 1
+        t_old, old = best_of(lambda: legacy(data, now), repeat)
+        t_new, new = best_of(lambda: vectorized(data, now), max(repeat, 3))
+
+        for col in ('predictedEmptyingDateTime', 'newStatus', 'predictedFullDateTime', 'statusW'):
+            assert list(old[col]) == list(new[col]), f"{col} differs at n={n}"
+
+        print(f"{n:>8} {t_old * 1e3:>12.1f} {t_new * 1e3:>16.1f} {t_old / t_new:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000])
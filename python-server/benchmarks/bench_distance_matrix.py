@@ -0,0 +1,74 @@
+"""
+Micro-benchmark: distance_matrix.DistanceMatrix against computing haversine
+per request.
+
+For each fleet size it times the first build, a sync after 1% of the bins
+moved and 0.5% were added, and a 2,000-stop route matrix taken from the
+cache vs computed directly. Sizes above the dense limit use the sparse
+k-nearest-neighbour mode.
+
+Usage: python benchmarks/bench_distance_matrix.py [sizes...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bin_geo import pairwise_km  # noqa: E402
+from distance_matrix import DistanceMatrix  # noqa: E402
+
+DEPOT = (18.52, 73.85)
+ROUTE_STOPS = 2000
+
+
+def synthetic_bins(n, seed=42):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        '_id': [f"bin{i}" for i in range(n)],
+        'locn.latitude': DEPOT[0] + rng.normal(0, 0.05, n),
+        'locn.longitude': DEPOT[1] + rng.normal(0, 0.05, n),
+    })
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main(sizes):
+    print(f"{'bins':>7} {'mode':>7} {'build (s)':>10} {'resync (ms)':>12} {'route cached (ms)':>18} "
+          f"{'route direct (ms)':>18}")
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as root:
+            frame = synthetic_bins(n)
+            matrix = DistanceMatrix(root)
+            t_build, _ = timed(matrix.sync, frame, 1)
+
+            moved = frame.copy()
+            rows = rng.choice(n, n // 100, replace=False)
+            moved.loc[rows, 'locn.latitude'] += 0.001
+            added = synthetic_bins(n // 200, seed=7)
+            added['_id'] = [f"new{i}" for i in range(len(added))]
+            moved = pd.concat([moved, added], ignore_index=True)
+            t_sync, _ = timed(matrix.sync, moved, 2)
+
+            stops = rng.choice(len(moved), min(ROUTE_STOPS, len(moved)), replace=False)
+            t_cached, cached = timed(matrix.route_matrix, stops, DEPOT)
+            lat = np.r_[DEPOT[0], moved['locn.latitude'].to_numpy()[stops]]
+            lon = np.r_[DEPOT[1], moved['locn.longitude'].to_numpy()[stops]]
+            t_direct, direct = timed(pairwise_km, lat, lon)
+            assert np.allclose(cached, direct, atol=1e-3)
+
+            print(f"{n:>7} {matrix.mode:>7} {t_build:>10.2f} {t_sync * 1e3:>12.1f} {t_cached * 1e3:>18.1f} "
+                  f"{t_direct * 1e3:>18.1f}")
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [2_000, 8_000, 100_000])
@@ -0,0 +1,75 @@
+"""
+Micro-benchmark: fleet-wide fill-rate fit (fill_forecast) on synthetic history.
+
+Each bin fills at its own rate with sensor noise and is emptied once it is
+full. The history is recorded hourly into a temporary FillHistory, then the
+window read and the weighted least-squares fit are timed separately, and the
+fitted rates are checked against the true ones.
+
+Usage: python benchmarks/bench_forecast.py [sizes...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from fill_forecast import WINDOW, FillForecaster, current_cycle, fit_fill_rates  # noqa: E402
+from fill_history import FillHistory  # noqa: E402
+
+HOURS = 72
+START = 1_700_000_000
+
+
+def synthetic_history(history, n, seed=42):
+    rng = np.random.default_rng(seed)
+    ids = np.array([f"bin{i}" for i in range(n)], dtype=object)
+    rate = rng.uniform(0.5, 4.0, n)
+    level = rng.uniform(0, 50, n)
+    for hour in range(HOURS):
+        level = level + rate
+        level[level > 100] = rng.uniform(0, 5, int((level > 100).sum()))
+        reading = np.clip(level + rng.normal(0, 0.5, n), 0, 100)
+        history.record(ids, reading, np.full(n, START + hour * 3600))
+    return pd.DataFrame({
+        '_id': ids,
+        'totalCapacity': np.full(n, 100.0),
+        'realTimeCapacity': reading,
+        'wasteQuantityPerDay': rate * 24,
+    }), rate
+
+
+def main(sizes):
+    print(f"{'bins':>8} {'window (ms)':>12} {'fit (ms)':>9} {'estimate (ms)':>14} {'median |err|':>13} {'in 95%':>7}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as root:
+            history = FillHistory(root, slots=WINDOW)
+            frame, true_rate = synthetic_history(history, n)
+            forecaster = FillForecaster(history)
+            ids = frame['_id'].to_numpy()
+
+            start = time.perf_counter()
+            times, values, mask = history.window(ids, WINDOW)
+            t_window = time.perf_counter() - start
+
+            start = time.perf_counter()
+            rate, stderr, _ = fit_fill_rates(times, values, current_cycle(values, mask, frame['totalCapacity']))
+            t_fit = time.perf_counter() - start
+
+            start = time.perf_counter()
+            forecaster.estimate(frame)
+            t_total = time.perf_counter() - start
+
+            fitted = ~np.isnan(rate)
+            err = np.abs(rate - true_rate)[fitted]
+            covered = (err <= 1.96 * stderr[fitted]).mean()
+            print(f"{n:>8} {t_window * 1e3:>12.1f} {t_fit * 1e3:>9.1f} {t_total * 1e3:>14.1f} "
+                  f"{np.median(err):>13.3f} {covered:>6.0%}")
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000])
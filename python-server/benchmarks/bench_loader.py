@@ -0,0 +1,87 @@
+"""
+Benchmark: full-document DataFrame loading vs projected columnar loading.
+
+Each path runs in a fresh subprocess so its peak RSS can be read from
+getrusage. Needs a reachable MongoDB with bins in the target collection.
+
+Usage: python benchmarks/bench_loader.py [--uri URI] [--db NAME] [--collection NAME]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_path(path, uri, db_name, coll_name):
+    import pandas as pd
+    from pymongo import MongoClient
+
+    from bin_columnar import profile_fields, read_bins
+
+    collection = MongoClient(uri)[db_name][coll_name]
+    baseline_rss = _peak_rss_mb()
+    start = time.perf_counter()
+    if path == 'documents':
+        frame = pd.DataFrame(list(collection.find()))
+        # Bytes for whole documents, measured the same way as the columnar path
+        received = sum(len(b) for b in collection.find_raw_batches({}))
+    else:
+        frame, stats = read_bins(
+            collection, {}, profile_fields('schedule', 'forecast', 'anomalies', 'priority'),
+            size_hint=collection.estimated_document_count(),
+        )
+        received = stats["bytes"]
+    elapsed = time.perf_counter() - start
+    return {
+        "path": path,
+        "rows": len(frame),
+        "seconds": elapsed,
+        "bytes": received,
+        "frame_mb": frame.memory_usage(deep=True).sum() / (1024 * 1024),
+        "peak_rss_mb": _peak_rss_mb(),
+        "baseline_rss_mb": baseline_rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--uri', default='mongodb://localhost:27017/waste-management')
+    parser.add_argument('--db', default='waste-management')
+    parser.add_argument('--collection', default='wastebins')
+    parser.add_argument('--path', choices=['documents', 'columnar'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.path:
+        print(json.dumps(run_path(args.path, args.uri, args.db, args.collection)))
+        return
+
+    results = []
+    for path in ('documents', 'columnar'):
+        out = subprocess.run(
+            [sys.executable, __file__, '--uri', args.uri, '--db', args.db,
+             '--collection', args.collection, '--path', path],
+            check=True, capture_output=True, text=True,
+        )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"{'path':>10} {'rows':>9} {'seconds':>9} {'MB sent':>9} {'frame MB':>9} {'peak RSS MB':>12}")
+    for r in results:
+        print(f"{r['path']:>10} {r['rows']:>9} {r['seconds']:>9.3f} {r['bytes'] / 1048576:>9.2f} "
+              f"{r['frame_mb']:>9.2f} {r['peak_rss_mb'] - r['baseline_rss_mb']:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Micro-benchmark: the original SPM preprocess_bins (Series.apply status) vs
+the vectorized, validated bin_preprocess.preprocess_bins.
+
+Synthetic fleets look like the columnar loader output: float32 capacities,
+wasteQuantityPerDay as "12.34 tonnes" text, plus a few zero-capacity bins
+and junk values. Results are checked to agree on the valid rows.
+
+Usage: python benchmarks/bench_preprocess.py [sizes...]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bin_preprocess import preprocess_bins  # noqa: E402
+
+
+def synthetic_bins(n, seed=42):
+    rng = np.random.default_rng(seed)
+    total = np.full(n, 100.0, dtype='float32')
+    total[rng.random(n) < 0.01] = 0.0
+    per_day = np.char.add(np.round(rng.uniform(5, 30, n), 2).astype(str), ' tonnes').astype(object)
+    per_day[rng.random(n) < 0.005] = 'unknown'
+    return pd.DataFrame({
+        '_id': np.arange(n),
+        'ward': rng.choice(['Ward 1', 'Ward 2', 'Ward 3'], n),
+        'totalCapacity': total,
+        'realTimeCapacity': rng.integers(0, 101, n).astype('float32'),
+        'wasteQuantityPerDay': per_day,
+    })
+
+
+def legacy(bins_df):
+    bins_df['wasteQuantityPerDay'] = pd.to_numeric(
+        bins_df['wasteQuantityPerDay'].astype(str).str.replace(' tonnes', ''),
+        errors='coerce'
+    ).fillna(0.0)
+    bins_df['totalCapacity'] = pd.to_numeric(bins_df['totalCapacity'], errors='coerce').astype('float64').fillna(0.0)
+    bins_df['realTimeCapacity'] = pd.to_numeric(bins_df['realTimeCapacity'], errors='coerce').astype('float64').fillna(0.0)
+    bins_df['capacity_ratio'] = bins_df['realTimeCapacity'] / bins_df['totalCapacity']
+    bins_df['remaining_capacity'] = bins_df['totalCapacity'] - bins_df['realTimeCapacity']
+    bins_df['fill_rate'] = bins_df['wasteQuantityPerDay'] / 24.0
+    bins_df['status'] = bins_df['capacity_ratio'].apply(
+        lambda x: 'filled' if x >= 0.8 else ('partially_filled' if x >= 0.3 else 'empty')
+    )
+    return bins_df
+
+
+def best_of(fn, make_input, repeat):
+    timings = []
+    for _ in range(repeat):
+        data = make_input()
+        start = time.perf_counter()
+        result = fn(data)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(sizes):
+    print(f"{'bins':>9} {'legacy (ms)':>12} {'vectorized (ms)':>16} {'speedup':>8}  quality")
+    for n in sizes:
+        raw = synthetic_bins(n)
+        repeat = 3 if n <= 100_000 else 1
+        t_old, old = best_of(legacy, raw.copy, repeat)
+        t_new, (new, report) = best_of(preprocess_bins, raw.copy, repeat)
+
+        valid = (old['totalCapacity'] > 0).to_numpy()
+        for col in ('capacity_ratio', 'remaining_capacity', 'fill_rate', 'status'):
+            assert list(old[col][valid]) == list(new[col][valid]), f"{col} differs at n={n}"
+        assert np.isfinite(new['capacity_ratio']).all()
+
+        quality = f"zeroCapacity={report['zeroCapacity']} coerced={report['coerced']['wasteQuantityPerDay']}"
+        print(f"{n:>9} {t_old * 1e3:>12.1f} {t_new * 1e3:>16.1f} {t_old / t_new:>7.1f}x  {quality}")
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
@@ -0,0 +1,131 @@
+"""
+Benchmark: /ml/rollups computed by a MongoDB aggregation vs from the
+in-memory snapshot.
+
+The seed bins in data/waste_bin_data.json are scaled up to each size (wards,
+zones, categories, statuses and sensor flags resampled; capacities and the
+"NN tonnes" strings jittered) and written to a scratch collection. For each
+size it times:
+
+- snapshot: loading the projected collection into a frame (what a cold
+  snapshot costs) and the rollup over the loaded frame,
+- mongo: the aggregation pipeline without and with ROLLUP_INDEXES, for all
+  bins and for one ward,
+
+and checks that both paths return the same rollups.
+
+Needs a MongoDB server: MONGO_URI (default mongodb://localhost:27017); the
+collection ecotrack_bench.wastebins is dropped and refilled.
+
+Usage: python benchmarks/bench_rollups.py [sizes...]
+"""
+
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bin_columnar import profile_fields, read_bins  # noqa: E402
+from bin_rollups import ROLLUP_INDEXES, BinRollups, frame_rollups  # noqa: E402
+
+SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'waste_bin_data.json')
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017')
+INSERT_CHUNK = 10_000
+
+
+def scaled_bins(n, seed=42):
+    with open(SEED_FILE) as f:
+        base = json.load(f)
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(base), n)
+    ratio = rng.beta(2, 2, n)
+    tonnes = rng.gamma(4, 8, n)
+    for i, p in enumerate(picks):
+        src = base[p]
+        yield {
+            '_id': ObjectId(),
+            'ward': src.get('ward'),
+            'zone': src.get('zone'),
+            'category': src.get('category'),
+            'status': src.get('status'),
+            'sensorEnabled': bool(rng.random() < 0.7) if i % 50 else None,
+            'totalCapacity': 100,
+            'realTimeCapacity': int(ratio[i] * 100),
+            'wasteQuantityPerDay': f"{tonnes[i]:.2f} tonnes",
+        }
+
+
+def normalize(frame):
+    # As server._normalize_bins does for the fields the rollups read
+    frame['wasteQuantityPerDay'] = pd.to_numeric(
+        frame['wasteQuantityPerDay'].astype(str).str.replace(' tonnes', '', regex=False), errors='coerce'
+    ).fillna(0.0)
+    return frame
+
+
+def fill(collection, n):
+    collection.drop()
+    chunk = []
+    for doc in scaled_bins(n):
+        chunk.append(doc)
+        if len(chunk) == INSERT_CHUNK:
+            collection.insert_many(chunk, ordered=False)
+            chunk = []
+    if chunk:
+        collection.insert_many(chunk, ordered=False)
+
+
+def best_of(fn, repeat=3):
+    best, result = math.inf, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def same(a, b):
+    return len(a) == len(b) and all(
+        x.keys() == y.keys() and all(
+            math.isclose(x[k], y[k], rel_tol=1e-9) if isinstance(x[k], float) else x[k] == y[k] for k in x
+        )
+        for x, y in zip(a, b)
+    )
+
+
+def main(sizes):
+    collection = MongoClient(MONGO_URI)['ecotrack_bench']['wastebins']
+    print(f"{'bins':>9} {'load (s)':>9} {'frame (ms)':>11} {'mongo (ms)':>11} {'indexed (ms)':>13} "
+          f"{'frame ward (ms)':>16} {'indexed ward (ms)':>18}")
+    for n in sizes:
+        fill(collection, n)
+        # Indexes are created by hand below, after timing the pipeline without them
+        rollups = BinRollups(collection, cache=None, indexes=())
+
+        t_load, frame = best_of(lambda: normalize(read_bins(collection, fields=profile_fields('rollups'))), 1)
+        t_frame, from_frame = best_of(lambda: frame_rollups(frame, 'zone'))
+        t_mongo, from_mongo = best_of(lambda: rollups.aggregate('zone'))
+        assert same(from_frame, from_mongo), "snapshot and aggregation rollups differ"
+
+        for keys in ROLLUP_INDEXES:
+            collection.create_index(keys)
+        ward = {'ward': [frame['ward'].mode().iloc[0]]}
+        t_indexed, _ = best_of(lambda: rollups.aggregate('zone'))
+        t_frame_ward, ward_frame = best_of(lambda: frame_rollups(frame, 'zone', ward))
+        t_indexed_ward, ward_mongo = best_of(lambda: rollups.aggregate('zone', ward))
+        assert same(ward_frame, ward_mongo), "filtered rollups differ"
+
+        print(f"{n:>9} {t_load:>9.2f} {t_frame * 1e3:>11.1f} {t_mongo * 1e3:>11.1f} {t_indexed * 1e3:>13.1f} "
+              f"{t_frame_ward * 1e3:>16.1f} {t_indexed_ward * 1e3:>18.1f}")
+    collection.drop()
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
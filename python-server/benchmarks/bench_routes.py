@@ -0,0 +1,53 @@
+"""
+Micro-benchmark: bin_routes.plan_routes on synthetic city-sized fleets.
+
+Bins are scattered around a depot in a few dense clusters. For each
+(bins, trucks) case it prints the time taken, the distance after nearest
+neighbour and after local search, and how many bins were routed. It also
+checks that every stop is visited once and that no truck is overloaded.
+
+Usage: python benchmarks/bench_routes.py [time_budget_seconds]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bin_routes import plan_routes  # noqa: E402
+
+DEPOT = (18.52, 73.85)
+CASES = [(500, 2), (2000, 5), (5000, 10), (5000, 25)]
+
+
+def synthetic_bins(n, seed=42):
+    rng = np.random.default_rng(seed)
+    centers = DEPOT + rng.normal(0, 0.06, (8, 2))
+    which = rng.integers(0, len(centers), n)
+    points = centers[which] + rng.normal(0, 0.015, (n, 2))
+    return points[:, 0], points[:, 1], rng.uniform(20, 100, n)
+
+
+def main(time_budget):
+    print(f"{'bins':>6} {'trucks':>6} {'seconds':>8} {'NN km':>9} {'final km':>9} {'routed':>7}")
+    for n, trucks in CASES:
+        lat, lon, demand = synthetic_bins(n)
+        # Enough room for about 90% of the demand
+        capacities = [demand.sum() * 0.9 / trucks] * trucks
+
+        start = time.perf_counter()
+        plan = plan_routes(lat, lon, demand, DEPOT, capacities, time_budget)
+        elapsed = time.perf_counter() - start
+
+        stops = np.concatenate([r["stops"] for r in plan["routes"]])
+        assert len(np.unique(stops)) == len(stops)
+        assert all(r["load"] <= c + 1e-6 for r, c in zip(plan["routes"], capacities))
+        stats = plan["stats"]
+        print(f"{n:>6} {trucks:>6} {elapsed:>8.2f} {stats['initialKm']:>9.1f} {stats['distanceKm']:>9.1f} "
+              f"{stats['routed']:>7}")
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 2.0)
@@ -0,0 +1,89 @@
+"""
+Startup benchmark: import time and first-request latency of the two servers.
+
+Each server module is imported in a fresh interpreter, twice:
+
+- under `python -X importtime`, to list the packages that take the longest
+  to import (self time of all their modules, so numpy, pandas, sklearn,
+  tensorflow... are not counted inside each other),
+- plainly, to time the import itself and then the first and second request
+  through the Flask test client. The first request includes the warm-up
+  (the MongoDB data load of the SPM server, the first snapshot of the ML
+  server), so it needs the MongoDB the servers are configured for.
+
+Usage: python benchmarks/bench_startup.py [--top N] [module ...]
+"""
+
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# module -> endpoint timed for the first request
+SERVERS = {
+    'server': '/ml/priority',
+    'spm_enhanced_models': '/spm/models/status',
+}
+
+REQUEST_TIMING = '''
+import importlib, json, time
+start = time.perf_counter()
+module = importlib.import_module({module!r})
+imported = time.perf_counter()
+client = module.app.test_client()
+first = client.get({path!r})
+first_done = time.perf_counter()
+client.get({path!r})
+second_done = time.perf_counter()
+print(json.dumps({{"import": imported - start, "first": first_done - imported,
+                  "second": second_done - first_done, "status": first.status_code}}))
+'''
+
+
+def run(args):
+    return subprocess.run([sys.executable, *args], cwd=SERVER_DIR, capture_output=True, text=True)
+
+
+def import_profile(module):
+    """{top-level package: import seconds of its own modules} from -X importtime"""
+    out = run(['-X', 'importtime', '-c', f'import {module}'])
+    if out.returncode:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1])
+    totals = defaultdict(float)
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|', 2)
+        if not self_us.strip().isdigit():
+            continue  # the header row
+        totals[name.strip().split('.')[0]] += int(self_us) / 1e6
+    return totals
+
+
+def request_timing(module, path):
+    out = run(['-c', REQUEST_TIMING.format(module=module, path=path)])
+    if out.returncode:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1])
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(modules, top):
+    for module in modules:
+        totals = import_profile(module)
+        timing = request_timing(module, SERVERS[module])
+        print(f"{module}: import {timing['import']:.2f} s, first request {timing['first'] * 1e3:.0f} ms "
+              f"(HTTP {timing['status']}), second {timing['second'] * 1e3:.1f} ms")
+        print("  slowest imports (-X importtime, self time per package):")
+        for name, seconds in sorted(totals.items(), key=lambda item: -item[1])[:top]:
+            print(f"  {seconds:>8.3f} s  {name}")
+
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    top = 10
+    if argv[:1] == ['--top']:
+        top, argv = int(argv[1]), argv[2:]
+    main(argv or list(SERVERS), top)
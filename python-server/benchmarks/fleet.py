@@ -0,0 +1,132 @@
+"""
+Synthetic fleets modeled on data/waste_bin_data.json, for the benchmarks.
+
+fleet_documents(n) returns n wastebins documents shaped like the seed bins.
+Ward, zone, category and status are drawn as whole seed rows, so they keep
+the seed's proportions and its ward -> zone pairs. Coordinates are
+scattered a few hundred metres around the drawn seed bin. Each bin has
+realTimeCapacity out of a totalCapacity of 100, an "NN tonnes" daily
+quantity and a sensorEnabled flag. All but NEVER_EMPTIED_SHARE of the bins
+have a lastEmptiedAt within the week before `now`; the rest have none, as
+bins that were never emptied.
+
+user_documents() and report_documents() add users and user reports. Each
+report carries a small grayscale PNG attachment, as uploaded reports do.
+Everything is seeded, ObjectIds included, and `now` defaults to the fixed
+FLEET_NOW, so the same n gives the same fleet.
+"""
+
+import json
+import os
+import struct
+import uuid
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+from bson import ObjectId
+
+SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'waste_bin_data.json')
+
+# Spread of the generated bins around their seed bin (degrees, about 400 m)
+SCATTER_DEGREES = 0.004
+REPORT_STATUSES = ('full', 'damaged', 'needs maintenance', 'partially filled', 'done')
+ATTACHMENT_SIZE = 64
+# Share of the bins without a lastEmptiedAt
+NEVER_EMPTIED_SHARE = 0.05
+FLEET_NOW = datetime(2025, 1, 1)
+
+
+def _seed_bins():
+    with open(SEED_FILE) as f:
+        return json.load(f)
+
+
+def _object_ids(rng, n):
+    raw = rng.bytes(12 * n)
+    return [ObjectId(raw[12 * i:12 * (i + 1)]) for i in range(n)]
+
+
+def fleet_documents(n, seed=42, now=FLEET_NOW):
+    base = _seed_bins()
+    rng = np.random.default_rng(seed)
+
+    picks = rng.integers(0, len(base), n)
+    lat = np.array([b['locn']['latitude'] for b in base])[picks] + rng.normal(0, SCATTER_DEGREES, n)
+    lon = np.array([b['locn']['longitude'] for b in base])[picks] + rng.normal(0, SCATTER_DEGREES, n)
+    fill = np.round(rng.beta(2, 2, n) * 100).astype(int)
+    tonnes = rng.gamma(4, 6, n)
+    sensor_share = np.mean([bool(b.get('sensorEnabled')) for b in base])
+    sensor = rng.random(n) < sensor_share
+    emptied_ago = rng.uniform(0, 7 * 24 * 3600, n)
+    approx_hours = rng.integers(1, 13, n)
+    ids = rng.bytes(16 * n)
+    object_ids = _object_ids(rng, n)
+    emptied = rng.random(n) >= NEVER_EMPTIED_SHARE
+
+    docs = []
+    for i in range(n):
+        src = base[picks[i]]
+        doc = {
+            '_id': object_ids[i],
+            'id': str(uuid.UUID(bytes=ids[16 * i:16 * (i + 1)], version=4)),
+            'totalCapacity': 100,
+            'realTimeCapacity': int(fill[i]),
+            'approxTime': f"{approx_hours[i]} hrs",
+            'locn': {'latitude': float(lat[i]), 'longitude': float(lon[i])},
+            'category': src['category'],
+            'status': src['status'],
+            'sensorEnabled': bool(sensor[i]),
+            'ward': src['ward'],
+            'zone': src.get('zone'),
+            'wasteQuantityPerDay': f"{tonnes[i]:.2f} tonnes",
+            'updatedAt': now,
+        }
+        if emptied[i]:
+            doc['lastEmptiedAt'] = now - timedelta(seconds=float(emptied_ago[i]))
+        docs.append(doc)
+    return docs
+
+
+def user_documents(n, seed=42):
+    rng = np.random.default_rng(seed + 1)
+    object_ids = _object_ids(rng, n)
+    return [
+        {
+            '_id': object_ids[i],
+            'name': f"User {i}",
+            'email': f"user{i}@example.com",
+            'phoneNo': f"9{rng.integers(10 ** 8, 10 ** 9)}",
+            'password': 'x' * 60,
+            'isAdmin': i == 0,
+        }
+        for i in range(n)
+    ]
+
+
+def _png(size, rng):
+    """A size x size grayscale PNG of noise, readable by the thumbnail path."""
+    rows = b''.join(b'\x00' + rng.integers(0, 256, size, dtype=np.uint8).tobytes() for _ in range(size))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    header = struct.pack('>IIBBBBB', size, size, 8, 0, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b'')
+
+
+def report_documents(bins, users, n, seed=42):
+    rng = np.random.default_rng(seed + 2)
+    object_ids = _object_ids(rng, n)
+    return [
+        {
+            '_id': object_ids[i],
+            'bin': bins[rng.integers(len(bins))]['_id'],
+            'user_id': users[rng.integers(len(users))]['_id'],
+            'status': REPORT_STATUSES[rng.integers(len(REPORT_STATUSES))],
+            'attachment': {'data': _png(ATTACHMENT_SIZE, rng), 'contentType': 'image/png'},
+            'description': f"Report {i}",
+            'admin_status': 'pending',
+        }
+        for i in range(n)
+    ]
@@ -0,0 +1,106 @@
+"""
+MongoDB stand-in for the benchmarks.
+
+install() makes pymongo.MongoClient return one shared client, so that
+server.py and spm_enhanced_models.py, imported afterwards, talk to it
+instead of mongodb://localhost. By default the client is an in-memory
+mongomock client. Pass a uri to use a real server instead; point it at a
+scratch server, because the servers' database name ("waste-management")
+is fixed.
+
+mongomock lacks two calls the servers make, so they are added here:
+find_raw_batches (bin_columnar.read_bins) and bulk_write of pymongo's
+UpdateOne ops (bin_writeback). Both work on mongomock's document store
+directly. find() deep-copies every document it looks at and update_one
+scans the whole collection for each op, and either would dominate the
+timings from about 10k bins.
+"""
+
+from datetime import datetime
+
+import bson
+import pymongo
+
+try:
+    import mongomock
+    import mongomock.collection
+    from mongomock.filtering import filter_applies
+    MONGOMOCK_AVAILABLE = True
+except ImportError:
+    MONGOMOCK_AVAILABLE = False
+
+
+def _include(doc, projection):
+    """doc reduced to an inclusion projection ({field: 1}, dotted paths allowed)."""
+    if not projection:
+        return doc
+    out = {'_id': doc['_id']} if projection.get('_id', 1) else {}
+    for field, keep in projection.items():
+        if not keep or field == '_id':
+            continue
+        *parents, leaf = field.split('.')
+        src, dst = doc, out
+        for part in parents:
+            src = src.get(part)
+            if not isinstance(src, dict):
+                break
+            dst = dst.setdefault(part, {})
+        else:
+            if leaf in src:
+                dst[leaf] = src[leaf]
+    return out
+
+
+def _find_raw_batches(self, filter=None, projection=None, batch_size=101, **kwargs):
+    batch = []
+    for doc in self._store._documents.values():
+        if filter and not filter_applies(filter, doc):
+            continue
+        batch.append(bson.encode(_include(doc, projection)))
+        if len(batch) == batch_size:
+            yield b''.join(batch)
+            batch = []
+    if batch:
+        yield b''.join(batch)
+
+
+def _bulk_write(self, requests, ordered=True, **kwargs):
+    documents = self._store._documents
+    for op in requests:
+        flt, update = op._filter, op._doc
+        doc = documents.get(flt['_id']) if list(flt) == ['_id'] else None
+        if doc is None or not set(update) <= {'$set', '$currentDate'}:
+            self.update_one(flt, update, upsert=getattr(op, '_upsert', False))
+            continue
+        doc.update(update.get('$set', {}))
+        for field in update.get('$currentDate', {}):
+            doc[field] = datetime.utcnow()
+
+
+def patch_mongomock():
+    """Add find_raw_batches and bulk_write to mongomock collections."""
+    if not MONGOMOCK_AVAILABLE:
+        raise RuntimeError("mongomock is not installed; pass a MongoDB uri instead")
+    mongomock.collection.Collection.find_raw_batches = _find_raw_batches
+    mongomock.collection.Collection.bulk_write = _bulk_write
+
+
+def install(uri=None):
+    """Route every later MongoClient(...) to one client; returns it."""
+    if uri:
+        client = pymongo.MongoClient(uri)
+    else:
+        patch_mongomock()
+        client = mongomock.MongoClient()
+    pymongo.MongoClient = lambda *args, **kwargs: client
+    return client
+
+
+def seed(client, bins, users=(), reports=(), chunk=10_000):
+    """Replace the servers' collections with the given documents."""
+    db = client['waste-management']
+    for name, docs in (('wastebins', bins), ('users', users), ('userreports', reports)):
+        collection = db[name]
+        collection.delete_many({})
+        for start in range(0, len(docs), chunk):
+            collection.insert_many(docs[start:start + chunk], ordered=False)
@@ -0,0 +1,222 @@
+"""
+Ward-wise fill-level anomaly scoring with running (Welford) statistics.
+
+WardAnomalyEngine keeps, per ward, the count, mean and sum of squared
+deviations (M2) of realTimeCapacity. When a new bins snapshot arrives only
+the bins whose reading or ward changed are folded in (remove the old value,
+add the new one), so keeping the statistics current costs O(changed bins)
+and scoring one reading costs O(1). The z-score of every bin is then a
+vectorized gather of its ward's mean/std.
+
+z matches the original groupby computation: sample std (ddof=1), a std of 0
+is replaced by 1.0, and a ward with a single bin gives NaN. Bins without a
+ward are scored together as one group.
+"""
+
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Exact rebuild after this many incremental updates to shed float drift
+DEFAULT_REBUILD_EVERY = 100_000
+
+# Group of the bins without a ward
+MISSING_WARD = 'unknown'
+
+
+def _ward_key(ward):
+    # None, NaN (object or categorical columns) and pd.NA all mean no ward
+    if ward is None or ward is pd.NA or (isinstance(ward, float) and math.isnan(ward)):
+        return MISSING_WARD
+    return ward
+
+
+def full_recompute_z(frame):
+    """Reference z-scores straight from the frame (groupby per ward), for validation."""
+    if frame.empty:
+        return np.empty(0)
+    wards = frame['ward'].to_numpy() if 'ward' in frame.columns else [MISSING_WARD] * len(frame)
+    # float64 like the running statistics
+    values = frame['realTimeCapacity'].astype('float64')
+    return values.groupby(wards, dropna=False).transform(
+        lambda s: (s - s.mean()) / (s.std() or 1.0)
+    ).to_numpy(dtype='float64')
+
+
+class WardAnomalyEngine:
+    def __init__(self, rebuild_every=DEFAULT_REBUILD_EVERY):
+        self.rebuild_every = rebuild_every
+        self._lock = threading.Lock()
+        self._ward_codes = {}
+        self._count = np.zeros(0, dtype='int64')
+        self._mean = np.zeros(0)
+        self._m2 = np.zeros(0)
+        # State of the last synced snapshot, aligned by row
+        self._ids = None
+        self._values = None
+        self._codes = None
+        self._positions = None
+        self._version = None
+        self._z = None
+        self._updates_since_rebuild = 0
+        self.last_sync = {}
+
+    # Per-ward running statistics
+
+    def _ward_code(self, ward):
+        key = _ward_key(ward)
+        code = self._ward_codes.get(key)
+        if code is None:
+            code = len(self._ward_codes)
+            self._ward_codes[key] = code
+            if code >= len(self._count):
+                grow = max(16, len(self._count))
+                self._count = np.concatenate([self._count, np.zeros(grow, dtype='int64')])
+                self._mean = np.concatenate([self._mean, np.zeros(grow)])
+                self._m2 = np.concatenate([self._m2, np.zeros(grow)])
+        return code
+
+    def _add(self, code, x):
+        n = self._count[code] + 1
+        delta = x - self._mean[code]
+        self._mean[code] += delta / n
+        self._m2[code] += delta * (x - self._mean[code])
+        self._count[code] = n
+
+    def _remove(self, code, x):
+        n = self._count[code]
+        if n <= 1:
+            self._count[code] = 0
+            self._mean[code] = 0.0
+            self._m2[code] = 0.0
+            return
+        mean = self._mean[code]
+        new_mean = (n * mean - x) / (n - 1)
+        self._m2[code] = max(self._m2[code] - (x - mean) * (x - new_mean), 0.0)
+        self._mean[code] = new_mean
+        self._count[code] = n - 1
+
+    def _std(self, codes):
+        count = self._count[codes]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(self._m2[codes] / (count - 1))
+        std = np.where(count > 1, std, np.nan)
+        return np.where(std == 0, 1.0, std)
+
+    def score(self, ward, value):
+        """O(1) z-score of one reading against its ward's current statistics."""
+        with self._lock:
+            code = self._ward_codes.get(_ward_key(ward))
+            if code is None:
+                return math.nan
+            return float((value - self._mean[code]) / self._std(np.array([code]))[0])
+
+    def observe(self, bin_id, ward, value):
+        """
+        Apply one new reading of a known bin in O(1) and return its z-score.
+
+        For pushing sensor readings between snapshots; the next sync() with a
+        snapshot that carries the same reading is then a no-op for this bin.
+        Bins not in the last synced snapshot are only scored, and get folded
+        in by the sync that first sees them.
+        """
+        with self._lock:
+            if self._ids is not None:
+                if self._positions is None:
+                    self._positions = {bin_id: pos for pos, bin_id in enumerate(self._ids)}
+                pos = self._positions.get(bin_id)
+                if pos is not None:
+                    code = self._ward_code(ward)
+                    self._remove(self._codes[pos], self._values[pos])
+                    self._add(code, value)
+                    self._codes[pos] = code
+                    self._values[pos] = value
+                    self._updates_since_rebuild += 1
+                    self._z = None
+        return self.score(ward, value)
+
+    # Snapshot sync
+
+    def _rebuild(self, ids, codes, values):
+        size = len(self._count)
+        count = np.bincount(codes, minlength=size)
+        sums = np.bincount(codes, weights=values, minlength=size)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, sums / np.maximum(count, 1), 0.0)
+        m2 = np.bincount(codes, weights=(values - mean[codes]) ** 2, minlength=size)
+        self._count, self._mean, self._m2 = count.astype('int64'), mean, m2
+        self._updates_since_rebuild = 0
+
+    def sync(self, frame, version=None):
+        """
+        Bring the statistics in line with a snapshot and return z per row.
+
+        Only bins that were added, removed, re-warded or re-read since the
+        previous snapshot touch the running statistics.
+        """
+        with self._lock:
+            if version is not None and version == self._version and self._ids is not None:
+                # Same snapshot; only observe() may have moved the statistics
+                if self._z is None:
+                    self._z = (self._values - self._mean[self._codes]) / self._std(self._codes)
+                return self._z
+            if frame.empty:
+                self._ids = self._values = self._codes = self._positions = None
+                self._version, self._z = version, np.empty(0)
+                return self._z
+
+            ids = frame['_id'].to_numpy()
+            # Own copy: observe() writes into it and must not touch the snapshot
+            values = np.array(frame['realTimeCapacity'], dtype='float64')
+            if 'ward' in frame.columns:
+                wards = frame['ward'].to_numpy()
+            else:
+                wards = np.full(len(frame), MISSING_WARD, dtype=object)
+            codes = np.fromiter((self._ward_code(w) for w in wards), dtype='int64', count=len(wards))
+
+            if self._ids is None or self._updates_since_rebuild >= self.rebuild_every:
+                self._rebuild(ids, codes, values)
+                self.last_sync = {"mode": "rebuild", "updated": len(ids)}
+            else:
+                prev = pd.Index(self._ids).get_indexer(ids)
+                matched = prev >= 0
+                changed = matched.copy()
+                changed[matched] = (self._values[prev[matched]] != values[matched]) | (self._codes[prev[matched]] != codes[matched])
+
+                removed = np.ones(len(self._ids), dtype=bool)
+                removed[prev[matched]] = False
+
+                for pos in np.flatnonzero(removed):
+                    self._remove(self._codes[pos], self._values[pos])
+                for pos in np.flatnonzero(changed):
+                    old = prev[pos]
+                    self._remove(self._codes[old], self._values[old])
+                    self._add(codes[pos], values[pos])
+                for pos in np.flatnonzero(~matched):
+                    self._add(codes[pos], values[pos])
+
+                updated = int(removed.sum() + changed.sum() + (~matched).sum())
+                self._updates_since_rebuild += updated
+                self.last_sync = {"mode": "incremental", "updated": updated}
+
+            self._ids, self._values, self._codes = ids, values, codes
+            self._positions = None
+            self._version = version
+            self._z = (values - self._mean[codes]) / self._std(codes)
+            return self._z
+
+    def validate(self, frame, version=None):
+        """Compare the maintained z-scores with a full recompute of the same frame."""
+        maintained = self.sync(frame, version)
+        reference = full_recompute_z(frame)
+        both_nan = np.isnan(maintained) & np.isnan(reference)
+        diff = np.where(both_nan, 0.0, np.abs(maintained - reference))
+        max_diff = float(np.nanmax(diff)) if len(diff) else 0.0
+        return {
+            "bins": len(frame),
+            "maxAbsDiff": max_diff if not np.isnan(diff).any() else None,
+            "agree": bool(np.allclose(maintained, reference, rtol=1e-9, atol=1e-9, equal_nan=True)),
+            "lastSync": self.last_sync,
+        }
@@ -0,0 +1,153 @@
+"""
+Projected, typed columnar reads of the wastebins collection.
+
+Instead of materializing every full document as a dict and handing the list
+to pd.DataFrame, read_bins() asks MongoDB for only the fields an endpoint
+needs, walks the raw BSON batches returned by find_raw_batches() and fills
+one preallocated NumPy array per field. Numeric fields are float64 arrays,
+so capacities keep the exact values the documents hold, and low-cardinality
+labels (ward, zone, category) become pandas categoricals.
+"""
+
+import bson
+import numpy as np
+import pandas as pd
+
+DEFAULT_BATCH_SIZE = 5000
+
+# Column dtype per field; fields not listed are kept as Python objects.
+# wasteQuantityPerDay arrives as text ("27.21 tonnes") and is parsed by the
+# caller's normalize step, so it stays an object column here.
+FIELD_TYPES = {
+    'totalCapacity': 'float64',
+    'realTimeCapacity': 'float64',
+    'predictedApproxTime': 'float64',
+    'lastEmptiedAt': 'datetime64[ns]',
+    'updatedAt': 'datetime64[ns]',
+    'ward': 'category',
+    'zone': 'category',
+    'category': 'category',
+    'locn.latitude': 'float64',
+    'locn.longitude': 'float64',
+}
+
+# Fields each endpoint reads. The shared snapshot loads the union of the
+# profiles of the endpoints it serves.
+PROJECTION_PROFILES = {
+    'schedule': ('_id', 'ward', 'totalCapacity', 'realTimeCapacity', 'wasteQuantityPerDay', 'lastEmptiedAt',
+                 'predictedApproxTime', 'predictedEmptyingDateTime', 'status'),
+    'forecast': ('_id', 'ward', 'zone', 'category', 'totalCapacity', 'realTimeCapacity', 'wasteQuantityPerDay'),
+    'anomalies': ('_id', 'ward', 'zone', 'category', 'totalCapacity', 'realTimeCapacity'),
+    'priority': ('_id', 'ward', 'zone', 'category', 'totalCapacity', 'realTimeCapacity', 'wasteQuantityPerDay',
+                 'status', 'sensorEnabled'),
+    'spm': ('_id', 'ward', 'zone', 'category', 'totalCapacity', 'realTimeCapacity', 'wasteQuantityPerDay',
+            'status', 'sensorEnabled'),
+    # Coordinates: GeoJSON location (server model) or locn (seed data), see bin_geo
+    'routes': ('_id', 'ward', 'totalCapacity', 'realTimeCapacity', 'location.coordinates',
+               'locn.latitude', 'locn.longitude'),
+    'near': ('_id', 'ward', 'zone', 'category', 'status', 'totalCapacity', 'realTimeCapacity',
+             'location.coordinates', 'locn.latitude', 'locn.longitude'),
+    'rollups': ('_id', 'ward', 'zone', 'category', 'status', 'totalCapacity', 'realTimeCapacity',
+                'wasteQuantityPerDay', 'sensorEnabled'),
+}
+
+
+def profile_fields(*profiles):
+    """Ordered union of the fields of the given projection profiles."""
+    fields = []
+    for name in profiles:
+        for field in PROJECTION_PROFILES[name]:
+            if field not in fields:
+                fields.append(field)
+    return fields
+
+
+def _lookup(doc, field):
+    # Dotted fields ('locn.latitude') come back as nested documents
+    for part in field.split('.'):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+def _allocate(field, size):
+    dtype = FIELD_TYPES.get(field)
+    if dtype in ('float32', 'float64'):
+        return np.full(size, np.nan, dtype=dtype)
+    if dtype == 'datetime64[ns]':
+        return np.full(size, np.datetime64('NaT'), dtype=dtype)
+    return np.empty(size, dtype=object)
+
+
+def _grow(arrays, size):
+    for field, arr in arrays.items():
+        bigger = _allocate(field, size)
+        bigger[:len(arr)] = arr
+        arrays[field] = bigger
+
+
+def _fill(arr, start, values, field):
+    end = start + len(values)
+    dtype = FIELD_TYPES.get(field)
+    if dtype in ('float32', 'float64'):
+        try:
+            arr[start:end] = np.asarray(values, dtype='float64')
+        except (TypeError, ValueError):
+            # Numbers stored as text or junk: coerce, bad values become NaN
+            arr[start:end] = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype='float64')
+    elif dtype == 'datetime64[ns]':
+        arr[start:end] = pd.to_datetime(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype='datetime64[ns]')
+    else:
+        arr[start:end] = values
+
+
+def read_bins(collection, query=None, fields=None, size_hint=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Read matching bins into a typed DataFrame with one column per field.
+
+    Fields missing from every document are left out, like pd.DataFrame(list)
+    would. Returns (frame, stats) where stats has the BSON bytes received.
+    """
+    fields = list(fields) if fields else profile_fields(*PROJECTION_PROFILES)
+    if '_id' not in fields:
+        fields.insert(0, '_id')
+    projection = {f: 1 for f in fields}
+
+    size = max(int(size_hint or 0), 1024)
+    arrays = {f: _allocate(f, size) for f in fields}
+    seen = set()
+    count = 0
+    stats = {"bytes": 0, "batches": 0, "docs": 0}
+
+    cursor = collection.find_raw_batches(query or {}, projection, batch_size=batch_size)
+    for batch in cursor:
+        stats["bytes"] += len(batch)
+        stats["batches"] += 1
+        docs = bson.decode_all(batch)
+        if not docs:
+            continue
+        if count + len(docs) > size:
+            size = max(size * 2, count + len(docs))
+            _grow(arrays, size)
+        for field in fields:
+            values = [doc.get(field) for doc in docs] if '.' not in field else [_lookup(doc, field) for doc in docs]
+            if field not in seen and any(v is not None for v in values):
+                seen.add(field)
+            _fill(arrays[field], count, values, field)
+        count += len(docs)
+
+    stats["docs"] = count
+    if not count:
+        return pd.DataFrame(), stats
+
+    columns = {}
+    for field in fields:
+        if field not in seen:
+            continue
+        values = arrays[field][:count]
+        if FIELD_TYPES.get(field) == 'category':
+            columns[field] = pd.Categorical(values)
+        else:
+            columns[field] = values
+    return pd.DataFrame(columns), stats
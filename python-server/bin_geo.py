@@ -0,0 +1,91 @@
+"""
+Bin coordinates and great-circle distances.
+
+Bins carry their position either as a GeoJSON `location` point
+([longitude, latitude], the server model) or as `locn` {latitude, longitude}
+(the seed data); coordinates() reads whichever is present, preferring the
+GeoJSON point like the client maps do. Distances are haversine kilometres,
+computed on whole arrays.
+"""
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _point_part(points, i):
+    out = np.full(len(points), np.nan)
+    for pos, point in enumerate(points):
+        if isinstance(point, (list, tuple)) and len(point) == 2:
+            try:
+                out[pos] = float(point[i])
+            except (TypeError, ValueError):
+                pass
+    return out
+
+
+def coordinates(frame):
+    """
+    (lat, lon) float64 arrays in degrees aligned with frame rows.
+
+    Accepts the projected columns ('location.coordinates', 'locn.latitude',
+    'locn.longitude') or whole nested 'location'/'locn' documents. Bins
+    without a valid position get NaN.
+    """
+    n = len(frame)
+    lat = np.full(n, np.nan)
+    lon = np.full(n, np.nan)
+
+    if 'locn.latitude' in frame.columns and 'locn.longitude' in frame.columns:
+        lat = frame['locn.latitude'].to_numpy(dtype='float64', na_value=np.nan)
+        lon = frame['locn.longitude'].to_numpy(dtype='float64', na_value=np.nan)
+    elif 'locn' in frame.columns:
+        pairs = [(d.get('latitude'), d.get('longitude')) if isinstance(d, dict) else None
+                 for d in frame['locn'].to_numpy()]
+        lat, lon = _point_part(pairs, 0), _point_part(pairs, 1)
+
+    points = None
+    if 'location.coordinates' in frame.columns:
+        points = frame['location.coordinates'].to_numpy()
+    elif 'location' in frame.columns:
+        points = [d.get('coordinates') if isinstance(d, dict) else None for d in frame['location'].to_numpy()]
+    if points is not None:
+        # GeoJSON order is [longitude, latitude]
+        geo_lon, geo_lat = _point_part(points, 0), _point_part(points, 1)
+        has_point = ~np.isnan(geo_lat) & ~np.isnan(geo_lon)
+        lat = np.where(has_point, geo_lat, lat)
+        lon = np.where(has_point, geo_lon, lon)
+
+    invalid = (np.abs(lat) > 90) | (np.abs(lon) > 180)
+    lat = np.where(invalid, np.nan, lat)
+    lon = np.where(invalid, np.nan, lon)
+    return lat, lon
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; arguments in degrees and broadcast against each other."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype='float64')) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) * 0.5) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) * 0.5) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def pairwise_km(lat, lon, dtype='float32', block=1024):
+    """Full (n x n) haversine distance matrix, computed a block of rows at a time to bound temporaries."""
+    lat = np.asarray(lat, dtype='float64')
+    lon = np.asarray(lon, dtype='float64')
+    out = np.empty((len(lat), len(lat)), dtype=dtype)
+    for start in range(0, len(lat), block):
+        rows = slice(start, start + block)
+        out[rows] = haversine_km(lat[rows, None], lon[rows, None], lat[None, :], lon[None, :])
+    return out
+
+
+def unit_vectors(lat, lon):
+    """(n, 3) points on the unit sphere; their Euclidean (chord) distance orders pairs like great-circle distance."""
+    lat = np.radians(np.asarray(lat, dtype='float64'))
+    lon = np.radians(np.asarray(lon, dtype='float64'))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_km(chord):
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.asarray(chord, dtype='float64') * 0.5, 1.0))
@@ -0,0 +1,179 @@
+"""
+Per-snapshot indexes over the bins frame.
+
+BinIdIndex maps bin ids to snapshot rows for O(1) single-bin lookups.
+BinScoreIndex serves the top-k /ml/* endpoints.
+
+Scores (hours until full, priority, ward z-score) and filter codes for ward,
+zone and category are computed once per bins snapshot. A request then only
+builds a filter mask and runs an O(n) np.argpartition, sorting just the k
+selected rows, so polling with different filters never recomputes scores.
+"""
+
+import threading
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+import bin_geo
+import bin_math
+from bin_anomaly import full_recompute_z
+
+FILTER_FIELDS = ('ward', 'zone', 'category')
+
+ANOMALY_Z_THRESHOLD = 1.5
+
+
+class PerSnapshot:
+    """Lazily build one derived object per snapshot version and share it."""
+
+    def __init__(self, cache, build):
+        self.cache = cache
+        self.build = build
+        self._lock = threading.Lock()
+        # (version, built object), replaced as one tuple so lock-free readers never mix two versions
+        self._entry = (None, None)
+
+    def get(self):
+        version, frame = self.cache.snapshot()
+        built_version, built = self._entry
+        if built is not None and built_version == version:
+            return built
+        with self._lock:
+            built_version, built = self._entry
+            if built is None or built_version != version:
+                built = self.build(frame, version)
+                self._entry = (version, built)
+            return built
+
+
+def _codes(column):
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy(), column.cat.categories
+    codes, uniques = pd.factorize(column)
+    return codes, pd.Index(uniques)
+
+
+class BinIdIndex:
+    """_id -> row lookup with the per-bin fields /schedule needs, as plain arrays."""
+
+    FIELDS = ('totalCapacity', 'realTimeCapacity', 'wasteQuantityPerDay', 'lastEmptiedAt', 'ward',
+              'predictedApproxTime', 'predictedEmptyingDateTime', 'status')
+
+    def __init__(self, frame, version=None):
+        self.version = version
+        self.size = len(frame)
+        self.ids = frame['_id'].to_numpy() if '_id' in frame.columns else np.empty(0, dtype=object)
+        self.positions = {str(bin_id): pos for pos, bin_id in enumerate(self.ids)}
+        self.columns = {f: frame[f].to_numpy() for f in self.FIELDS if f in frame.columns}
+
+    def position(self, bin_id):
+        """Row of the bin with this _id (string form), or None."""
+        return self.positions.get(bin_id)
+
+    def record(self, pos):
+        """Dict of the indexed fields for one row; missing fields are None."""
+        out = {'_id': self.ids[pos]}
+        for field in self.FIELDS:
+            column = self.columns.get(field)
+            value = None if column is None else column[pos]
+            if value is not None and pd.isna(value):
+                value = None
+            out[field] = value
+        return out
+
+
+class BinScoreIndex:
+    """
+    Scores and filter codes for one snapshot; read-only once built.
+
+    anomalies: optional bin_anomaly.WardAnomalyEngine that supplies the ward
+    z-scores from its running statistics; without it they are recomputed.
+    forecaster: optional fill_forecast.FillForecaster; hours until full then
+    come from each bin's fill history (with bounds) where it has enough of it.
+    """
+
+    def __init__(self, frame, version=None, anomalies=None, forecaster=None):
+        self.version = version
+        self.frame = frame
+        self.size = len(frame)
+        if frame.empty:
+            return
+
+        total = frame['totalCapacity']
+        real = frame['realTimeCapacity']
+        if forecaster is not None:
+            self.forecast = forecaster.estimate(frame)
+            self.hours_until_full = self.forecast["hours"]
+        else:
+            self.forecast = None
+            self.hours_until_full = bin_math.hours_until_full(total, real, frame['wasteQuantityPerDay'])
+
+        # Priority: status weight + sensor absence + urgency (see ml_priority)
+        status_w = bin_math.status_weight(frame.get('status'), real, total)
+        sensor = frame.get('sensorEnabled')
+        if sensor is None:
+            sensor_boost = 0.5
+        else:
+            sensor_boost = (~sensor.astype(bool)).astype(int).to_numpy() * 0.5
+        self.priority_score = status_w + sensor_boost + 2.0 * bin_math.urgency(self.hours_until_full)
+
+        # Ward-wise z-score for realTimeCapacity
+        self.z = anomalies.sync(frame, version) if anomalies is not None else full_recompute_z(frame)
+
+        self._codes = {f: _codes(frame[f]) for f in FILTER_FIELDS if f in frame.columns}
+
+    @cached_property
+    def coordinates(self):
+        """(lat, lon) per row, NaN where a bin has no position; built on first use."""
+        return bin_geo.coordinates(self.frame)
+
+    def mask(self, filters):
+        """
+        Boolean row mask for {field: [values]}; None when nothing is filtered.
+
+        Values are matched exactly; several values for one field are OR-ed.
+        """
+        mask = None
+        for field, values in filters.items():
+            if not values:
+                continue
+            if field not in self._codes:
+                return np.zeros(self.size, dtype=bool)
+            codes, labels = self._codes[field]
+            wanted = labels.get_indexer(values)
+            field_mask = np.isin(codes, wanted[wanted >= 0])
+            mask = field_mask if mask is None else (mask & field_mask)
+        return mask
+
+    def top_k(self, scores, k, mask=None, descending=False):
+        """
+        Positions of the k best rows by score, best first.
+
+        NaN scores rank last. Ties among the selected rows keep snapshot order.
+        """
+        scores = np.asarray(scores, dtype='float64')
+        candidates = np.arange(self.size) if mask is None else np.flatnonzero(mask)
+        if not len(candidates) or k <= 0:
+            return candidates[:0]
+
+        keys = scores[candidates]
+        keys = -keys if descending else keys.copy()
+        keys[np.isnan(keys)] = np.inf
+
+        if k < len(candidates):
+            picked = np.argpartition(keys, k - 1)[:k]
+        else:
+            picked = np.arange(len(candidates))
+        order = np.lexsort((candidates[picked], keys[picked]))
+        return candidates[picked[order]]
+
+    def rows(self, positions, columns, **scores):
+        """Build the response frame for the selected positions only, adding the named score arrays."""
+        result = self.frame.iloc[positions][[c for c in columns if c in self.frame.columns]].reset_index(drop=True)
+        for name, values in scores.items():
+            result[name] = values[positions]
+        if '_id' in result.columns:
+            result['_id'] = result['_id'].astype(str)
+        return result
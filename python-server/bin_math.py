@@ -0,0 +1,148 @@
+"""
+Vectorized fill-level math shared by /schedule and the /ml/* endpoints.
+
+Every function works on whole columns at once (NumPy arrays or pandas Series)
+and returns new arrays; the input frame is never modified. schedule_one() is
+the scalar counterpart used for single-bin lookups.
+"""
+
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Predictions further out than this are not meaningful and would overflow
+# datetime64[ns], so they are reported without a datetime.
+MAX_HORIZON_HOURS = 24 * 365 * 100
+
+STATUS_FILLED = 'filled'
+STATUS_PARTIAL = 'partially_filled'
+STATUS_EMPTY = 'empty'
+
+STATUS_WEIGHTS = {STATUS_FILLED: 3, STATUS_PARTIAL: 2}
+
+
+def _values(col):
+    return np.asarray(col, dtype='float64')
+
+
+def hours_until_full(total_capacity, real_time_capacity, waste_per_day):
+    """
+    Hours until a bin reaches totalCapacity at its daily waste rate.
+
+    Bins with no daily waste never fill, so they get NaN instead of the
+    inf/huge values a plain division would produce.
+    """
+    remaining = _values(total_capacity) - _values(real_time_capacity)
+    per_hour = _values(waste_per_day) / 24.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hours = remaining / per_hour
+    hours[per_hour == 0] = np.nan
+    return hours
+
+
+def add_hours(base, hours):
+    """
+    Add float hours to base datetime(s) and return '%Y-%m-%d %H:%M:%S' strings.
+
+    base is a datetime column or a single timestamp. Entries whose hours are
+    NaN or beyond MAX_HORIZON_HOURS, or whose base is missing, become None.
+    """
+    hours = _values(hours)
+    if isinstance(base, (datetime, np.datetime64)):
+        base = pd.Timestamp(base)
+        if base.tzinfo is not None:
+            base = base.tz_convert(None)
+        base_ns = np.full(len(hours), base.to_datetime64().astype('datetime64[ns]'))
+    else:
+        base = pd.to_datetime(pd.Series(base).reset_index(drop=True), errors='coerce')
+        if getattr(base.dt, 'tz', None) is not None:
+            base = base.dt.tz_convert(None)
+        base_ns = base.to_numpy(dtype='datetime64[ns]')
+
+    valid = np.isfinite(hours) & (np.abs(hours) <= MAX_HORIZON_HOURS) & ~np.isnat(base_ns)
+    # datetime.timedelta(hours=h) rounds to whole microseconds; match it
+    micros = np.round(np.where(valid, hours, 0.0) * 3.6e9).astype('int64')
+    stamps = base_ns + micros.astype('timedelta64[us]').astype('timedelta64[ns]')
+
+    text = np.datetime_as_string(stamps.astype('datetime64[s]'), unit='s')
+    if len(text):
+        # 'YYYY-MM-DDTHH:MM:SS' -> 'YYYY-MM-DD HH:MM:SS' by overwriting the 'T' in place
+        text.view('<U1').reshape(len(text), -1)[:, 10] = ' '
+    out = text.astype(object)
+    out[~valid] = None
+    return out
+
+
+def fill_status(real_time_capacity, total_capacity, filled_at=0.8, partial_at=0.3):
+    """Bucket each bin into filled / partially_filled / empty by fill ratio."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = _values(real_time_capacity) / _values(total_capacity)
+    return np.select(
+        [ratio >= filled_at, ratio >= partial_at],
+        [STATUS_FILLED, STATUS_PARTIAL],
+        default=STATUS_EMPTY,
+    ).astype(object)
+
+
+def status_weight(status, real_time_capacity, total_capacity):
+    """
+    Priority weight per bin: 3 for filled, 2 for partially_filled, else 0.
+
+    A stored string status wins; bins without one are bucketed from their
+    fill ratio with the stricter priority thresholds (0.85 / 0.5).
+    """
+    total = np.maximum(_values(total_capacity), 1e-6)
+    derived = fill_status(real_time_capacity, total, filled_at=0.85, partial_at=0.5)
+    if status is None:
+        effective = derived
+    else:
+        status = pd.Series(status).reset_index(drop=True)
+        if status.dtype == object:
+            is_str = status.str.len().notna().to_numpy()
+            effective = np.where(is_str, status.to_numpy(), derived)
+        else:
+            effective = derived
+    return np.select(
+        [effective == STATUS_FILLED, effective == STATUS_PARTIAL],
+        [STATUS_WEIGHTS[STATUS_FILLED], STATUS_WEIGHTS[STATUS_PARTIAL]],
+        default=0,
+    )
+
+
+def urgency(hours):
+    """Scale hours-until-full to 0..1, where 1 means full now."""
+    hours = _values(hours)
+    finite = hours[np.isfinite(hours)]
+    max_h = max(float(finite.max()), 1.0) if finite.size else 1.0
+    scaled = 1.0 - np.clip(hours / max_h, 0.0, 1.0)
+    # Bins that never fill are never urgent
+    scaled[np.isnan(scaled)] = 0.0
+    return scaled
+
+
+def schedule_one(total_capacity, real_time_capacity, waste_per_day, last_emptied_at):
+    """
+    Scalar version of the /schedule prediction for a single bin.
+
+    Returns (predictedApproxTime, predictedEmptyingDateTime, status) with the
+    same values the vectorized functions above produce for that bin.
+    """
+    per_hour = waste_per_day / 24.0
+    hours = (total_capacity - real_time_capacity) / per_hour if per_hour else math.nan
+
+    emptying = None
+    if math.isfinite(hours) and abs(hours) <= MAX_HORIZON_HOURS and last_emptied_at is not None:
+        emptying = (last_emptied_at + timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M:%S')
+
+    ratio = real_time_capacity / total_capacity if total_capacity else (
+        math.nan if real_time_capacity == 0 else math.copysign(math.inf, real_time_capacity)
+    )
+    if ratio >= 0.8:
+        status = STATUS_FILLED
+    elif ratio >= 0.3:
+        status = STATUS_PARTIAL
+    else:
+        status = STATUS_EMPTY
+    return hours, emptying, status
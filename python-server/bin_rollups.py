@@ -0,0 +1,199 @@
+"""
+Per-ward / per-zone / per-category summaries of the bins for the dashboard.
+
+Each group reports its bin count, bins near full, mean fill ratio, total
+daily tonnage and bins without a sensor. The summaries are computed in one
+of two places:
+
+- MongoDB: an aggregation pipeline ($match on the filters, $group by the
+  field) so only one small document per group leaves the server. The
+  compound indexes in ROLLUP_INDEXES serve the filtered $match (MongoDB
+  4.4+ for $isNumber and $replaceAll),
+- the in-memory snapshot: one np.bincount per metric over the group codes.
+
+BinRollups.rollup() uses the snapshot while it is fresh (loaded within its
+TTL and not invalidated by a change), since then it is as current as the
+collection and costs no round trip; otherwise it pushes the work down to
+MongoDB instead of loading every bin, falling back to the snapshot when the
+server cannot run the pipeline. Both paths apply the same
+conversions: capacities and "NN tonnes" strings that do not parse count
+as 0, and bins with no totalCapacity have no fill ratio.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+from pymongo.errors import PyMongoError
+
+from bin_preprocess import TONNES_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_GROUPS = ('ward', 'zone', 'category')
+ROLLUP_FILTERS = ('ward', 'zone', 'category', 'status')
+ROLLUP_SOURCES = ('auto', 'mongo', 'snapshot')
+
+# Fill ratio from which a bin counts as near full (bin_math.fill_status's "filled")
+NEAR_FULL_RATIO = 0.8
+
+# Every filter combination starts one of these indexes. All but ward+category
+# and zone+status also have an index whose leading fields are exactly the
+# filtered ones; those two scan their first field's range and check the other
+# field on the index keys.
+ROLLUP_INDEXES = (
+    [('ward', 1), ('zone', 1), ('category', 1), ('status', 1)],
+    [('zone', 1), ('category', 1), ('status', 1)],
+    [('category', 1), ('status', 1), ('ward', 1)],
+    [('status', 1), ('ward', 1), ('zone', 1)],
+)
+
+
+def _to_double(expr):
+    return {'$convert': {'input': expr, 'to': 'double', 'onError': 0.0, 'onNull': 0.0}}
+
+
+# wasteQuantityPerDay is a number or text like "27.21 tonnes"
+_TONNES = {'$cond': [
+    {'$isNumber': '$wasteQuantityPerDay'},
+    '$wasteQuantityPerDay',
+    _to_double({'$trim': {'input': {'$replaceAll': {
+        'input': {'$convert': {'input': '$wasteQuantityPerDay', 'to': 'string', 'onError': '', 'onNull': ''}},
+        'find': TONNES_SUFFIX, 'replacement': '',
+    }}}}),
+]}
+
+
+def rollup_pipeline(by, filters=None):
+    """Aggregation pipeline producing one document per `by` value, sorted by it (null first)."""
+    match = {field: {'$in': list(values)} for field, values in (filters or {}).items()}
+    return [
+        {'$match': match},
+        {'$project': {
+            '_id': 0,
+            'group': '$' + by,
+            'total': _to_double('$totalCapacity'),
+            'current': _to_double('$realTimeCapacity'),
+            'tonnes': _TONNES,
+            'sensor': {'$eq': ['$sensorEnabled', True]},
+        }},
+        {'$project': {
+            'group': 1, 'tonnes': 1, 'sensor': 1,
+            'ratio': {'$cond': [{'$gt': ['$total', 0]}, {'$divide': ['$current', '$total']}, None]},
+        }},
+        {'$group': {
+            '_id': '$group',
+            'bins': {'$sum': 1},
+            # null ratios sort below every number, so they never count as near full
+            'nearFull': {'$sum': {'$cond': [{'$gte': ['$ratio', NEAR_FULL_RATIO]}, 1, 0]}},
+            'meanFillRatio': {'$avg': '$ratio'},
+            'dailyTonnes': {'$sum': '$tonnes'},
+            'sensorless': {'$sum': {'$cond': ['$sensor', 0, 1]}},
+        }},
+        {'$sort': {'_id': 1}},
+    ]
+
+
+def _numeric(frame, field):
+    if field not in frame.columns:
+        return np.zeros(len(frame))
+    return pd.to_numeric(frame[field], errors='coerce').fillna(0.0).to_numpy(dtype='float64')
+
+
+def _group_codes(column):
+    """(codes, labels) with missing values as one extra trailing label None."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes, labels = column.cat.codes.to_numpy(), list(column.cat.categories)
+    else:
+        codes, uniques = pd.factorize(column)
+        labels = list(uniques)
+    codes = np.where(codes < 0, len(labels), codes)
+    return codes, labels + [None]
+
+
+def frame_rollups(frame, by, filters=None):
+    """The rollup_pipeline() result computed from a snapshot frame."""
+    mask = np.ones(len(frame), dtype=bool)
+    for field, values in (filters or {}).items():
+        mask &= frame[field].isin(values).to_numpy() if field in frame.columns else False
+    if not mask.all():
+        frame = frame[mask]
+
+    total = _numeric(frame, 'totalCapacity')
+    current = _numeric(frame, 'realTimeCapacity')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(total > 0, current / total, np.nan)
+    has_ratio = ~np.isnan(ratio)
+    sensor = frame['sensorEnabled'].eq(True).to_numpy() if 'sensorEnabled' in frame.columns else False
+
+    if by in frame.columns:
+        codes, labels = _group_codes(frame[by])
+    else:
+        codes, labels = np.zeros(len(frame), dtype='int64'), [None]
+    size = len(labels)
+
+    def per_group(weights=None):
+        return np.bincount(codes, weights=weights, minlength=size)
+
+    bins = per_group()
+    ratio_n = per_group(has_ratio)
+    ratio_sum = per_group(np.where(has_ratio, ratio, 0.0))
+    near_full = per_group(ratio >= NEAR_FULL_RATIO)
+    tonnes = per_group(_numeric(frame, 'wasteQuantityPerDay'))
+    sensorless = per_group(~np.broadcast_to(sensor, len(frame)))
+
+    rows = [
+        {
+            by: labels[g],
+            'bins': int(bins[g]),
+            'nearFull': int(near_full[g]),
+            'meanFillRatio': float(ratio_sum[g] / ratio_n[g]) if ratio_n[g] else None,
+            'dailyTonnes': float(tonnes[g]),
+            'sensorless': int(sensorless[g]),
+        }
+        for g in np.flatnonzero(bins)
+    ]
+    # Same order as the pipeline's $sort: null first, then by value
+    rows.sort(key=lambda row: (row[by] is not None, row[by] if row[by] is not None else ''))
+    return rows
+
+
+class BinRollups:
+    def __init__(self, collection, cache, indexes=ROLLUP_INDEXES):
+        self.collection = collection
+        self.cache = cache
+        self.indexes = indexes
+        self._indexed = False
+
+    def ensure_indexes(self):
+        """Create the indexes once; without the privilege to do so the pipeline still runs."""
+        if self._indexed:
+            return
+        try:
+            for keys in self.indexes:
+                self.collection.create_index(keys)
+        except PyMongoError as e:
+            logger.warning("Could not create rollup indexes: %s", e)
+        self._indexed = True
+
+    def aggregate(self, by, filters=None):
+        self.ensure_indexes()
+        rows = []
+        for doc in self.collection.aggregate(rollup_pipeline(by, filters)):
+            group = doc.pop('_id')
+            doc['dailyTonnes'] = float(doc['dailyTonnes'])
+            rows.append(dict({by: group}, **doc))
+        return rows
+
+    def rollup(self, by='ward', filters=None, source='auto'):
+        """(rows, source used) for the groups of `by` matching filters ({field: [values]})."""
+        if source == 'snapshot' or (source == 'auto' and self.cache.fresh()):
+            return frame_rollups(self.cache.get(), by, filters), 'snapshot'
+        try:
+            return self.aggregate(by, filters), 'mongo'
+        except (PyMongoError, NotImplementedError) as e:
+            # Servers before 4.4 and in-memory stand-ins lack some of the pipeline's operators
+            if source == 'mongo':
+                raise
+            logger.warning("Rollup aggregation failed (%s); using the snapshot", e)
+            return frame_rollups(self.cache.get(), by, filters), 'snapshot'
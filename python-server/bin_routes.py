@@ -0,0 +1,244 @@
+"""
+Capacitated collection routes from a depot (a sweep heuristic plus local search).
+
+plan_routes() takes candidate bins in priority order and:
+
+1. keeps the highest-priority bins that fit into the fleet's total capacity,
+2. splits them between trucks by a sweep around the depot, so each truck
+   serves one angular sector and gets a share of the load proportional to
+   its capacity,
+3. orders each truck's stops by nearest neighbour, then improves the tour
+   with 2-opt and or-opt moves until no move helps or the time budget runs
+   out.
+
+Every local-search step evaluates all of its candidate moves at once with
+NumPy. The cost is O(stops) Python steps per pass over a route, not O(stops²).
+Distances are haversine kilometres (see bin_geo).
+"""
+
+import math
+import time
+
+import numpy as np
+
+from bin_geo import pairwise_km
+
+DEFAULT_TIME_BUDGET = 2.0
+# Segment lengths or-opt tries to move
+OR_OPT_SEGMENTS = (1, 2, 3)
+# Smallest gain (km) worth a move; below it float32 rounding could make moves cycle
+EPSILON = 1e-4
+
+
+def tour_length(tour, dist):
+    return float(dist[tour[:-1], tour[1:]].sum())
+
+
+def _select(demand, valid, capacities):
+    """Positions kept in priority order while the fleet has room; the rest are unassigned."""
+    room = float(np.sum(capacities))
+    largest = float(np.max(capacities))
+    kept, skipped = [], []
+    for pos in np.flatnonzero(valid):
+        d = float(demand[pos])
+        if d <= largest and d <= room:
+            kept.append(pos)
+            room -= d
+        else:
+            skipped.append(pos)
+    return np.array(kept, dtype='int64'), np.array(skipped, dtype='int64')
+
+
+def _sweep(lat, lon, demand, depot, capacities):
+    """
+    Split positions into one group per truck by angle around the depot.
+
+    The sweep starts at the widest angular gap so no sector straddles two
+    clusters. A truck closes its sector once it reaches its share of the
+    total demand or the next bin would overflow it. Bins no truck can take
+    any more are returned as overflow.
+    """
+    # Local equirectangular projection: angles only, accurate enough at city scale
+    x = (lon - depot[1]) * math.cos(math.radians(depot[0]))
+    y = lat - depot[0]
+    angle = np.arctan2(y, x)
+    order = np.argsort(angle, kind='stable')
+    if len(order) > 1:
+        gaps = np.diff(np.r_[angle[order], angle[order[0]] + 2 * np.pi])
+        order = np.roll(order, -int((np.argmax(gaps) + 1) % len(order)))
+
+    capacities = np.asarray(capacities, dtype='float64')
+    targets = demand.sum() * capacities / capacities.sum()
+    groups = [[] for _ in capacities]
+    loads = np.zeros(len(capacities))
+    overflow = []
+    truck = 0
+    for pos in order:
+        d = demand[pos]
+        while truck < len(capacities) - 1 and (
+            loads[truck] + d > capacities[truck] or (groups[truck] and loads[truck] >= targets[truck])
+        ):
+            truck += 1
+        if loads[truck] + d <= capacities[truck]:
+            groups[truck].append(pos)
+            loads[truck] += d
+        else:
+            overflow.append(pos)
+
+    # Late bins that did not fit the last sector: any truck with room left
+    unplaced = []
+    for pos in overflow:
+        room = np.flatnonzero(loads + demand[pos] <= capacities)
+        if len(room):
+            truck = room[np.argmax(capacities[room] - loads[room])]
+            groups[truck].append(pos)
+            loads[truck] += demand[pos]
+        else:
+            unplaced.append(pos)
+    return [np.array(g, dtype='int64') for g in groups], np.array(unplaced, dtype='int64')
+
+
+def _nearest_neighbour(dist):
+    """Tour 0 -> ... -> 0 over the nodes of dist (node 0 is the depot)."""
+    n = len(dist)
+    tour = [0]
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    current = 0
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, dist[current])
+        current = int(np.argmin(row))
+        visited[current] = True
+        tour.append(current)
+    tour.append(0)
+    return np.array(tour, dtype='int64')
+
+
+def _two_opt(tour, dist, deadline):
+    """One 2-opt pass: for each edge, apply the best reversal that shortens the tour. Returns moves made."""
+    moves = 0
+    for i in range(len(tour) - 3):
+        if time.perf_counter() > deadline:
+            break
+        a, b = tour[i], tour[i + 1]
+        j = np.arange(i + 2, len(tour) - 1)
+        c, d = tour[j], tour[j + 1]
+        delta = dist[a, c] + dist[b, d] - dist[a, b] - dist[c, d]
+        best = int(np.argmin(delta))
+        if delta[best] < -EPSILON:
+            k = j[best]
+            tour[i + 1:k + 1] = tour[i + 1:k + 1][::-1]
+            moves += 1
+    return moves
+
+
+def _or_opt(tour, dist, deadline):
+    """One or-opt pass: move short segments (either direction) to the cheapest other edge. Returns moves made."""
+    moves = 0
+    for length in OR_OPT_SEGMENTS:
+        i = 1
+        while i + length < len(tour):
+            if time.perf_counter() > deadline:
+                return moves
+            first, last = tour[i], tour[i + length - 1]
+            prev, nxt = tour[i - 1], tour[i + length]
+            gain = dist[prev, first] + dist[last, nxt] - dist[prev, nxt]
+
+            # Edges (p, q) of the tour that do not touch the segment
+            k = np.r_[np.arange(0, i - 1), np.arange(i + length, len(tour) - 1)]
+            if not len(k):
+                i += 1
+                continue
+            p, q = tour[k], tour[k + 1]
+            base = dist[p, q]
+            forward = dist[p, first] + dist[last, q] - base
+            backward = dist[p, last] + dist[first, q] - base
+            cost = np.minimum(forward, backward)
+            best = int(np.argmin(cost))
+            if cost[best] < gain - EPSILON:
+                segment = tour[i:i + length]
+                if backward[best] < forward[best]:
+                    segment = segment[::-1]
+                rest = np.r_[tour[:i], tour[i + length:]]
+                at = k[best] + 1 if k[best] < i else k[best] + 1 - length
+                tour[:] = np.r_[rest[:at], segment, rest[at:]]
+                moves += 1
+            i += 1
+    return moves
+
+
+def improve_tour(tour, dist, deadline):
+    """2-opt and or-opt passes until neither finds a move or the deadline passes. Returns moves made."""
+    moves = 0
+    while time.perf_counter() < deadline:
+        made = _two_opt(tour, dist, deadline) + _or_opt(tour, dist, deadline)
+        moves += made
+        if not made:
+            break
+    return moves
+
+
+def plan_routes(lat, lon, demand, depot, capacities, time_budget=DEFAULT_TIME_BUDGET, distances=None):
+    """
+    Routes for the candidate bins; positions index the input arrays.
+
+    lat, lon, demand: per candidate, in priority order (most urgent first).
+    depot: (lat, lon). capacities: one per truck, in demand units.
+    distances: optional callable(positions) returning the km matrix over
+    [depot] + those candidates (e.g. from distance_matrix.DistanceMatrix);
+    by default, or when it returns None, it is computed from lat/lon.
+    Returns {"routes": [{"stops", "load", "distanceKm"}], "unassigned":
+    {reason: positions}, "stats"}. Each route starts and ends at the depot;
+    stops lists the candidate positions in visiting order.
+    """
+    started = time.perf_counter()
+    deadline = started + max(float(time_budget), 0.0)
+    lat = np.asarray(lat, dtype='float64')
+    lon = np.asarray(lon, dtype='float64')
+    demand = np.maximum(np.nan_to_num(np.asarray(demand, dtype='float64')), 0.0)
+    capacities = np.asarray(capacities, dtype='float64')
+
+    located = np.isfinite(lat) & np.isfinite(lon)
+    kept, over_capacity = _select(demand, located, capacities)
+    groups, unplaced = _sweep(lat[kept], lon[kept], demand[kept], depot, capacities)
+
+    routes = []
+    initial_km = final_km = 0.0
+    moves = 0
+    remaining = sum(len(g) for g in groups)
+    for truck, group in enumerate(groups):
+        stops = kept[group]
+        if not len(stops):
+            routes.append({"stops": stops, "load": 0.0, "distanceKm": 0.0})
+            continue
+        dist = distances(stops) if distances is not None else None
+        if dist is None:
+            dist = pairwise_km(np.r_[depot[0], lat[stops]], np.r_[depot[1], lon[stops]])
+        tour = _nearest_neighbour(dist)
+        initial_km += tour_length(tour, dist)
+
+        # Share what is left of the budget by route size
+        now = time.perf_counter()
+        share = (deadline - now) * len(stops) / remaining if remaining else 0.0
+        remaining -= len(stops)
+        moves += improve_tour(tour, dist, now + share)
+
+        length = tour_length(tour, dist)
+        final_km += length
+        routes.append({"stops": stops[tour[1:-1] - 1], "load": float(demand[stops].sum()), "distanceKm": length})
+
+    return {
+        "routes": routes,
+        "unassigned": {
+            "noLocation": np.flatnonzero(~located),
+            "overCapacity": np.r_[over_capacity, kept[unplaced]].astype('int64'),
+        },
+        "stats": {
+            "candidates": int(len(lat)),
+            "routed": int(sum(len(r["stops"]) for r in routes)),
+            "initialKm": initial_km,
+            "distanceKm": final_km,
+            "moves": moves,
+            "seconds": time.perf_counter() - started,
+        },
+    }
@@ -0,0 +1,295 @@
+"""
+In-process snapshot cache for the normalized wastebins DataFrame.
+
+One snapshot is shared by every request. It is rebuilt when its TTL expires or
+when MongoDB reports a change, either through a change stream or, where change
+streams are unavailable (standalone mongod), by polling a cheap fingerprint of
+the collection (document count, newest _id and newest updatedAt).
+"""
+
+import logging
+import os
+import threading
+import time
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = float(os.environ.get('BIN_CACHE_TTL', 30))
+DEFAULT_POLL_INTERVAL = float(os.environ.get('BIN_CACHE_POLL_INTERVAL', 5))
+WATCH_ENABLED = os.environ.get('BIN_CACHE_WATCH', '1') != '0'
+# Change stream errors after which the resume token is useless
+# (ChangeStreamFatalError, ChangeStreamHistoryLost: the token has left the oplog)
+NON_RESUMABLE_CODES = (280, 286)
+# Longest a change stream read blocks before the watcher checks whether it should stop
+WATCH_AWAIT_MS = 1000
+
+
+def _token_lost(error):
+    return isinstance(error, OperationFailure) and (
+        error.code in NON_RESUMABLE_CODES or error.has_error_label('NonResumableChangeStreamError')
+    )
+
+
+class ReadWriteLock:
+    """Many concurrent readers or one writer; waiting writers block new readers."""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+
+class BinSnapshotCache:
+    """
+    Holds the DataFrame produced by `loader` and hands it out to readers.
+
+    The cached frame must be treated as read-only; callers that add or replace
+    columns should work on `frame.copy(deep=False)`.
+    """
+
+    def __init__(self, loader, collection=None, ttl=DEFAULT_TTL,
+                 watch=WATCH_ENABLED, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.loader = loader
+        self.collection = collection
+        self.ttl = ttl
+        self.watch = watch and collection is not None
+        self.poll_interval = poll_interval
+
+        self._lock = ReadWriteLock()
+        self._stats_lock = threading.Lock()
+        self._frame = None
+        self._loaded_at = 0.0
+        self._stale = True
+        self._version = 0
+        self._watcher = None
+        self._stop_watch = None
+        self._watch_mode = None
+        # Where a stopped watcher left off, so the next one misses no change
+        self._resume_token = None
+        self._last_fingerprint = None
+        self.frozen = False
+
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.last_refresh_seconds = 0.0
+        self.total_refresh_seconds = 0.0
+
+    @property
+    def version(self):
+        """Incremented every time a new snapshot frame is installed."""
+        return self._version
+
+    def _expired(self):
+        if self.frozen and self._frame is not None:
+            return False
+        return self._stale or self._frame is None or (time.monotonic() - self._loaded_at) > self.ttl
+
+    def fresh(self):
+        """True when a snapshot is loaded and a reader would get it without a refresh."""
+        return self._frame is not None and not self._expired()
+
+    def get(self):
+        """Return the current snapshot, refreshing it first if it is stale."""
+        return self.snapshot()[1]
+
+    def snapshot(self):
+        """Return (version, frame) for the current snapshot."""
+        self._ensure_watcher()
+
+        self._lock.acquire_read()
+        try:
+            if not self._expired():
+                with self._stats_lock:
+                    self.hits += 1
+                return self._version, self._frame
+        finally:
+            self._lock.release_read()
+
+        self._lock.acquire_write()
+        try:
+            # Another thread may have refreshed while we waited for the lock
+            if self._expired():
+                with self._stats_lock:
+                    self.misses += 1
+                self._refresh_locked()
+            else:
+                with self._stats_lock:
+                    self.hits += 1
+            return self._version, self._frame
+        finally:
+            self._lock.release_write()
+
+    def _refresh_locked(self):
+        start = time.perf_counter()
+        # Clear the flag first so a change that lands mid-load marks the new snapshot stale
+        self._stale = False
+        frame = self.loader()
+        elapsed = time.perf_counter() - start
+
+        # Loaders that found nothing new hand back the same frame; keep its version so
+        # nothing keyed on it (PerSnapshot indexes, the prefork swap) is rebuilt
+        if frame is not self._frame:
+            self._version += 1
+        self._frame = frame
+        self._loaded_at = time.monotonic()
+        with self._stats_lock:
+            self.refreshes += 1
+            self.last_refresh_seconds = elapsed
+            self.total_refresh_seconds += elapsed
+
+    def refresh(self):
+        """Rebuild the snapshot now."""
+        self._lock.acquire_write()
+        try:
+            self._refresh_locked()
+        finally:
+            self._lock.release_write()
+
+    def freeze(self):
+        """
+        Keep serving the current snapshot: no TTL expiry, invalidation or
+        watcher. Used in prefork workers, whose master refreshes the snapshot
+        and forks new workers from it.
+        """
+        self.frozen = True
+
+    def invalidate(self):
+        """Mark the snapshot stale; the next reader rebuilds it."""
+        self._stale = True
+
+    def stats(self):
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": (self.hits / lookups) if lookups else None,
+                "refreshes": self.refreshes,
+                "lastRefreshSeconds": self.last_refresh_seconds,
+                "avgRefreshSeconds": (self.total_refresh_seconds / self.refreshes) if self.refreshes else None,
+                "version": self._version,
+                "rows": 0 if self._frame is None else len(self._frame),
+                "ageSeconds": (time.monotonic() - self._loaded_at) if self._frame is not None else None,
+                "ttlSeconds": self.ttl,
+                "invalidation": "frozen" if self.frozen else (self._watch_mode or "ttl"),
+                "lastLoad": getattr(self.loader, 'last_refresh', None),
+            }
+
+    # Invalidation watchers
+
+    def _ensure_watcher(self):
+        if not self.watch or self.frozen or self._watcher is not None:
+            return
+        with self._stats_lock:
+            if self._watcher is not None:
+                return
+            self._stop_watch = threading.Event()
+            self._watcher = threading.Thread(target=self._watch_loop, args=(self._stop_watch,),
+                                             name='bin-snapshot-watcher', daemon=True)
+            self._watcher.start()
+
+    def stop_watch(self, timeout=10.0):
+        """
+        Stop the watcher thread and wait for it to exit. The next reader
+        starts a new one, which resumes where this one stopped. The prefork
+        master calls this before forking, so no thread is inside pymongo or
+        holding a lock when the process is copied.
+        """
+        with self._stats_lock:
+            watcher, self._watcher = self._watcher, None
+            if watcher is None:
+                return
+            self._stop_watch.set()
+        watcher.join(timeout)
+        if watcher.is_alive():
+            logger.warning("Snapshot watcher did not stop within %ss", timeout)
+
+    def _watch_loop(self, stop):
+        # Once change streams have proved unavailable, a restarted watcher goes straight to polling
+        if self._watch_mode != "poll":
+            if self._watch_changes(stop):
+                return
+            self._watch_mode = "poll"
+            self.invalidate()
+        self._poll_loop(stop)
+
+    def _watch_changes(self, stop):
+        """Follow the change stream until stopped (True) or change streams are unavailable (False)."""
+        # Loaders that refresh incrementally want to know which bins changed
+        record = getattr(self.loader, 'record_change', None)
+        while not stop.is_set():
+            try:
+                self._watch_mode = "change_stream"
+                with self.collection.watch(resume_after=self._resume_token, max_await_time_ms=WATCH_AWAIT_MS) as stream:
+                    while not stop.is_set():
+                        event = stream.try_next()
+                        if event is not None:
+                            if record is not None:
+                                record(event)
+                            self.invalidate()
+                        self._resume_token = stream.resume_token
+            except PyMongoError as e:
+                if self._resume_token is None:
+                    # Standalone servers have no change streams; fall back to polling
+                    logger.info("Change stream unavailable (%s); polling wastebins every %ss", e, self.poll_interval)
+                    return False
+                # The stream worked before (failover, network blip): resume where it stopped,
+                # or start fresh if the token has already left the oplog
+                logger.warning("Change stream interrupted (%s); reconnecting", e)
+                if _token_lost(e):
+                    self._resume_token = None
+                self.invalidate()
+                stop.wait(self.poll_interval)
+            except Exception as e:
+                logger.warning("Change stream watcher stopped (%s); polling wastebins every %ss", e, self.poll_interval)
+                return False
+        return True
+
+    def _fingerprint(self):
+        latest = list(self.collection.find({}, {'_id': 1}).sort('_id', -1).limit(1))
+        touched = list(self.collection.find({}, {'updatedAt': 1}).sort('updatedAt', -1).limit(1))
+        return (
+            self.collection.estimated_document_count(),
+            latest[0]['_id'] if latest else None,
+            touched[0].get('updatedAt') if touched else None,
+        )
+
+    def _poll_loop(self, stop):
+        while not stop.is_set():
+            try:
+                current = self._fingerprint()
+                if self._last_fingerprint is not None and current != self._last_fingerprint:
+                    self.invalidate()
+                self._last_fingerprint = current
+            except Exception as e:
+                logger.warning("Snapshot poll error: %s", e)
+            stop.wait(self.poll_interval)
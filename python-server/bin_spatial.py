@@ -0,0 +1,76 @@
+"""
+Spatial index over bin coordinates, built once per snapshot.
+
+BinSpatialIndex answers the map queries without scanning every bin:
+
+- near(): bins within a radius of a point and/or the k nearest bins, from
+  a haversine BallTree,
+- within(): bins inside a viewport bounding box, from the bins sorted by
+  latitude (binary search on latitude, then a longitude filter).
+
+Results are snapshot row positions, nearest first for near().
+"""
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from bin_geo import EARTH_RADIUS_KM, coordinates
+
+EARTH_RADIUS_M = EARTH_RADIUS_KM * 1000.0
+
+
+class BinSpatialIndex:
+    """Read-only once built; bins without a valid position are left out."""
+
+    def __init__(self, frame, version=None):
+        self.version = version
+        self.frame = frame
+        self.lat, self.lon = coordinates(frame) if len(frame) else (np.empty(0), np.empty(0))
+        located = np.isfinite(self.lat) & np.isfinite(self.lon)
+        self.positions = np.flatnonzero(located)
+        self.size = len(self.positions)
+
+        self._tree = None
+        if self.size:
+            points = np.radians(np.column_stack([self.lat[self.positions], self.lon[self.positions]]))
+            self._tree = BallTree(points, metric='haversine')
+
+        by_lat = np.argsort(self.lat[self.positions], kind='stable')
+        self._lat_order = self.positions[by_lat]
+        self._lat_sorted = self.lat[self._lat_order]
+
+    def near(self, lat, lon, radius_m=None, k=None):
+        """
+        (positions, distances in metres) around (lat, lon), nearest first.
+
+        With radius_m only bins within it are returned; with k at most the
+        k nearest. At least one of the two must be given.
+        """
+        empty = (np.empty(0, dtype='int64'), np.empty(0))
+        if not self.size:
+            return empty
+        point = np.radians([[lat, lon]])
+        if radius_m is not None:
+            ind, dist = self._tree.query_radius(point, r=radius_m / EARTH_RADIUS_M,
+                                                return_distance=True, sort_results=True)
+            ind, dist = ind[0], dist[0]
+            if k is not None:
+                ind, dist = ind[:k], dist[:k]
+        elif k is not None:
+            dist, ind = self._tree.query(point, k=min(k, self.size))
+            ind, dist = ind[0], dist[0]
+        else:
+            raise ValueError("near() needs radius_m or k")
+        return self.positions[ind], dist * EARTH_RADIUS_M
+
+    def within(self, west, south, east, north):
+        """Positions inside the box; west > east means the box crosses the antimeridian."""
+        lo = np.searchsorted(self._lat_sorted, south, side='left')
+        hi = np.searchsorted(self._lat_sorted, north, side='right')
+        candidates = self._lat_order[lo:hi]
+        lon = self.lon[candidates]
+        if west <= east:
+            keep = (lon >= west) & (lon <= east)
+        else:
+            keep = (lon >= west) | (lon <= east)
+        return np.sort(candidates[keep])
@@ -0,0 +1,250 @@
+"""
+Incremental loading of the wastebins collection into a normalized DataFrame.
+
+After one full load, refresh() only fetches documents that changed since the
+last watermark and patches them into the frame by _id:
+
+- updatedAt >= the newest updatedAt already seen minus CLOCK_SKEW (set by
+  mongoose timestamps on the app servers, whose clocks may disagree),
+- _id > the newest ObjectId already seen, for inserts without updatedAt,
+- ids reported by a change stream through record_change().
+
+Fetched documents that match their row in the frame are dropped, so a
+refresh that finds nothing new returns the same frame object.
+
+Deleted bins come from change-stream delete events, or are detected when the
+collection count no longer matches the frame, in which case only the _id
+column is scanned.
+"""
+
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from bin_columnar import read_bins
+
+logger = logging.getLogger(__name__)
+
+UPDATED_FIELD = 'updatedAt'
+
+# Margin below the updatedAt watermark that absorbs clock skew between app
+# servers; re-read bins that have not changed are dropped again.
+CLOCK_SKEW = pd.Timedelta(seconds=60)
+
+
+class IncrementalBinLoader:
+    """
+    Callable loader: the first call does a full load, later calls refresh().
+
+    normalize(df) turns raw documents into the normalized frame and must work
+    on any subset of rows. Each call returns a new frame; frames handed out
+    earlier are never modified, so readers holding them stay consistent.
+    """
+
+    def __init__(self, collection, normalize, fields=None, updated_field=UPDATED_FIELD,
+                 full_reload_every=0, on_rows=None):
+        self.collection = collection
+        self.normalize = normalize
+        # Called with the normalized rows of every load/refresh (e.g. fill history)
+        self.on_rows = on_rows
+        # Projected fields (see bin_columnar.PROJECTION_PROFILES); None reads whole documents
+        self.fields = list(fields) if fields else None
+        if self.fields and updated_field not in self.fields:
+            self.fields.append(updated_field)
+        self.updated_field = updated_field
+        # Resync from scratch every N refreshes to bound any drift (0 = never)
+        self.full_reload_every = full_reload_every
+
+        self._lock = threading.Lock()
+        self._frame = None
+        self._max_updated = None
+        self._max_id = None
+        self._changed_ids = set()
+        self._deleted_ids = set()
+        self._refreshes_since_full = 0
+        self.last_refresh = {}
+
+    @property
+    def frame(self):
+        return self._frame
+
+    def __call__(self):
+        if self._frame is None or (
+            self.full_reload_every and self._refreshes_since_full >= self.full_reload_every
+        ):
+            return self.load_full()
+        return self.refresh()
+
+    def record_change(self, event):
+        """Remember the bin touched by a change-stream event for the next refresh."""
+        key = (event.get('documentKey') or {}).get('_id')
+        op = event.get('operationType')
+        with self._lock:
+            if op in ('drop', 'rename', 'dropDatabase', 'invalidate'):
+                self._frame = None
+            elif key is None:
+                return
+            elif op == 'delete':
+                self._deleted_ids.add(key)
+                self._changed_ids.discard(key)
+            else:
+                self._changed_ids.add(key)
+                self._deleted_ids.discard(key)
+
+    def _notify(self, rows):
+        if self.on_rows is None or rows.empty:
+            return
+        try:
+            self.on_rows(rows)
+        except Exception as e:
+            logger.warning("Bin loader on_rows callback failed: %s", e)
+
+    def _find(self, query, size_hint=None):
+        if self.fields is None:
+            return pd.DataFrame(list(self.collection.find(query))), None
+        frame, stats = read_bins(self.collection, query, self.fields, size_hint=size_hint)
+        return frame, stats["bytes"]
+
+    def _advance_watermarks(self, raw):
+        if raw.empty:
+            return
+        if self.updated_field in raw.columns:
+            newest = pd.to_datetime(raw[self.updated_field], errors='coerce').max()
+            if pd.notna(newest) and (self._max_updated is None or newest > self._max_updated):
+                self._max_updated = newest
+        newest_id = max(raw['_id'])
+        if self._max_id is None or newest_id > self._max_id:
+            self._max_id = newest_id
+
+    def load_full(self):
+        with self._lock:
+            self._changed_ids.clear()
+            self._deleted_ids.clear()
+        started = pd.Timestamp.utcnow().tz_localize(None)
+        raw, received = self._find({}, size_hint=self.collection.estimated_document_count())
+        self._max_updated = None
+        self._max_id = None
+        self._advance_watermarks(raw)
+        if self._max_updated is None:
+            self._max_updated = started
+
+        frame = self.normalize(raw) if not raw.empty else raw
+        self._frame = frame.reset_index(drop=True)
+        self._notify(self._frame)
+        self._refreshes_since_full = 0
+        self.last_refresh = {
+            "mode": "full",
+            "fetched": len(raw),
+            "deleted": 0,
+            "rows": len(frame),
+            "bytes": received,
+        }
+        return self._frame
+
+    def refresh(self):
+        if self._frame is None or self._frame.empty:
+            return self.load_full()
+
+        with self._lock:
+            changed_ids = list(self._changed_ids)
+            deleted_ids = set(self._deleted_ids)
+            self._changed_ids.clear()
+            self._deleted_ids.clear()
+
+        clauses = []
+        if self._max_updated is not None:
+            # A bin saved by an app server whose clock runs behind can carry an updatedAt
+            # below the watermark; patching is by _id, so re-reading it is harmless
+            clauses.append({self.updated_field: {'$gte': (self._max_updated - CLOCK_SKEW).to_pydatetime()}})
+        if self._max_id is not None:
+            clauses.append({'_id': {'$gt': self._max_id}})
+        if changed_ids:
+            clauses.append({'_id': {'$in': changed_ids}})
+        raw, received = self._find({'$or': clauses}) if clauses else (pd.DataFrame(), 0)
+        self._advance_watermarks(raw)
+
+        frame = self._frame
+        fetched = len(raw)
+        if not raw.empty:
+            patch = self.normalize(raw).drop_duplicates('_id', keep='last').reset_index(drop=True)
+            patch = patch[_changed_rows(frame, patch)]
+            if not patch.empty:
+                self._notify(patch)
+                frame = _patch_rows(frame, patch)
+
+        # The count only drops below the frame size when something was deleted
+        known_deleted = int(frame['_id'].isin(deleted_ids).sum()) if deleted_ids else 0
+        if len(frame) - known_deleted != self.collection.estimated_document_count():
+            live = {doc['_id'] for doc in self.collection.find({}, {'_id': 1})}
+            deleted_ids |= set(frame['_id']) - live
+        if deleted_ids:
+            frame = frame[~frame['_id'].isin(deleted_ids)].reset_index(drop=True)
+
+        self._frame = frame
+        self._refreshes_since_full += 1
+        self.last_refresh = {
+            "mode": "incremental",
+            "fetched": fetched,
+            "changed": len(patch) if fetched else 0,
+            "deleted": len(deleted_ids),
+            "rows": len(frame),
+            "bytes": received,
+        }
+        return frame
+
+
+def _column_values(df, col, rows):
+    if col not in df.columns:
+        return np.full(len(rows), None, dtype=object)
+    return df[col].iloc[rows].to_numpy(dtype=object)
+
+
+def _changed_rows(frame, patch):
+    """Mask of the patch rows that are new bins or differ from their row in frame."""
+    positions = pd.Index(frame['_id']).get_indexer(patch['_id'])
+    changed = positions < 0
+    existing = np.flatnonzero(~changed)
+    rows = positions[existing]
+    for col in frame.columns.union(patch.columns):
+        old = _column_values(frame, col, rows)
+        new = _column_values(patch, col, existing)
+        same = (old == new) | (pd.isna(old) & pd.isna(new))
+        changed[existing[~same]] = True
+    return changed
+
+
+def _patch_rows(frame, patch):
+    """
+    Return a copy of frame with patch rows (unique _ids) applied by _id.
+
+    Existing bins are updated where they are, so row order (and the POST
+    /schedule query_index) stays stable; new bins are appended. Columns the
+    patch lacks (fields no fetched document has any more) become missing.
+    """
+    positions = pd.Index(frame['_id']).get_indexer(patch['_id'])
+    existing = positions >= 0
+
+    out = frame.copy()
+    for col in patch.columns:
+        if col in out.columns and isinstance(out[col].dtype, pd.CategoricalDtype):
+            # Widen categoricals on both sides so new labels can be written and concatenated
+            labels = out[col].cat.categories.union(pd.Index(patch[col].dropna().unique()))
+            out[col] = out[col].cat.set_categories(labels)
+            patch[col] = pd.Categorical(patch[col], categories=labels)
+
+    if existing.any():
+        rows = positions[existing]
+        for col in patch.columns:
+            values = patch[col].to_numpy()[existing]
+            if col not in out.columns:
+                out[col] = None
+            out.iloc[rows, out.columns.get_loc(col)] = values
+        for col in out.columns.difference(patch.columns):
+            # $unset in MongoDB: the patched rows must not keep the old value
+            out.iloc[rows, out.columns.get_loc(col)] = None
+
+    if (~existing).any():
+        out = pd.concat([out, patch[~existing]], ignore_index=True)
+    return out
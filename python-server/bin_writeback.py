@@ -0,0 +1,99 @@
+"""
+Batched write-back of schedule predictions to the wastebins collection.
+
+Only bins whose predicted fields changed since the last write are sent, and the
+resulting UpdateOne ops go out as unordered bulk_write calls of bounded size.
+updatedAt is left alone: the predictions are derived data, and the snapshot
+loader and fill history take updatedAt as the time of the bin's last real
+(sensor or user) change.
+"""
+
+import math
+import os
+import threading
+
+from pymongo import UpdateOne
+
+WRITE_FIELDS = ('predictedApproxTime', 'predictedEmptyingDateTime', 'status')
+DEFAULT_CHUNK_SIZE = int(os.environ.get('SCHEDULE_WRITE_CHUNK_SIZE', 1000))
+
+
+def _normalize(value):
+    # NaN never equals itself and numpy scalars don't round-trip through BSON,
+    # so fold both into plain Python values before comparing/sending.
+    if value is None:
+        return None
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class BinWriteBack:
+    """Remembers the last values written per bin and only sends deltas."""
+
+    def __init__(self, collection, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.collection = collection
+        self.chunk_size = max(int(chunk_size), 1)
+        self._last_written = {}
+        self._lock = threading.Lock()
+
+    def plan(self, ids, columns, stored=None):
+        """
+        Build UpdateOne ops for bins whose values differ from the last write.
+
+        ids: sequence of bin _ids.
+        columns: dict of field name -> sequence aligned with ids.
+        stored: optional dict of field name -> sequence with the values the
+            documents already hold; used for bins not written by this process.
+        Returns (ops, pending) where pending maps _id -> new values tuple.
+        """
+        fields = [f for f in WRITE_FIELDS if f in columns]
+        values = [columns[f] for f in fields]
+        previous = [stored[f] if stored is not None and f in stored else None for f in fields]
+
+        ops = []
+        pending = {}
+        with self._lock:
+            for i, bin_id in enumerate(ids):
+                new = tuple(_normalize(col[i]) for col in values)
+                old = self._last_written.get(bin_id)
+                if old is None:
+                    old = tuple(_normalize(col[i]) if col is not None else None for col in previous)
+                if old == new:
+                    continue
+                ops.append(UpdateOne(
+                    {"_id": bin_id},
+                    {"$set": dict(zip(fields, new))},
+                ))
+                pending[bin_id] = new
+        return ops, pending
+
+    def write(self, ids, columns, stored=None, full_fleet=True):
+        """
+        Send changed predictions in unordered chunks and report the counts.
+
+        full_fleet=False for partial writes (e.g. a single bin), which must not
+        prune the remembered values of the bins that were left out.
+        """
+        ops, pending = self.plan(ids, columns, stored)
+        chunks = 0
+        for start in range(0, len(ops), self.chunk_size):
+            self.collection.bulk_write(ops[start:start + self.chunk_size], ordered=False)
+            chunks += 1
+
+        with self._lock:
+            self._last_written.update(pending)
+            # Forget bins that no longer exist so the map tracks the live fleet
+            if full_fleet and len(self._last_written) > len(ids):
+                live = set(ids)
+                for bin_id in [b for b in self._last_written if b not in live]:
+                    del self._last_written[bin_id]
+
+        return {
+            "sent": len(ops),
+            "skipped": len(ids) - len(ops),
+            "chunks": chunks,
+            "chunkSize": self.chunk_size,
+        }
@@ -0,0 +1,366 @@
+"""
+Cached bin-to-bin distances for routing.
+
+DistanceMatrix keeps haversine kilometres between every pair of bins in a
+memory-mapped float32 file under DISTANCE_MATRIX_DIR. Each bin owns a slot
+(a row and column). sync() compares a snapshot with the stored slots by _id
+and coordinates, and only recomputes the rows and columns of bins that were
+added or moved, a block of rows at a time. Slots of deleted bins are reused.
+The file survives restarts; meta.json records which bin is in which slot and
+the snapshot version it matches. The dense file grows a block of slots at a
+time up to DISTANCE_DENSE_MAX, copying the old file a block of rows at a
+time.
+
+Readers pass the snapshot version they work on; route_matrix() and
+neighbors() return None once a different snapshot has been synced, since
+the slots no longer line up with their rows. With `shared` set (the prefork
+master, whose workers map the same files), a sync that changes distances
+writes them to a fresh copy of the files, so workers keep reading the
+distances of the snapshot they were forked with.
+
+Fleets larger than DISTANCE_DENSE_MAX bins switch to a sparse mode. There
+sync() only tracks slots and positions, and route matrices are computed
+directly for the few thousand stops of a request. Each bin's DISTANCE_KNN
+nearest neighbours are found on the first neighbors() call after a change,
+with a KD-tree over points on the unit sphere (chord distance ranks
+neighbours like great-circle distance), and kept in memory. Only the lists
+that the changes since the last call can affect are recomputed.
+"""
+
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from bin_geo import chord_to_km, coordinates, haversine_km, pairwise_km, unit_vectors
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIR = os.environ.get(
+    'DISTANCE_MATRIX_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'distance_matrix')
+)
+# Above this many located bins only k-nearest-neighbour lists are kept (dense is n^2 * 4 bytes)
+DENSE_MAX = int(os.environ.get('DISTANCE_DENSE_MAX', 10000))
+KNN_K = int(os.environ.get('DISTANCE_KNN', 32))
+BLOCK_ROWS = 1024
+INITIAL_SLOTS = 1024
+
+META_FILE = 'meta.json'
+DENSE = 'dense'
+SPARSE = 'sparse'
+
+
+class DistanceMatrix:
+    def __init__(self, root=DEFAULT_DIR, dense_max=DENSE_MAX, k=KNN_K, block=BLOCK_ROWS):
+        self.root = root
+        self.dense_max = dense_max
+        self.k = k
+        self.block = block
+        self.shared = False
+        self._lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+
+        self.mode = None
+        self.version = None
+        self._ids = []            # slot -> bin id (None = free)
+        self._slots = {}          # bin id -> slot
+        self._row_slots = np.empty(0, dtype='int64')  # snapshot row -> slot (-1 = no position)
+        self.lat = np.empty(0)
+        self.lon = np.empty(0)
+        self.dense = None
+        self.knn_idx = None
+        self.knn_dist = None
+        # Sparse mode: slots moved/added and removed since the kNN lists were last brought up to date
+        self._knn_changed = set()
+        self._knn_removed = set()
+        self.stats_ = {"syncs": 0, "fullBuilds": 0, "rowsComputed": 0, "lastChanged": 0}
+        self._load()
+
+    # Storage
+
+    def _file(self, name):
+        return os.path.join(self.root, name)
+
+    def _load(self):
+        meta_path = self._file(META_FILE)
+        if not os.path.exists(meta_path):
+            return
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self.mode = meta['mode']
+            self._ids = meta['ids']
+            self.lat = np.load(self._file('lat.npy'))
+            self.lon = np.load(self._file('lon.npy'))
+            if self.mode == DENSE:
+                self.dense = np.load(self._file('dense.npy'), mmap_mode='r+')
+            self._slots = {bin_id: slot for slot, bin_id in enumerate(self._ids) if bin_id is not None}
+            if self.mode == SPARSE:
+                # The kNN lists are not stored; rebuild them all on first use
+                self._allocate(max(len(self._ids), INITIAL_SLOTS), keep=False)
+                self._knn_changed = set(self._slots.values())
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Distance matrix cache unreadable (%s); rebuilding", e)
+            self.mode = None
+            self._ids, self._slots = [], {}
+            self.lat, self.lon = np.empty(0), np.empty(0)
+
+    def _save_meta(self):
+        np.save(self._file('lat.npy'), self.lat)
+        np.save(self._file('lon.npy'), self.lon)
+        tmp = self._file(META_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'mode': self.mode, 'version': self.version, 'ids': self._ids}, f)
+        os.replace(tmp, self._file(META_FILE))
+
+    def _new_memmap(self, name, shape, dtype, fill, copy_from=None):
+        tmp = self._file(name + '.tmp')
+        arr = np.lib.format.open_memmap(tmp, mode='w+', dtype=dtype, shape=shape)
+        arr[:] = fill
+        if copy_from is not None:
+            # A block of rows at a time from the old file, never the whole matrix in memory
+            columns = tuple(slice(0, s) for s in copy_from.shape[1:])
+            for start in range(0, len(copy_from), self.block):
+                part = copy_from[start:start + self.block]
+                arr[(slice(start, start + len(part)),) + columns] = part
+        arr.flush()
+        del arr
+        os.replace(tmp, self._file(name))
+        return np.load(self._file(name), mmap_mode='r+')
+
+    def _allocate(self, capacity, keep):
+        """(Re)create the storage of the current mode with room for `capacity` slots."""
+        if self.mode == DENSE:
+            old = self.dense if keep else None
+            self.dense = self._new_memmap('dense.npy', (capacity, capacity), 'float32', np.nan, old)
+        else:
+            idx = np.full((capacity, self.k), -1, dtype='int32')
+            dist = np.full((capacity, self.k), np.inf, dtype='float32')
+            if keep and self.knn_idx is not None:
+                idx[:len(self.knn_idx)] = self.knn_idx
+                dist[:len(self.knn_dist)] = self.knn_dist
+            self.knn_idx, self.knn_dist = idx, dist
+
+    def _capacity(self):
+        store = self.dense if self.mode == DENSE else self.knn_idx
+        return 0 if store is None else len(store)
+
+    # Sync
+
+    def sync(self, frame, version=None):
+        """Bring the cache in line with a bins snapshot; returns self for PerSnapshot."""
+        with self._lock:
+            ids = frame['_id'].astype(str).to_numpy() if len(frame) else np.empty(0, dtype=object)
+            lat, lon = coordinates(frame) if len(frame) else (np.empty(0), np.empty(0))
+            located = np.isfinite(lat) & np.isfinite(lon)
+            mode = DENSE if located.sum() <= self.dense_max else SPARSE
+
+            full = mode != self.mode
+            if full:
+                self.mode = mode
+                self._ids, self._slots = [], {}
+                self.lat, self.lon = np.empty(0), np.empty(0)
+                self.dense = self.knn_idx = self.knn_dist = None
+                self._knn_changed, self._knn_removed = set(), set()
+
+            # Free the slots of bins that are gone or lost their position
+            wanted = set(ids[located])
+            removed = [slot for bin_id, slot in self._slots.items() if bin_id not in wanted]
+            for slot in removed:
+                del self._slots[self._ids[slot]]
+                self._ids[slot] = None
+            if removed:
+                self.lat[removed] = np.nan
+                self.lon[removed] = np.nan
+
+            # Place new bins in free slots (then at the end) and find moved ones
+            free = [slot for slot, bin_id in enumerate(self._ids) if bin_id is None][::-1]
+            row_slots = np.full(len(ids), -1, dtype='int64')
+            changed = []
+            for row in np.flatnonzero(located):
+                bin_id = ids[row]
+                slot = self._slots.get(bin_id)
+                if slot is None:
+                    slot = free.pop() if free else len(self._ids)
+                    if slot == len(self._ids):
+                        self._ids.append(bin_id)
+                    else:
+                        self._ids[slot] = bin_id
+                    self._slots[bin_id] = slot
+                    changed.append(slot)
+                elif self.lat[slot] != lat[row] or self.lon[slot] != lon[row]:
+                    changed.append(slot)
+                row_slots[row] = slot
+
+            size = len(self._ids)
+            if size > len(self.lat):
+                grown = max(size, 2 * len(self.lat))
+                self.lat = np.r_[self.lat, np.full(grown - len(self.lat), np.nan)]
+                self.lon = np.r_[self.lon, np.full(grown - len(self.lon), np.nan)]
+            placed = row_slots >= 0
+            self.lat[row_slots[placed]] = lat[placed]
+            self.lon[row_slots[placed]] = lon[placed]
+
+            changed = np.array(sorted(set(changed)), dtype='int64')
+            if size > self._capacity():
+                self._allocate(self._grown_capacity(size), keep=not full)
+            elif self.shared and self.mode == DENSE and (len(changed) or removed):
+                # Leave the files the workers map untouched; update a copy
+                self._allocate(self._capacity(), keep=True)
+
+            if self.mode == DENSE:
+                self._update_dense(changed, size)
+            else:
+                self._knn_changed.update(changed.tolist())
+                self._knn_removed.update(removed)
+
+            self._row_slots = row_slots
+            self.version = version
+            self.stats_["syncs"] += 1
+            self.stats_["fullBuilds"] += int(full)
+            self.stats_["lastChanged"] = int(len(changed))
+            if full or len(changed) or removed:
+                self._save_meta()
+            return self
+
+    def _update_dense(self, changed, size):
+        if not len(changed):
+            return
+        lat, lon = self.lat[:size], self.lon[:size]
+        for start in range(0, len(changed), self.block):
+            rows = changed[start:start + self.block]
+            block = haversine_km(lat[rows, None], lon[rows, None], lat[None, :], lon[None, :]).astype('float32')
+            self.dense[rows, :size] = block
+            if len(changed) < size:
+                # Symmetric: the columns of the changed bins too (rows cover it on a full build)
+                self.dense[:size, rows] = block.T
+        self.dense.flush()
+        self.stats_["rowsComputed"] += int(len(changed))
+
+    def _update_sparse(self, changed, removed, size):
+        live = np.flatnonzero(~np.isnan(self.lat[:size]))
+        if not len(live):
+            return
+        tree = cKDTree(unit_vectors(self.lat[live], self.lon[live]))
+
+        # Bins whose neighbour lists can change: the moved/added ones, those that listed a
+        # moved/removed bin, and those a moved/added bin is now closer to than their k-th neighbour
+        kth = np.asarray(self.knn_dist[live, -1], dtype='float64')
+        if len(changed) * 2 >= len(live) or not np.isfinite(kth).any():
+            rows = live
+        else:
+            stale = set(changed.tolist())
+            touched = np.r_[changed, removed]
+            if len(touched):
+                stale.update(live[np.isin(np.asarray(self.knn_idx[live]), touched).any(axis=1)].tolist())
+            if len(changed):
+                # Nearest moved/added bin of every bin, from a small tree over just those
+                chord, _ = cKDTree(unit_vectors(self.lat[changed], self.lon[changed])).query(
+                    unit_vectors(self.lat[live], self.lon[live]), k=1)
+                # inf k-th distance (short list) compares as "closer", so those are refreshed too
+                stale.update(live[chord_to_km(chord) < kth].tolist())
+            rows = np.array(sorted(stale), dtype='int64')
+        if not len(rows):
+            return
+
+        k = min(self.k + 1, len(live))
+        width = min(self.k, k)
+        for start in range(0, len(rows), self.block * 8):
+            part = rows[start:start + self.block * 8]
+            chord, ind = tree.query(unit_vectors(self.lat[part], self.lon[part]), k=k)
+            if k == 1:
+                chord, ind = chord[:, None], ind[:, None]
+            slots = live[ind]
+            # Drop the bin itself (stable sort moves it last), keep the k nearest others
+            order = np.argsort(slots == part[:, None], axis=1, kind='stable')[:, :width]
+            keep_slots = np.take_along_axis(slots, order, axis=1)
+            keep_dist = chord_to_km(np.take_along_axis(chord, order, axis=1))
+            is_self = keep_slots == part[:, None]
+            out_idx = np.full((len(part), self.k), -1, dtype='int32')
+            out_dist = np.full((len(part), self.k), np.inf, dtype='float32')
+            out_idx[:, :width] = np.where(is_self, -1, keep_slots)
+            out_dist[:, :width] = np.where(is_self, np.inf, keep_dist)
+            self.knn_idx[part] = out_idx
+            self.knn_dist[part] = out_dist
+        self.stats_["rowsComputed"] += int(len(rows))
+
+    def _ensure_knn(self):
+        """Bring the sparse kNN lists up to date with the syncs since the last call."""
+        if not self._knn_changed and not self._knn_removed:
+            return
+        # A slot freed again since it changed is only a removal now
+        changed = np.array(sorted(s for s in self._knn_changed if self._ids[s] is not None), dtype='int64')
+        removed = np.array(sorted(self._knn_removed), dtype='int64')
+        self._update_sparse(changed, removed, len(self._ids))
+        self._knn_changed, self._knn_removed = set(), set()
+
+    def _grown_capacity(self, size):
+        if self.mode == DENSE:
+            # n^2 storage: whole blocks of slots up to the dense limit, not doubling
+            blocks = -(-size // self.block)
+            return max(min(blocks * self.block, self.dense_max), size)
+        capacity = max(INITIAL_SLOTS, self._capacity())
+        while capacity < size:
+            capacity *= 2
+        return capacity
+
+    # Reads
+
+    def route_matrix(self, positions, depot, version=None):
+        """
+        (m + 1) x (m + 1) float32 km matrix over [depot] + the given snapshot rows.
+
+        Dense mode gathers the cached block; sparse mode computes it. Rows
+        without a position get NaN distances. None when version is given and
+        the cache has been synced with another snapshot since.
+        """
+        with self._lock:
+            if version is not None and version != self.version:
+                return None
+            slots = self._row_slots[np.asarray(positions, dtype='int64')]
+            lat = np.where(slots >= 0, self.lat[np.maximum(slots, 0)], np.nan)
+            lon = np.where(slots >= 0, self.lon[np.maximum(slots, 0)], np.nan)
+            out = np.empty((len(slots) + 1, len(slots) + 1), dtype='float32')
+            if self.mode == DENSE and (slots >= 0).all():
+                out[1:, 1:] = self.dense[np.ix_(slots, slots)]
+            else:
+                out[1:, 1:] = pairwise_km(lat, lon)
+        out[0, 1:] = out[1:, 0] = haversine_km(depot[0], depot[1], lat, lon)
+        out[0, 0] = 0.0
+        return out
+
+    def neighbors(self, positions, version=None):
+        """
+        (snapshot rows, km) of the cached nearest neighbours of the given rows;
+        -1 pads short lists. None when version is given and the cache has
+        been synced with another snapshot since.
+        """
+        with self._lock:
+            if version is not None and version != self.version:
+                return None
+            slots = self._row_slots[np.asarray(positions, dtype='int64')]
+            if self.mode == DENSE:
+                size = len(self._ids)
+                block = np.array(self.dense[slots, :size], dtype='float32')
+                block[np.arange(len(slots)), slots] = np.inf
+                k = min(self.k, size - 1) if size > 1 else 0
+                ind = np.argsort(block, axis=1)[:, :k]
+                dist = np.take_along_axis(block, ind, axis=1)
+            else:
+                self._ensure_knn()
+                ind = self.knn_idx[slots]
+                dist = self.knn_dist[slots]
+            # slot -> snapshot row
+            rows = np.full(len(self._ids) + 1, -1, dtype='int64')
+            placed = self._row_slots >= 0
+            rows[self._row_slots[placed]] = np.flatnonzero(placed)
+            out = np.where(ind >= 0, rows[np.maximum(ind, 0)], -1)
+            return out, np.where(out >= 0, dist, np.inf)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.stats_, mode=self.mode, version=self.version,
+                        bins=len(self._slots), slots=len(self._ids), capacity=self._capacity())
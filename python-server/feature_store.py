@@ -0,0 +1,118 @@
+"""
+Feature matrix shared by the SPM trainers and predictors.
+
+FeatureStore materializes one C-contiguous float32 matrix per bins snapshot.
+It holds the model features and the derived columns, with NaN already
+replaced by 0. Trainers and predictors get views of it instead of
+converting bins_df[features].fillna(0) on every call. The model features
+are the leading columns, so the standard view is a plain slice. Scaled
+variants are computed once per (snapshot, scaler).
+
+What is shared is the conversion, not the training data: train_test_split
+still copies the rows of each split, and train-all workers build their own
+matrix from the bins they are sent. Predictions read the matrix in place.
+
+New features go in COLUMNS (and MODEL_FEATURES if the models use them).
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Features the SPM models are trained on, in training order
+MODEL_FEATURES = ['totalCapacity', 'realTimeCapacity', 'wasteQuantityPerDay', 'capacity_ratio']
+
+# All materialized columns; MODEL_FEATURES must stay a leading prefix
+COLUMNS = MODEL_FEATURES + ['remaining_capacity', 'fill_rate']
+
+DTYPE = np.float32
+
+
+def _column(bins_df, name):
+    if name in bins_df.columns:
+        return pd.to_numeric(bins_df[name], errors='coerce').to_numpy(dtype='float64')
+    return np.zeros(len(bins_df))
+
+
+class FeatureSet:
+    """Feature matrix of one snapshot; treat the arrays as read-only."""
+
+    def __init__(self, bins_df):
+        n = len(bins_df)
+        self.index = {name: i for i, name in enumerate(COLUMNS)}
+        self.matrix = np.empty((n, len(COLUMNS)), dtype=DTYPE)
+
+        total = _column(bins_df, 'totalCapacity')
+        real = _column(bins_df, 'realTimeCapacity')
+        per_day = _column(bins_df, 'wasteQuantityPerDay')
+        derived = {
+            'totalCapacity': total,
+            'realTimeCapacity': real,
+            'wasteQuantityPerDay': per_day,
+            'capacity_ratio': _column(bins_df, 'capacity_ratio') if 'capacity_ratio' in bins_df.columns
+            else real / np.where(total == 0, np.nan, total),
+            'remaining_capacity': total - real,
+            'fill_rate': per_day / 24.0,  # per hour
+        }
+        for name, values in derived.items():
+            self.matrix[:, self.index[name]] = values
+        self.matrix[~np.isfinite(self.matrix)] = 0
+        self.matrix.setflags(write=False)
+        self._scaled = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def view(self, names=None):
+        """(n, len(names)) array; a view without copying when names are consecutive columns."""
+        names = MODEL_FEATURES if names is None else list(names)
+        cols = [self.index[n] for n in names]
+        if cols == list(range(cols[0], cols[0] + len(cols))):
+            return self.matrix[:, cols[0]:cols[0] + len(cols)]
+        return self.matrix[:, cols]
+
+    def frame(self, names=None):
+        """DataFrame over view(names) with the feature names the models were fitted with."""
+        names = MODEL_FEATURES if names is None else list(names)
+        return pd.DataFrame(self.view(names), columns=names, copy=False)
+
+    def column(self, name):
+        return self.matrix[:, self.index[name]]
+
+    def scaled(self, scaler, names=None):
+        """scaler.transform(view(names)), computed once per scaler for this snapshot."""
+        names = MODEL_FEATURES if names is None else list(names)
+        key = (id(scaler), tuple(names))
+        with self._lock:
+            cached = self._scaled.get(key)
+            # Keep the scaler referenced so its id cannot be reused while cached
+            if cached is None or cached[0] is not scaler:
+                values = np.ascontiguousarray(scaler.transform(self.frame(names)), dtype=DTYPE)
+                values.setflags(write=False)
+                cached = (scaler, values)
+                self._scaled[key] = cached
+            return cached[1]
+
+
+class FeatureStore:
+    """Hands out the FeatureSet of the current bins_df, building it once per snapshot."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key = None
+        self._features = None
+        self.builds = 0
+
+    def get(self, bins_df, version=None):
+        key = (version, id(bins_df), len(bins_df))
+        features = self._features
+        if features is not None and self._key == key:
+            return features
+        with self._lock:
+            if self._features is None or self._key != key:
+                self._features = FeatureSet(bins_df)
+                self._key = key
+                self.builds += 1
+            return self._features
@@ -0,0 +1,156 @@
+"""
+Fleet-wide fill-rate estimation from the fill-level history.
+
+fit_fill_rates() fits one exponentially weighted least-squares line per bin
+to its recent readings. It works on a (bins x readings) matrix, so the whole
+fleet is fitted with a handful of NumPy reductions and no per-bin Python.
+The slope is the fill rate per hour. Its standard error gives a confidence
+interval, and hours_until_full_bounds() turns that into hoursUntilFull with
+lower and upper bounds.
+
+Only readings since the bin was last emptied are used: a drop of more than
+EMPTIED_DROP of the bin's capacity starts a new fill cycle. Bins without
+enough readings in the current cycle fall back to the wasteQuantityPerDay
+rate that bin_math.hours_until_full uses, without bounds.
+"""
+
+import os
+
+import numpy as np
+
+import bin_math
+
+# Readings per bin that take part in the fit (the newest ones)
+WINDOW = int(os.environ.get('FORECAST_WINDOW', 48))
+# Age at which a reading counts half as much as the newest one
+HALF_LIFE_HOURS = float(os.environ.get('FORECAST_HALF_LIFE_HOURS', 24))
+# Readings in the current fill cycle needed before the history is trusted
+MIN_READINGS = 3
+# A drop of more than this fraction of totalCapacity means the bin was emptied
+EMPTIED_DROP = 0.05
+# Two-sided 95% normal quantile for the rate interval
+CONFIDENCE_Z = 1.96
+
+METHOD_NONE = 0
+METHOD_RATE = 1
+METHOD_HISTORY = 2
+METHODS = np.array([None, 'rate', 'history'], dtype=object)
+
+
+def current_cycle(values, mask, total_capacity):
+    """Narrow mask to the readings after each bin's last emptying; values are oldest first."""
+    drop = (np.abs(np.asarray(total_capacity, dtype='float64')) * EMPTIED_DROP).astype(values.dtype)
+    emptied = mask[:, 1:] & mask[:, :-1] & (values[:, 1:] < values[:, :-1] - drop[:, None])
+    # Column of the first reading of the current cycle (0 when never emptied)
+    last_drop = emptied[:, ::-1].argmax(axis=1)
+    start = np.where(emptied.any(axis=1), values.shape[1] - 1 - last_drop, 0)
+    return mask & (np.arange(values.shape[1])[None, :] >= start[:, None])
+
+
+def fit_fill_rates(times, values, mask, half_life_hours=HALF_LIFE_HOURS):
+    """
+    Weighted least-squares fill rate per bin.
+
+    times (epoch seconds), values and mask are (bins x readings) arrays,
+    oldest reading first, where the mask keeps the newest readings of each
+    row (as FillHistory.window and current_cycle produce). Reading weights
+    halve every half_life_hours of age, relative to each bin's newest reading.
+
+    Returns (rate, stderr, readings); rate and stderr are per hour and NaN
+    where fewer than MIN_READINGS readings are masked in. The standard error
+    treats the sensor noise as equal for every reading; the weights only say
+    how much the recent readings matter.
+    """
+    n = mask.sum(axis=1)
+    # Hours relative to the newest reading (<= 0); masked cells get weight 0
+    t = (times - times[:, -1:]).astype('float64')
+    t *= 1.0 / 3600.0
+    masked = ~mask
+    t[masked] = 0.0
+    v = values.astype('float64')
+    v[masked] = 0.0
+    w = np.exp2(t * (1.0 / half_life_hours))
+    w[masked] = 0.0
+
+    # Row sums of weighted raw moments; einsum avoids a temporary per product
+    def rows(a, b):
+        return np.einsum('ij,ij->i', a, b)
+
+    wt = w * t
+    ww = w * w
+    sw, swt, swv = w.sum(axis=1), wt.sum(axis=1), rows(w, v)
+    sww, swwt, swwtt = ww.sum(axis=1), rows(ww, t), np.einsum('ij,ij,ij->i', ww, t, t)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t_mean = swt / sw
+        stt = rows(wt, t) - swt * t_mean
+        stv = rows(wt, v) - swt * swv / sw
+        svv = np.einsum('ij,ij,ij->i', w, v, v) - swv * swv / sw
+        rate = stv / stt
+
+        # Residual variance with the effective sample size of the weights
+        rss = np.maximum(svv - rate * stv, 0.0)
+        n_eff = sw * sw / sww
+        sigma2 = rss / (sw * (1.0 - 2.0 / n_eff))
+        # Var(rate) = sigma2 * sum(w^2 (t - t_mean)^2) / stt^2
+        spread = swwtt - 2.0 * t_mean * swwt + t_mean * t_mean * sww
+        stderr = np.sqrt(sigma2 * spread) / stt
+
+    usable = (n >= MIN_READINGS) & (stt > 0) & (n_eff > 2.0)
+    rate[~usable] = np.nan
+    stderr[~usable] = np.nan
+    return rate, stderr, n.astype('int64')
+
+
+def hours_until_full_bounds(total_capacity, real_time_capacity, rate, stderr, z=CONFIDENCE_Z):
+    """
+    (hours, low, high) until full for per-hour fill rates and their standard errors.
+
+    The fastest plausible rate gives the low bound and the slowest the high
+    one. Rates that are not positive mean the bin is not filling: NaN, as in
+    bin_math.hours_until_full. A high bound is NaN when the interval reaches 0.
+    """
+    remaining = np.maximum(np.asarray(total_capacity, dtype='float64')
+                           - np.asarray(real_time_capacity, dtype='float64'), 0.0)
+
+    def until_full(r):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(r > 0, remaining / r, np.nan)
+
+    return until_full(rate), until_full(rate + z * stderr), until_full(rate - z * stderr)
+
+
+class FillForecaster:
+    """hoursUntilFull with confidence bounds for a bins snapshot, from a fill_history.FillHistory."""
+
+    def __init__(self, history, window=WINDOW, half_life_hours=HALF_LIFE_HOURS):
+        self.history = history
+        self.window = window
+        self.half_life_hours = half_life_hours
+
+    def estimate(self, frame):
+        """
+        Dict of per-row arrays aligned with frame: hours, low, high, rate, readings, method.
+
+        method is METHOD_HISTORY where the fitted rate is used and
+        METHOD_RATE for the wasteQuantityPerDay fallback (no bounds).
+        """
+        total = np.asarray(frame['totalCapacity'], dtype='float64')
+        real = np.asarray(frame['realTimeCapacity'], dtype='float64')
+        times, values, mask = self.history.window(frame['_id'].astype(str).to_numpy(), self.window)
+        mask = current_cycle(values, mask, total)
+        rate, stderr, readings = fit_fill_rates(times, values, mask, self.half_life_hours)
+        hours, low, high = hours_until_full_bounds(total, real, rate, stderr)
+
+        fitted = ~np.isnan(rate)
+        fallback = bin_math.hours_until_full(total, real, frame['wasteQuantityPerDay'])
+        hours = np.where(fitted, hours, fallback)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            per_hour = np.asarray(frame['wasteQuantityPerDay'], dtype='float64') / 24.0
+        return {
+            "hours": hours,
+            "low": np.where(fitted, low, np.nan),
+            "high": np.where(fitted, high, np.nan),
+            "rate": np.where(fitted, rate, per_hour),
+            "readings": readings,
+            "method": np.where(fitted, METHOD_HISTORY, np.where(np.isnan(fallback), METHOD_NONE, METHOD_RATE)),
+        }
@@ -0,0 +1,386 @@
+"""
+Local fill-level history: a fixed-size ring buffer of readings per bin.
+
+Readings (timestamp, realTimeCapacity) live in two memory-mapped .npy
+matrices of shape (bins, slots) under FILL_HISTORY_DIR: int64 epoch seconds
+and float32 fill levels. Each bin owns one row, so a per-bin range query
+reads one contiguous row, and a ward or fleet query gathers rows and works
+on them as (bins x slots) arrays. When a row is full, the oldest reading is
+overwritten, so disk use is bounded by bins * slots * 12 bytes.
+
+The bin id and ward of each row are kept in an append-only journal
+(rows.jsonl, one [row, id, ward] line per new bin or ward change), so a
+sync that adds a few bins writes a few lines rather than the whole id list.
+The journal is compacted to one line per row once it has grown to twice
+that.
+
+Readings are appended in time order per bin. A reading that is not newer than
+the bin's last one, or repeats its fill level, is ignored: re-recording the
+same snapshot is a no-op, and a document re-read for another field's change
+(and so re-stamped) adds no flat reading.
+"""
+
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DIR = os.environ.get(
+    'FILL_HISTORY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fill_history')
+)
+# Readings kept per bin (e.g. 512 = about 3 weeks of hourly readings)
+DEFAULT_SLOTS = int(os.environ.get('FILL_HISTORY_SLOTS', 512))
+INITIAL_BINS = 1024
+
+META_FILE = 'meta.json'
+ROWS_FILE = 'rows.jsonl'
+NO_TIME = np.iinfo('int64').min
+
+
+def to_epoch_seconds(values):
+    """Datetimes or epoch seconds (scalar, list, Series) -> int64 epoch seconds; missing -> NO_TIME."""
+    if np.issubdtype(np.asarray(values).dtype, np.integer):
+        return np.atleast_1d(np.asarray(values, dtype='int64'))
+    stamps = pd.to_datetime(pd.Series(values) if np.ndim(values) else pd.Series([values]), errors='coerce')
+    if getattr(stamps.dt, 'tz', None) is not None:
+        stamps = stamps.dt.tz_convert(None)
+    out = stamps.to_numpy(dtype='datetime64[s]').astype('int64')
+    out[stamps.isna().to_numpy()] = NO_TIME
+    return out
+
+
+class FillHistory:
+    def __init__(self, root=DEFAULT_DIR, slots=DEFAULT_SLOTS):
+        self.root = root
+        self._lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+
+        self._journal_lines = 0
+        meta_path = os.path.join(root, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self.slots = meta['slots']
+            # Stores written before the rows journal kept the ids in meta.json
+            self._ids = meta.get('ids', [])
+            self._wards = meta.get('wards', [])
+            clean = self._load_rows()
+            self._open('r+')
+            if 'ids' in meta or not clean:
+                self._compact_rows()
+        else:
+            self.slots = slots
+            self._ids = []
+            self._wards = []
+            self._create(INITIAL_BINS)
+            self._compact_rows()
+        self._rows = {bin_id: row for row, bin_id in enumerate(self._ids)}
+
+    # Storage
+
+    def _file(self, name):
+        return os.path.join(self.root, f"{name}.npy")
+
+    def _open(self, mode):
+        self.times = np.load(self._file('times'), mmap_mode=mode)
+        self.values = np.load(self._file('values'), mmap_mode=mode)
+        self.heads = np.load(self._file('heads'), mmap_mode=mode)
+        self.counts = np.load(self._file('counts'), mmap_mode=mode)
+
+    def _create(self, capacity, copy_from=None):
+        """Write fresh (capacity, slots) files, optionally seeded with the current rows."""
+        specs = {
+            'times': ((capacity, self.slots), 'int64', NO_TIME),
+            'values': ((capacity, self.slots), 'float32', np.nan),
+            'heads': ((capacity,), 'int64', 0),
+            'counts': ((capacity,), 'int64', 0),
+        }
+        for name, (shape, dtype, fill) in specs.items():
+            tmp = self._file(name) + '.tmp'
+            arr = np.lib.format.open_memmap(tmp, mode='w+', dtype=dtype, shape=shape)
+            arr[:] = fill
+            if copy_from is not None:
+                old = copy_from[name]
+                arr[:len(old)] = old
+            arr.flush()
+            del arr
+            os.replace(tmp, self._file(name))
+        self._open('r+')
+
+    def _grow(self, needed):
+        capacity = len(self.heads)
+        while capacity < needed:
+            capacity *= 2
+        current = {name: np.array(getattr(self, name)) for name in ('times', 'values', 'heads', 'counts')}
+        self._create(capacity, copy_from=current)
+
+    def _load_rows(self):
+        """Replay the rows journal; False if it ends in a damaged line (cut short by a crash)."""
+        path = os.path.join(self.root, ROWS_FILE)
+        if not os.path.exists(path):
+            return True
+        with open(path) as f:
+            for line in f:
+                try:
+                    row, bin_id, ward = json.loads(line)
+                except ValueError:
+                    return False
+                if row == len(self._ids):
+                    self._ids.append(bin_id)
+                    self._wards.append(ward)
+                elif row < len(self._ids):
+                    self._wards[row] = ward
+                else:
+                    return False
+                self._journal_lines += 1
+        return True
+
+    def _append_rows(self, entries):
+        with open(os.path.join(self.root, ROWS_FILE), 'a') as f:
+            f.write(''.join(json.dumps(entry) + '\n' for entry in entries))
+        self._journal_lines += len(entries)
+        if self._journal_lines > 2 * len(self._ids):
+            self._compact_rows()
+
+    def _compact_rows(self):
+        """Rewrite the journal as one line per row, and meta.json without ids."""
+        tmp = os.path.join(self.root, ROWS_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            f.write(''.join(json.dumps(entry) + '\n' for entry in zip(range(len(self._ids)), self._ids, self._wards)))
+        os.replace(tmp, os.path.join(self.root, ROWS_FILE))
+        self._journal_lines = len(self._ids)
+
+        tmp = os.path.join(self.root, META_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'slots': self.slots}, f)
+        os.replace(tmp, os.path.join(self.root, META_FILE))
+
+    def flush(self):
+        with self._lock:
+            for arr in (self.times, self.values, self.heads, self.counts):
+                arr.flush()
+
+    # Writes
+
+    def _row_for(self, bin_ids, wards):
+        """Row per bin id, adding rows for new bins; updates the ward of known bins."""
+        rows = np.empty(len(bin_ids), dtype='int64')
+        entries = []
+        for i, bin_id in enumerate(bin_ids):
+            ward = None if wards is None else wards[i]
+            ward = None if ward is None or (isinstance(ward, float) and np.isnan(ward)) else str(ward)
+            row = self._rows.get(bin_id)
+            if row is None:
+                row = len(self._ids)
+                self._rows[bin_id] = row
+                self._ids.append(bin_id)
+                self._wards.append(ward)
+                entries.append((row, bin_id, ward))
+            elif ward is not None and self._wards[row] != ward:
+                self._wards[row] = ward
+                entries.append((row, bin_id, ward))
+            rows[i] = row
+        if len(self._ids) > len(self.heads):
+            self._grow(len(self._ids))
+        if entries:
+            self._append_rows(entries)
+        return rows
+
+    def _last_time(self, rows):
+        last = self.times[rows, (self.heads[rows] - 1) % self.slots]
+        return np.where(self.counts[rows] > 0, last, NO_TIME)
+
+    def _last_value(self, rows):
+        last = self.values[rows, (self.heads[rows] - 1) % self.slots]
+        return np.where(self.counts[rows] > 0, last, np.nan)
+
+    def record(self, bin_ids, values, timestamps, wards=None):
+        """
+        Append readings; returns how many were stored.
+
+        bin_ids: string ids; values: fill levels; timestamps: datetimes or
+        epoch seconds; wards: optional ward per reading.
+        """
+        bin_ids = [str(b) for b in bin_ids]
+        values = np.asarray(values, dtype='float32')
+        ts = to_epoch_seconds(timestamps)
+        if not len(bin_ids):
+            return 0
+
+        with self._lock:
+            rows = self._row_for(bin_ids, None if wards is None else list(wards))
+
+            # Time order per bin; keep the last reading of duplicate timestamps
+            order = np.lexsort((ts, rows))
+            rows, ts, values = rows[order], ts[order], values[order]
+            keep = (ts != NO_TIME) & ~np.isnan(values) & (ts > self._last_time(rows))
+            keep[:-1] &= (rows[1:] != rows[:-1]) | (ts[1:] != ts[:-1])
+            rows, ts, values = rows[keep], ts[keep], values[keep]
+
+            # Only changes of the fill level: compare with the bin's previous reading
+            previous = self._last_value(rows)
+            same_bin = np.zeros(len(rows), dtype=bool)
+            same_bin[1:] = rows[1:] == rows[:-1]
+            previous[same_bin] = values[:-1][same_bin[1:]]
+            changed = values != previous
+            rows, ts, values = rows[changed], ts[changed], values[changed]
+            if not len(rows):
+                return 0
+
+            # Position of each reading within its bin's batch
+            starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+            sizes = np.diff(np.r_[starts, len(rows)])
+            rank = np.arange(len(rows)) - np.repeat(starts, sizes)
+            # More readings than slots in one batch: only the newest fit
+            fits = rank >= np.repeat(sizes, sizes) - self.slots
+            slots = (self.heads[rows] + rank) % self.slots
+
+            self.times[rows[fits], slots[fits]] = ts[fits]
+            self.values[rows[fits], slots[fits]] = values[fits]
+            touched = rows[starts]
+            self.heads[touched] = (self.heads[touched] + sizes) % self.slots
+            self.counts[touched] += sizes
+            return len(rows)
+
+    def record_frame(self, frame, now=None):
+        """Record realTimeCapacity of a bins frame, stamped with updatedAt (or now)."""
+        if frame is None or frame.empty or 'realTimeCapacity' not in frame.columns:
+            return 0
+        now = pd.Timestamp.utcnow().tz_localize(None) if now is None else now
+        stamps = frame['updatedAt'] if 'updatedAt' in frame.columns else pd.Series([pd.NaT] * len(frame))
+        stamps = pd.to_datetime(stamps, errors='coerce').fillna(now)
+        wards = frame['ward'].to_numpy() if 'ward' in frame.columns else None
+        return self.record(frame['_id'].astype(str).to_numpy(), frame['realTimeCapacity'].to_numpy(),
+                           to_epoch_seconds(stamps), wards)
+
+    # Reads
+
+    def bins(self, ward=None):
+        """Ids of the bins with history, optionally only those of one ward."""
+        with self._lock:
+            if ward is None:
+                return list(self._ids)
+            return [b for b, w in zip(self._ids, self._wards) if w == ward]
+
+    def _gather(self, bin_ids, start, end):
+        """(ids, times, values, mask) as (bins x slots) arrays limited to [start, end)."""
+        with self._lock:
+            known = [b for b in map(str, bin_ids) if b in self._rows]
+            rows = np.array([self._rows[b] for b in known], dtype='int64')
+            times = np.asarray(self.times[rows])
+            values = np.asarray(self.values[rows])
+            counts = np.asarray(self.counts[rows])
+        mask = np.arange(self.slots)[None, :] < counts[:, None]
+        if start is not None:
+            mask &= times >= start
+        if end is not None:
+            mask &= times < end
+        return known, times, values, mask
+
+    def window(self, bin_ids, size):
+        """
+        The last `size` readings of each bin, oldest first: (times, values, mask) of shape (bins, size).
+
+        Rows line up with bin_ids; unknown bins and unused slots are masked
+        out. Only the requested slots are read from the memmap.
+        """
+        size = min(int(size), self.slots)
+        with self._lock:
+            rows = np.fromiter((self._rows.get(b, -1) for b in map(str, bin_ids)), dtype='int64',
+                               count=len(bin_ids))
+            known = rows >= 0
+            safe = np.where(known, rows, 0)
+            heads = np.asarray(self.heads[safe])
+            counts = np.where(known, np.asarray(self.counts[safe]), 0)
+            cols = (heads[:, None] - size + np.arange(size)[None, :]) % self.slots
+            times = np.asarray(self.times[safe[:, None], cols])
+            values = np.asarray(self.values[safe[:, None], cols])
+        mask = np.arange(size)[None, :] >= size - np.minimum(counts, size)[:, None]
+        return times, values, mask
+
+    def range(self, bin_id, start=None, end=None):
+        """Readings of one bin in [start, end) as a time-ordered DataFrame (timestamp, value)."""
+        start, end = self._bounds(start, end)
+        _, times, values, mask = self._gather([bin_id], start, end)
+        if not len(times):
+            return pd.DataFrame({'timestamp': pd.Series(dtype='datetime64[ns]'), 'value': pd.Series(dtype='float32')})
+        t, v = times[0][mask[0]], values[0][mask[0]]
+        order = np.argsort(t, kind='stable')
+        return pd.DataFrame({'timestamp': t[order].astype('datetime64[s]'), 'value': v[order]})
+
+    def ward_range(self, ward, start=None, end=None):
+        """Readings of every bin of a ward in [start, end) as long format (binId, timestamp, value)."""
+        start, end = self._bounds(start, end)
+        ids, times, values, mask = self._gather(self.bins(ward), start, end)
+        row_idx, slot_idx = np.nonzero(mask)
+        frame = pd.DataFrame({
+            'binId': np.asarray(ids, dtype=object)[row_idx] if len(ids) else np.empty(0, dtype=object),
+            'timestamp': times[row_idx, slot_idx].astype('datetime64[s]'),
+            'value': values[row_idx, slot_idx],
+        })
+        return frame.sort_values(['binId', 'timestamp'], kind='stable').reset_index(drop=True)
+
+    def downsample(self, bin_ids, start, end, interval, how='mean'):
+        """
+        Fixed-interval (bins x buckets) matrix over [start, end).
+
+        interval: seconds or a pandas Timedelta string ('1h'). how='mean'
+        averages the readings of a bucket, how='last' keeps the newest one.
+        Empty buckets are NaN. Returns (ids, bucket start times, matrix).
+        """
+        start, end = self._bounds(start, end)
+        step = _seconds(interval)
+        if start is None or end is None or end <= start:
+            raise ValueError("downsample needs start < end")
+        buckets = -(-(end - start) // step)
+        ids, times, values, mask = self._gather(bin_ids, start, end)
+
+        row_idx, slot_idx = np.nonzero(mask)
+        bucket = (times[row_idx, slot_idx] - start) // step
+        flat = row_idx * buckets + bucket
+        size = len(ids) * buckets
+        vals = values[row_idx, slot_idx].astype('float64')
+
+        if how == 'mean':
+            sums = np.bincount(flat, weights=vals, minlength=size)
+            counts = np.bincount(flat, minlength=size)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                matrix = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+        elif how == 'last':
+            matrix = np.full(size, np.nan)
+            order = np.lexsort((times[row_idx, slot_idx], flat))
+            matrix[flat[order]] = vals[order]  # later (newer) writes win
+        else:
+            raise ValueError("how must be 'mean' or 'last'")
+
+        edges = (start + step * np.arange(buckets)).astype('datetime64[s]')
+        return ids, edges, matrix.reshape(len(ids), buckets)
+
+    @staticmethod
+    def _bounds(start, end):
+        return (None if start is None else int(to_epoch_seconds(start)[0]),
+                None if end is None else int(to_epoch_seconds(end)[0]))
+
+    def stats(self):
+        with self._lock:
+            counts = np.asarray(self.counts[:len(self._ids)])
+            return {
+                "bins": len(self._ids),
+                "slots": self.slots,
+                "readings": int(np.minimum(counts, self.slots).sum()),
+                "recorded": int(counts.sum()),
+                "capacityBins": len(self.heads),
+            }
+
+
+def _seconds(interval):
+    if isinstance(interval, (int, float, np.integer, np.floating)):
+        step = int(interval)
+    else:
+        text = str(interval)
+        step = int(text) if text.isdigit() else int(pd.Timedelta(text).total_seconds())
+    if step <= 0:
+        raise ValueError("interval must be positive")
+    return step
@@ -0,0 +1,266 @@
+"""
+Versioned on-disk registry for trained SPM models.
+
+Layout under the registry root (SPM_MODEL_DIR):
+
+    <name>/v0001/artifacts.joblib   model (+ scaler) dumped uncompressed
+    <name>/v0001/meta.json          data hash, features, metrics, trained at
+    <name>/CURRENT                  version number currently served
+
+A version directory is written under a temporary name and renamed into place,
+and CURRENT is swapped with os.replace, so readers only ever see complete
+versions and promotion/rollback are atomic. Artifacts are loaded with
+mmap_mode='r', so the large arrays of the forests stay in the page cache and
+are shared by every process serving the same version.
+"""
+
+import errno
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections.abc import MutableMapping
+from datetime import datetime
+
+import joblib
+import numpy as np
+import sklearn
+
+DEFAULT_ROOT = os.environ.get(
+    'SPM_MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_registry')
+)
+# Versions kept per model besides the current one (0 = keep everything)
+DEFAULT_KEEP = int(os.environ.get('SPM_MODEL_KEEP', 5))
+
+ARTIFACTS_FILE = 'artifacts.joblib'
+META_FILE = 'meta.json'
+CURRENT_FILE = 'CURRENT'
+
+
+def data_hash(*arrays):
+    """Stable sha256 of the given frames/arrays (values, dtypes and shapes)."""
+    digest = hashlib.sha256()
+    for arr in arrays:
+        values = np.ascontiguousarray(np.asarray(arr))
+        if values.dtype == object or values.dtype.kind in 'UO':
+            values = np.asarray(values.astype(str))
+        digest.update(str(values.dtype).encode())
+        digest.update(str(values.shape).encode())
+        digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+def training_key(arrays, models):
+    """
+    Content address of a training run: data hash, hyperparameters of the
+    candidate models and library versions. n_jobs is left out; it changes
+    speed, not the fitted model.
+    """
+    params = {
+        name: {k: v for k, v in sorted(model.get_params().items()) if k != 'n_jobs'}
+        for name, model in models.items()
+    }
+    digest = hashlib.sha256(data_hash(*arrays).encode())
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+    digest.update(f"sklearn={sklearn.__version__};numpy={np.__version__}".encode())
+    return digest.hexdigest()
+
+
+def _json_default(value):
+    if hasattr(value, 'item'):
+        return value.item()
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+def _version_dir(version):
+    return f"v{version:04d}"
+
+
+class ModelRegistry:
+    def __init__(self, root=DEFAULT_ROOT, keep=DEFAULT_KEEP):
+        self.root = root
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._loaded = {}  # name -> (version, artifacts)
+
+    def _path(self, name, *parts):
+        return os.path.join(self.root, name, *parts)
+
+    def names(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(n for n in os.listdir(self.root) if self.current(n) is not None)
+
+    def versions(self, name):
+        try:
+            entries = os.listdir(self._path(name))
+        except FileNotFoundError:
+            return []
+        return sorted(int(e[1:]) for e in entries if e.startswith('v') and e[1:].isdigit())
+
+    def current(self, name):
+        try:
+            with open(self._path(name, CURRENT_FILE)) as f:
+                return int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def metadata(self, name, version=None):
+        version = self.current(name) if version is None else version
+        if version is None:
+            return None
+        with open(self._path(name, _version_dir(version), META_FILE)) as f:
+            return json.load(f)
+
+    def find(self, name, cache_key):
+        """Newest stored version whose metadata has this cacheKey, or None."""
+        for version in reversed(self.versions(name)):
+            try:
+                meta = self.metadata(name, version)
+            except (OSError, ValueError):
+                continue  # pruned or half-written by another process
+            if meta.get('cacheKey') == cache_key:
+                return version
+        return None
+
+    def save(self, name, artifacts, metadata=None, promote=True):
+        """
+        Store a new version of name and (by default) make it current.
+
+        artifacts: dict of picklable objects, e.g. {"model": ..., "scaler": ...}.
+        Returns the new version number.
+        """
+        os.makedirs(self._path(name), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=self._path(name))
+        try:
+            # Uncompressed so the arrays can be memory-mapped on load
+            joblib.dump(artifacts, os.path.join(staging, ARTIFACTS_FILE))
+            meta = dict(metadata or {})
+            meta.setdefault('trainedAt', datetime.utcnow().isoformat())
+            meta['artifacts'] = sorted(artifacts)
+            with open(os.path.join(staging, META_FILE), 'w') as f:
+                json.dump(meta, f, indent=2, default=_json_default)
+
+            # Another process may take the same number; rename fails and we retry
+            while True:
+                version = (self.versions(name) or [0])[-1] + 1
+                try:
+                    os.rename(staging, self._path(name, _version_dir(version)))
+                    break
+                except OSError as e:
+                    if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                        raise
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if promote:
+            self.promote(name, version)
+            # The objects just trained are what a load would return; skip the reload
+            with self._lock:
+                self._loaded[name] = (version, dict(artifacts))
+        return version
+
+    def promote(self, name, version):
+        """Atomically make version the one served for name."""
+        if not os.path.isdir(self._path(name, _version_dir(version))):
+            raise KeyError(f"{name} has no version {version}")
+        fd, tmp = tempfile.mkstemp(prefix='.current-', dir=self._path(name))
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(version))
+        os.replace(tmp, self._path(name, CURRENT_FILE))
+        self._prune(name, version)
+        return version
+
+    def rollback(self, name):
+        """Promote the newest version older than the current one."""
+        current = self.current(name)
+        older = [v for v in self.versions(name) if current is None or v < current]
+        if not older:
+            raise KeyError(f"{name} has no earlier version to roll back to")
+        return self.promote(name, older[-1])
+
+    def _prune(self, name, current):
+        if not self.keep:
+            return
+        versions = [v for v in self.versions(name) if v != current]
+        for version in versions[:-self.keep]:
+            shutil.rmtree(self._path(name, _version_dir(version)), ignore_errors=True)
+
+    def load(self, name):
+        """Artifacts dict of the current version (cached until CURRENT changes), or None."""
+        version = self.current(name)
+        if version is None:
+            return None
+        cached = self._loaded.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with self._lock:
+            cached = self._loaded.get(name)
+            if cached is None or cached[0] != version:
+                path = self._path(name, _version_dir(version), ARTIFACTS_FILE)
+                cached = (version, joblib.load(path, mmap_mode='r'))
+                self._loaded[name] = cached
+            return cached[1]
+
+    def status(self):
+        return {
+            name: {"current": self.current(name), "versions": self.versions(name),
+                   "loaded": name in self._loaded}
+            for name in self.names()
+        }
+
+
+class RegistryBackedModels(MutableMapping):
+    """
+    Dict of trained objects that falls back to the registry.
+
+    Objects set in this process win; otherwise models[name] loads the
+    current registry version of name on first access and returns its
+    `part` artifact ("model", "scaler", ...).
+    """
+
+    def __init__(self, registry, part='model'):
+        self.registry = registry
+        self.part = part
+        self._local = {}
+
+    def __getitem__(self, name):
+        if name in self._local:
+            return self._local[name]
+        artifacts = self.registry.load(name)
+        if artifacts is None or self.part not in artifacts:
+            raise KeyError(name)
+        return artifacts[self.part]
+
+    def __setitem__(self, name, value):
+        self._local[name] = value
+
+    def __delitem__(self, name):
+        del self._local[name]
+
+    def version(self, name):
+        """Identity of the object models[name] returns now: registry version, or a local marker."""
+        if name in self._local:
+            return ('local', id(self._local[name]))
+        return self.registry.current(name)
+
+    def __contains__(self, name):
+        if name in self._local:
+            return True
+        if self.registry.current(name) is None:
+            return False
+        meta = self.registry.metadata(name) or {}
+        return self.part in meta.get('artifacts', [])
+
+    def __iter__(self):
+        names = list(self._local)
+        names += [n for n in self.registry.names() if n not in self._local and n in self]
+        return iter(names)
+
+    def __len__(self):
+        return sum(1 for _ in self)
@@ -0,0 +1,248 @@
+"""
+Pre-forking production server for the Flask apps.
+
+app.run() is werkzeug's development server: one process, plus the
+reloader. serve() instead preloads the app's state in a master process
+(the bin snapshot and its indexes, the stored models), binds the listening
+socket and forks worker processes that all accept on it. Each worker runs
+werkzeug's threaded server.
+
+Workers inherit the preloaded objects copy-on-write, so the snapshot sits
+in memory once however many workers there are. The NumPy/pandas buffers
+are never written after the fork, so their pages stay shared; only object
+headers touched by reference counting get copied.
+
+Hot swap: workers never refresh shared state themselves. The master calls
+preload() again every `interval` seconds, and on SIGHUP (which workers
+send through request_reload()) after calling reload(). preload() returns
+the state object. When that is a different object, a new generation of
+workers is forked from the updated master. The old generation is then
+told to stop: each old worker stops accepting, finishes its in-flight
+requests and exits, or is killed after GRACEFUL_TIMEOUT. Swaps are at
+least MIN_SWAP_INTERVAL apart; changes in between are coalesced into the
+next one, so at most a couple of old generations are draining at a time.
+
+pre_fork() runs in the master before every fork, to stop background
+threads (the snapshot watcher) that must not be mid-operation when the
+process is copied.
+
+Signals to the master: SIGHUP reloads, SIGUSR1 reloads in full,
+SIGTERM/SIGINT stop gracefully.
+"""
+
+import os
+import signal
+import socket
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+DEFAULT_WORKERS = int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1))
+# Seconds between the master's checks for a new snapshot
+DEFAULT_INTERVAL = float(os.environ.get('PREFORK_REFRESH_INTERVAL', 5))
+# Seconds a stopping worker gets to finish its in-flight requests
+GRACEFUL_TIMEOUT = float(os.environ.get('PREFORK_GRACEFUL_TIMEOUT', 30))
+# Least seconds between two worker swaps
+MIN_SWAP_INTERVAL = float(os.environ.get('PREFORK_MIN_SWAP_INTERVAL', GRACEFUL_TIMEOUT))
+# A worker slot that keeps dying is respawned at most this often (seconds)
+RESPAWN_DELAY = 1.0
+
+_master_pid = None  # set in workers
+
+
+def in_worker():
+    return _master_pid is not None
+
+
+def request_reload(full=False):
+    """From a worker: ask the master to reload and swap workers. False outside prefork workers."""
+    if _master_pid is None:
+        return False
+    os.kill(_master_pid, signal.SIGUSR1 if full else signal.SIGHUP)
+    return True
+
+
+def _run_worker(app, host, port, listener, post_fork, master_pid):
+    global _master_pid
+    _master_pid = master_pid
+    # The master's handlers came along with the fork; the master relays Ctrl+C as SIGTERM
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    for sig in (signal.SIGHUP, signal.SIGUSR1, signal.SIGINT):
+        signal.signal(sig, signal.SIG_IGN)
+    if post_fork is not None:
+        post_fork()
+
+    server = make_server(host, port, app, threaded=True, fd=listener.fileno())
+    # Join request threads on close, so a stopping worker finishes what it accepted
+    server.daemon_threads = False
+    server.block_on_close = True
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever() to return, so it cannot run in this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    server.serve_forever()
+
+
+class PreforkServer:
+    def __init__(self, app, host, port, workers=DEFAULT_WORKERS, preload=None, post_fork=None,
+                 reload=None, interval=DEFAULT_INTERVAL, pre_fork=None, min_swap_interval=MIN_SWAP_INTERVAL):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = max(int(workers), 1)
+        self.preload = preload
+        self.post_fork = post_fork
+        self.pre_fork = pre_fork
+        self.reload = reload
+        self.interval = interval
+        self.min_swap_interval = min_swap_interval
+
+        self.state = None
+        self.generation = 0
+        self._current = {}   # slot -> pid, workers serving the current state
+        self._spawned_at = {}  # slot -> monotonic time of the last fork
+        self._retiring = {}  # pid -> deadline, old workers finishing their requests
+        self._reload_requested = False
+        self._full_reload_requested = False
+        self._swap_pending = False
+        self._last_swap = float('-inf')
+        self._stopping = False
+
+    def serve(self):
+        self.state = self.preload() if self.preload is not None else None
+        self.listener = socket.create_server((self.host, self.port), backlog=128)
+        signal.signal(signal.SIGHUP, self._on_hup)
+        signal.signal(signal.SIGUSR1, self._on_usr1)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+
+        print(f"Master {os.getpid()} serving http://{self.host}:{self.port} with {self.workers} workers")
+        for slot in range(self.workers):
+            self._spawn(slot)
+
+        next_check = time.monotonic() + self.interval
+        while not self._stopping:
+            time.sleep(0.2)
+            self._reap()
+            now = time.monotonic()
+            if self._reload_requested or now >= next_check:
+                reload, self._reload_requested = self._reload_requested, False
+                full, self._full_reload_requested = self._full_reload_requested, False
+                next_check = now + self.interval
+                self._check(reload, full)
+            self._respawn()
+            self._kill_overdue()
+        self._shutdown()
+
+    def _on_hup(self, signum, frame):
+        self._reload_requested = True
+
+    def _on_usr1(self, signum, frame):
+        self._full_reload_requested = True
+        self._reload_requested = True
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _spawn(self, slot):
+        if self.pre_fork is not None:
+            self.pre_fork()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(self.app, self.host, self.port, self.listener, self.post_fork, os.getppid())
+            except BaseException as e:
+                print(f"Worker {os.getpid()} failed: {e}")
+                code = 1
+            finally:
+                # Never return into the master's loop or run its exit handlers
+                os._exit(code)
+        self._current[slot] = pid
+        self._spawned_at[slot] = time.monotonic()
+
+    def _check(self, reload, full=False):
+        try:
+            if reload and self.reload is not None:
+                self.reload(full=full)
+            state = self.preload() if self.preload is not None else None
+        except Exception as e:
+            print(f"Preload failed, workers keep the previous state: {e}")
+            return
+        if reload or state is not self.state:
+            self.state = state
+            self._swap_pending = True
+        if self._swap_pending and time.monotonic() - self._last_swap >= self.min_swap_interval:
+            self._swap()
+
+    def _swap(self):
+        """Fork a new generation from the current state, then stop the old one."""
+        old = list(self._current.values())
+        self.generation += 1
+        self._swap_pending = False
+        self._last_swap = time.monotonic()
+        for slot in range(self.workers):
+            self._spawn(slot)
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        for pid in old:
+            self._retiring[pid] = deadline
+            self._signal(pid, signal.SIGTERM)
+        print(f"Swapped to worker generation {self.generation}: {sorted(self._current.values())}")
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if self._retiring.pop(pid, None) is not None:
+                continue
+            for slot, current in list(self._current.items()):
+                if current == pid:
+                    print(f"Worker {pid} exited unexpectedly (status {status})")
+                    del self._current[slot]
+
+    def _respawn(self):
+        if self._stopping:
+            return
+        now = time.monotonic()
+        for slot in range(self.workers):
+            if slot not in self._current and now - self._spawned_at.get(slot, 0.0) >= RESPAWN_DELAY:
+                self._spawn(slot)
+
+    def _kill_overdue(self):
+        now = time.monotonic()
+        for pid, deadline in list(self._retiring.items()):
+            if now > deadline:
+                self._signal(pid, signal.SIGKILL)
+
+    @staticmethod
+    def _signal(pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _shutdown(self):
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        for pid in self._current.values():
+            self._retiring[pid] = deadline
+            self._signal(pid, signal.SIGTERM)
+        self._current.clear()
+        while self._retiring:
+            self._reap()
+            self._kill_overdue()
+            time.sleep(0.1)
+        self.listener.close()
+        print(f"Master {os.getpid()} stopped")
+
+
+def serve(app, host, port, workers=DEFAULT_WORKERS, preload=None, post_fork=None, reload=None,
+          interval=DEFAULT_INTERVAL, pre_fork=None):
+    """Preload, fork `workers` processes serving app on host:port, and supervise them until SIGTERM."""
+    PreforkServer(app, host, port, workers, preload, post_fork, reload, interval, pre_fork).serve()
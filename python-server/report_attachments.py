@@ -0,0 +1,160 @@
+"""
+User-report attachments (photos), fetched one at a time and cached.
+
+Report documents embed the uploaded image in attachment.data. The bulk
+report loads use REPORT_PROJECTION, which leaves the blob out, so their
+memory and time no longer grow with photo volume. AttachmentStore reads a
+single report's image when it is asked for. It keeps recently used images
+and thumbnails in an LRU cache bounded by total bytes.
+
+Thumbnails need Pillow; without it thumbnail() returns None and callers can
+fall back to the original image.
+
+The stored contentType comes from the uploader. Anything that is not a
+raster image type (SVG can carry script) is served as
+application/octet-stream.
+"""
+
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+try:
+    from PIL import Image
+    THUMBNAILS_AVAILABLE = True
+except ImportError:
+    THUMBNAILS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Bulk report reads: everything except the image bytes (contentType stays)
+REPORT_PROJECTION = {'attachment.data': 0}
+
+DEFAULT_CACHE_BYTES = int(float(os.environ.get('REPORT_ATTACHMENT_CACHE_MB', 64)) * 1024 * 1024)
+DEFAULT_THUMBNAIL_SIZE = 256
+MAX_THUMBNAIL_SIZE = 1024
+# Image types browsers may render from script
+UNSAFE_CONTENT_TYPES = {'image/svg+xml'}
+
+
+class LRUBytesCache:
+    """key -> (bytes, content type), evicting the least recently used entries beyond max_bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, data, content_type):
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old[0])
+            self._entries[key] = (data, content_type)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": (self.hits / lookups) if lookups else None,
+                "evictions": self.evictions,
+            }
+
+
+def served_content_type(content_type):
+    """The type to send a stored attachment as: its own for raster images, otherwise a download."""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if not content_type.startswith('image/') or content_type in UNSAFE_CONTENT_TYPES:
+        return 'application/octet-stream'
+    return content_type
+
+
+def _object_id(report_id):
+    try:
+        return ObjectId(report_id)
+    except (InvalidId, TypeError):
+        raise ValueError("Invalid report id")
+
+
+class AttachmentStore:
+    def __init__(self, collection, max_bytes=DEFAULT_CACHE_BYTES):
+        self.collection = collection
+        self.cache = LRUBytesCache(max_bytes)
+
+    def get(self, report_id):
+        """(image bytes, content type) of a report's attachment, or None if it has none."""
+        key = ('original', str(report_id))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        doc = self.collection.find_one({'_id': _object_id(report_id)}, {'attachment': 1})
+        attachment = (doc or {}).get('attachment') or {}
+        data = attachment.get('data')
+        if data is None:
+            return None
+        entry = (bytes(data), served_content_type(attachment.get('contentType')))
+        self.cache.put(key, *entry)
+        return entry
+
+    def thumbnail(self, report_id, size=DEFAULT_THUMBNAIL_SIZE):
+        """
+        (JPEG bytes, 'image/jpeg') no larger than size x size, or None.
+
+        None when the report has no attachment, Pillow is missing or the
+        attachment is not a readable image.
+        """
+        key = ('thumbnail', str(report_id), size)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        if not THUMBNAILS_AVAILABLE:
+            return None
+        original = self.get(report_id)
+        if original is None:
+            return None
+        try:
+            with Image.open(io.BytesIO(original[0])) as image:
+                image.thumbnail((size, size))
+                out = io.BytesIO()
+                image.convert('RGB').save(out, format='JPEG', quality=85)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            logger.warning("Thumbnail failed for report %s: %s", report_id, e)
+            return None
+        entry = (out.getvalue(), 'image/jpeg')
+        self.cache.put(key, *entry)
+        return entry
+
+    def stats(self):
+        return dict(self.cache.stats(), thumbnailsAvailable=THUMBNAILS_AVAILABLE)
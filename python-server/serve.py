@@ -0,0 +1,53 @@
+"""
+Production entry point for the two Flask servers (see prefork.py).
+
+    python serve.py ml  [--workers N] [--host HOST] [--port 5000]
+    python serve.py spm [--workers N] [--host HOST] [--port 5001]
+
+The master loads the app's data before forking (server.warm_up /
+spm_enhanced_models.warm_up) and the workers share it. The ML server's
+snapshot is refreshed by the master: its change stream / polling marks it
+stale and the master forks workers from the new snapshot. The SPM server
+reloads when asked through POST /spm/data/refresh or a SIGHUP to the master
+(SIGUSR1 for a full reload).
+
+Models trained or promoted in one worker are picked up by the others from
+the registry. Training jobs are tracked by the worker that started them,
+so with several workers use train-all?wait=true rather than polling
+/spm/jobs/<id>.
+
+`python server.py` / `python spm_enhanced_models.py` still start the
+single-process development server.
+"""
+
+import argparse
+import importlib
+
+from prefork import DEFAULT_INTERVAL, DEFAULT_WORKERS, serve
+
+# name -> (module, default port)
+APPS = {
+    'ml': ('server', 5000),
+    'spm': ('spm_enhanced_models', 5001),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('app', choices=sorted(APPS))
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                        help="seconds between the master's snapshot checks")
+    args = parser.parse_args()
+
+    module_name, default_port = APPS[args.app]
+    module = importlib.import_module(module_name)
+    serve(module.app, args.host, args.port or default_port, args.workers,
+          preload=module.warm_up, post_fork=getattr(module, 'post_fork', None),
+          reload=module.reload_data, interval=args.interval, pre_fork=getattr(module, 'pre_fork', None))
+
+
+if __name__ == '__main__':
+    main()
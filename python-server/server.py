@@ -1,38 +1,71 @@
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, Response, jsonify, request, stream_with_context
 from pymongo import MongoClient
 from flask_cors import CORS  # Import CORS
 
+import json
+import logging
+import os
+
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+
+import bin_math
+from bin_anomaly import WardAnomalyEngine, full_recompute_z
+from bin_columnar import profile_fields
+from bin_index import ANOMALY_Z_THRESHOLD, FILTER_FIELDS, BinIdIndex, BinScoreIndex, PerSnapshot
+from bin_rollups import ROLLUP_FILTERS, ROLLUP_GROUPS, ROLLUP_SOURCES, BinRollups
+from bin_routes import DEFAULT_TIME_BUDGET, plan_routes
+from bin_snapshot import BinSnapshotCache
+from bin_spatial import BinSpatialIndex
+from bin_sync import IncrementalBinLoader
+from bin_writeback import BinWriteBack, WRITE_FIELDS
+from distance_matrix import DistanceMatrix
+from fill_forecast import METHODS as FORECAST_METHODS, FillForecaster
+from fill_history import FillHistory
 
 app = Flask(__name__)
-CORS(app)
+# Pagination metadata for NDJSON responses travels in headers the browser must be allowed to read
+CORS(app, expose_headers=['X-Total-Count', 'X-Next-Cursor', 'X-Writes'])
+
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger('ml-server')
 
 client = MongoClient("mongodb://localhost:27017/waste-management")
 db = client["waste-management"]
 collection = db["wastebins"]
+writeback = BinWriteBack(collection)
+
+
+def _utcnow():
+    # Naive UTC, matching the datetimes pymongo returns, so the column keeps a single dtype
+    return pd.Timestamp.utcnow().tz_localize(None)
+
+
+def _json_records(frame):
+    # NaN is not valid JSON; send null instead
+    return frame.astype(object).where(frame.notna(), None).to_dict(orient='records')
 
 
-def _load_bins_df():
-    data_cursor = collection.find()
-    data = pd.DataFrame(list(data_cursor))
-    if data.empty:
-        return data
+def _normalize_bins(data):
     # Normalize/clean fields expected downstream
-    if 'wasteQuantityPerDay' in data.columns:
+    if 'wasteQuantityPerDay' in data.columns and not pd.api.types.is_numeric_dtype(data['wasteQuantityPerDay']):
         data['wasteQuantityPerDay'] = (
             data['wasteQuantityPerDay']
             .astype(str)
             .str.replace(' tonnes', '', regex=False)
         )
         data['wasteQuantityPerDay'] = pd.to_numeric(data['wasteQuantityPerDay'], errors='coerce').fillna(0.0)
+    elif 'wasteQuantityPerDay' in data.columns:
+        data['wasteQuantityPerDay'] = data['wasteQuantityPerDay'].fillna(0.0)
     else:
         data['wasteQuantityPerDay'] = 0.0
 
+    # Bins never emptied keep NaT and get no emptying prediction; filling in "now"
+    # would change their prediction, and rewrite them, on every reload
     if 'lastEmptiedAt' in data.columns:
-        data['lastEmptiedAt'] = pd.to_datetime(data['lastEmptiedAt'], errors='coerce').fillna(pd.Timestamp.utcnow())
+        data['lastEmptiedAt'] = pd.to_datetime(data['lastEmptiedAt'], errors='coerce')
     else:
-        data['lastEmptiedAt'] = pd.Timestamp.utcnow()
+        data['lastEmptiedAt'] = pd.NaT
 
     for col in ['totalCapacity', 'realTimeCapacity']:
         if col in data.columns:
@@ -42,79 +75,360 @@ def _load_bins_df():
     return data
 
 
-@app.route('/schedule', methods=['POST', 'GET'])
-def schedule():
-    try:
-        # Fetch data from MongoDB
-        data = _load_bins_df()
+# Every fill level the loader sees is appended to the local history store
+fill_history = FillHistory()
+
+# Incremental refresh patches only changed bins into the snapshot; set
+# BIN_SNAPSHOT_INCREMENTAL=0 to rebuild it from a full scan every time
+# Only the fields the endpoints below read are fetched (see bin_columnar)
+bins_loader = IncrementalBinLoader(
+    collection, _normalize_bins,
+    fields=profile_fields('schedule', 'forecast', 'anomalies', 'priority', 'routes', 'near', 'rollups'),
+    on_rows=fill_history.record_frame,
+)
+bins_cache = BinSnapshotCache(
+    bins_loader if os.environ.get('BIN_SNAPSHOT_INCREMENTAL', '1') != '0' else bins_loader.load_full,
+    collection,
+)
+
+
+class SchedulePredictions:
+    """
+    GET /schedule predictions for one snapshot. Changed values are written back
+    once, when they are computed; page requests only slice `data`.
+    """
+
+    def __init__(self, frame, version=None):
+        self.version = version
+        self.writes = None
+        # Shallow copy: add/replace columns without touching the shared snapshot
+        data = frame.copy(deep=False)
+        if not data.empty:
+            # Keep the values the documents already hold so unchanged bins are not rewritten
+            stored = {f: data[f].tolist() for f in WRITE_FIELDS if f in data.columns}
+
+            # Calculate predictedApproxTime dynamically (NaN for bins with no daily waste)
+            data['predictedApproxTime'] = bin_math.hours_until_full(
+                data['totalCapacity'], data['realTimeCapacity'], data['wasteQuantityPerDay']
+            )
 
-        # If no data is returned
-        if data.empty:
-            return jsonify({"error": "No data found in the database"}), 404
+            # Calculate predicted emptying datetime
+            data['predictedEmptyingDateTime'] = bin_math.add_hours(data['lastEmptiedAt'], data['predictedApproxTime'])
 
-        # Preprocess data
-        # Data already normalized in _load_bins_df
+            # Determine the status based on realTimeCapacity and totalCapacity
+            data['status'] = bin_math.fill_status(data['realTimeCapacity'], data['totalCapacity'])
 
-        # Calculate predictedApproxTime dynamically
-        data['predictedApproxTime'] = (data['totalCapacity'] - data['realTimeCapacity']) / (data['wasteQuantityPerDay'] / 24)
+            # Save changed predictions and status back to the database in batches
+            self.writes = writeback.write(
+                data['_id'].tolist(),
+                {f: data[f].tolist() for f in WRITE_FIELDS},
+                stored,
+            )
 
-        # Calculate predicted emptying datetime
-        data['predictedEmptyingDateTime'] = data.apply(
-            lambda row: (row['lastEmptiedAt'] + timedelta(hours=row['predictedApproxTime'])).strftime('%Y-%m-%d %H:%M:%S'),
-            axis=1
-        )
+            # Convert _id to string for response
+            data['_id'] = data['_id'].astype(str)
+        self.data = data
 
-        # Determine the status based on realTimeCapacity and totalCapacity
-        def determine_status(row):
-            capacity_ratio = row['realTimeCapacity'] / row['totalCapacity']
-            if capacity_ratio >= 0.8:
-                return "filled"
-            elif 0.3 <= capacity_ratio < 0.8:
-                return "partially_filled"
-            else:
-                return "empty"
-
-        data['status'] = data.apply(determine_status, axis=1)
-
-        # Store original ObjectIds
-        original_ids = data['_id'].copy()
-
-        # Save predictions and status back to the database using original ObjectIds
-        for i, row in data.iterrows():
-            collection.update_one(
-                {"_id": original_ids[i]},
-                {"$set": {
-                    "predictedApproxTime": row['predictedApproxTime'],
-                    "predictedEmptyingDateTime": row['predictedEmptyingDateTime'],
-                    "status": row['status']
-                }}
-            )
 
-        # Convert _id to string for response
-        data['_id'] = data['_id'].astype(str)
+# Per-snapshot indexes: schedule predictions, _id lookup for single bins, scores/filter codes for top-k.
+# Ward z-scores come from running per-ward statistics updated with changed bins only.
+anomaly_engine = WardAnomalyEngine()
+schedule_index = PerSnapshot(bins_cache, SchedulePredictions)
+id_index = PerSnapshot(bins_cache, BinIdIndex)
+# Hours until full are fitted per bin from the fill history where there is enough of it
+forecaster = FillForecaster(fill_history)
+score_index = PerSnapshot(
+    bins_cache, lambda frame, version: BinScoreIndex(frame, version, anomaly_engine, forecaster)
+)
+# Bin coordinates in a BallTree / latitude-sorted array for the map queries
+spatial_index = PerSnapshot(bins_cache, BinSpatialIndex)
+# Bin-to-bin distances for /ml/routes, kept on disk and updated for added/moved bins only
+distance_matrix = DistanceMatrix()
+distance_index = PerSnapshot(bins_cache, distance_matrix.sync)
+# Ward/zone summaries: from the snapshot while it is fresh, else a MongoDB aggregation
+rollups = BinRollups(collection, bins_cache)
+MAX_TOP_K = 1000
+
+
+def warm_up():
+    """
+    Load the snapshot and build every per-snapshot index now instead of on
+    the first request. Returns the snapshot frame, a new object whenever the
+    bins changed; the prefork master (serve.py) swaps workers on that.
+    """
+    frame = bins_cache.get()
+    for index in (schedule_index, id_index, score_index, spatial_index, distance_index):
+        index.get()
+    return frame
+
+
+def pre_fork():
+    # Prefork master: no watcher thread may be inside pymongo when the process is copied.
+    # From now on workers map the distance files, so the master updates copies of them.
+    bins_cache.stop_watch()
+    distance_matrix.shared = True
+
+
+def post_fork():
+    # Prefork workers serve the snapshot they were forked with; the master refreshes it
+    bins_cache.freeze()
+
+
+def reload_data(full=False):
+    if full:
+        # Rescan the collection; the snapshot refresh then finds nothing left to patch
+        bins_loader.load_full()
+    bins_cache.invalidate()
+
 
+class InvalidParam(ValueError):
+    """Bad query/body parameter; reported as HTTP 400."""
+
+
+SCHEDULE_FIELDS = ['_id', 'predictedApproxTime', 'predictedEmptyingDateTime', 'status', 'ward', 'lastEmptiedAt']
+SCHEDULE_STREAM_CHUNK = 1000
+
+
+def _int_arg(name, default=None, minimum=0):
+    raw = request.args.get(name)
+    if raw is None or raw == '':
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise InvalidParam(f"{name} must be an integer")
+    if value < minimum:
+        raise InvalidParam(f"{name} must be >= {minimum}")
+    return value
+
+
+def _float_arg(name, default=None, minimum=None, maximum=None):
+    raw = request.args.get(name)
+    if raw is None or raw == '':
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        raise InvalidParam(f"{name} must be a number")
+    if not np.isfinite(value) or (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise InvalidParam(f"{name} must be between {minimum} and {maximum}")
+    return value
+
+
+def _schedule_page(data):
+    """
+    Slice the schedule rows for GET /schedule.
+
+    ?fields= picks columns (comma separated), ?limit= caps the page size and
+    the start is either ?offset= or ?cursor=<_id of the last row already seen>.
+    Without limit every bin is returned, as before.
+    """
+    fields = SCHEDULE_FIELDS
+    if request.args.get('fields'):
+        fields = [f.strip() for f in request.args['fields'].split(',') if f.strip()]
+        unknown = [f for f in fields if f not in SCHEDULE_FIELDS]
+        if unknown:
+            raise InvalidParam(f"Unknown fields: {', '.join(unknown)}")
+
+    limit = _int_arg('limit', minimum=1)
+    offset = _int_arg('offset', default=0)
+    cursor = request.args.get('cursor')
+    if cursor:
+        matches = np.flatnonzero(data['_id'].to_numpy() == cursor)
+        if not len(matches):
+            raise InvalidParam("Unknown cursor")
+        offset = int(matches[0]) + 1
+
+    end = len(data) if limit is None else min(offset + limit, len(data))
+    page = data.iloc[offset:end][fields]
+    next_cursor = data['_id'].iat[end - 1] if end < len(data) and end > offset else None
+    return page, {"offset": offset, "limit": limit, "total": len(data), "nextCursor": next_cursor}
+
+
+def _ndjson_lines(page):
+    for start in range(0, len(page), SCHEDULE_STREAM_CHUNK):
+        for rec in _json_records(page.iloc[start:start + SCHEDULE_STREAM_CHUNK]):
+            yield app.json.dumps(rec) + '\n'
+
+
+def _predict_bin(index, pos):
+    """Schedule prediction for one snapshot row; writes it back if it changed."""
+    rec = index.record(pos)
+    last_emptied = pd.Timestamp(rec['lastEmptiedAt']) if rec['lastEmptiedAt'] is not None else None
+    hours, emptying, status = bin_math.schedule_one(
+        float(rec['totalCapacity'] or 0.0),
+        float(rec['realTimeCapacity'] or 0.0),
+        float(rec['wasteQuantityPerDay'] or 0.0),
+        last_emptied,
+    )
+    writeback.write(
+        [rec['_id']],
+        {'predictedApproxTime': [hours], 'predictedEmptyingDateTime': [emptying], 'status': [status]},
+        {f: [rec[f]] for f in WRITE_FIELDS},
+        full_fleet=False,
+    )
+    return {
+        "_id": str(rec['_id']),
+        "ward": rec['ward'],
+        "lastEmptiedAt": last_emptied.to_pydatetime() if last_emptied is not None else None,
+        "predictedApproxTime": hours if np.isfinite(hours) else None,
+        "predictedEmptyingDateTime": emptying,
+        "status": status,
+    }
+
+
+@app.route('/schedule/<bin_id>', methods=['GET'])
+def schedule_bin(bin_id):
+    try:
+        index = id_index.get()
+        pos = index.position(bin_id)
+        if pos is None:
+            return jsonify({"error": "Bin not found"}), 404
+        return jsonify(_predict_bin(index, pos)), 200
+    except Exception as e:
+        logger.exception("Schedule lookup error")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/schedule', methods=['POST', 'GET'])
+def schedule():
+    try:
         if request.method == 'POST':
-            query_index = int(request.json.get("query_index", 0))
-            if query_index < 0 or query_index >= len(data):
+            # Single bin by position in the snapshot (query_index) or by bin_id
+            body = request.get_json(silent=True) or {}
+            index = id_index.get()
+            if not index.size:
+                return jsonify({"error": "No data found in the database"}), 404
+            if body.get("bin_id"):
+                pos = index.position(str(body["bin_id"]))
+            else:
+                try:
+                    pos = int(body.get("query_index", 0))
+                except (TypeError, ValueError):
+                    raise InvalidParam("query_index must be an integer")
+                if pos < 0 or pos >= index.size:
+                    pos = None
+            if pos is None:
                 return jsonify({"error": "Invalid query index"}), 400
 
-            bin_data = data.iloc[query_index]
+            bin_data = _predict_bin(index, pos)
+            hours = bin_data['predictedApproxTime']
             return jsonify({
                 "Bin ID": bin_data['_id'],
-                "Predicted Approximate Time": f"{bin_data['predictedApproxTime']:.2f} hrs",
+                "Predicted Approximate Time": f"{hours:.2f} hrs" if hours is not None else "N/A",
                 "Predicted Emptying DateTime": bin_data['predictedEmptyingDateTime'],
                 "Status": bin_data['status']
             })
 
-        # For GET requests, return all predictions
-        rec = data[['_id', 'predictedApproxTime', 'predictedEmptyingDateTime', 'status', 'ward', 'lastEmptiedAt']].to_dict(orient='records')
+        # Predictions for the current snapshot, computed and written back once per snapshot
+        predictions = schedule_index.get()
+        data = predictions.data
+
+        # If no data is returned
+        if data.empty:
+            return jsonify({"error": "No data found in the database"}), 404
+
+        # The writes made when this snapshot's predictions were computed
+        write_stats = predictions.writes
+
+        # For GET requests, return the requested page of predictions
+        page, page_info = _schedule_page(data)
+        logger.debug("schedule: %d bins, page %s, writes %s", len(data), page_info, write_stats)
 
-        print(rec)  # For debugging
+        if request.args.get('format') == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', ''):
+            # One JSON record per line, produced while the response is sent
+            headers = {
+                "X-Total-Count": str(page_info["total"]),
+                "X-Writes": json.dumps(write_stats),
+            }
+            if page_info["nextCursor"]:
+                headers["X-Next-Cursor"] = page_info["nextCursor"]
+            return Response(stream_with_context(_ndjson_lines(page)), mimetype='application/x-ndjson', headers=headers)
 
-        return jsonify({"rec": rec}), 200
+        return jsonify({"rec": _json_records(page), "page": page_info, "writes": write_stats}), 200
 
+    except InvalidParam as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"Error: {e}")
+        logger.exception("Schedule error")
+        return jsonify({"error": str(e)}), 500
+
+
+def _topk_params(default_k):
+    """Read k and the ward/zone/category filters from the query string."""
+    try:
+        k = int(request.args.get('k', default_k))
+    except ValueError:
+        raise InvalidParam("k must be an integer")
+    if k < 1 or k > MAX_TOP_K:
+        raise InvalidParam(f"k must be between 1 and {MAX_TOP_K}")
+    filters = {f: request.args.getlist(f) for f in FILTER_FIELDS if request.args.getlist(f)}
+    return k, filters
+
+
+NEAR_FIELDS = ['_id', 'ward', 'zone', 'category', 'status', 'realTimeCapacity', 'totalCapacity']
+DEFAULT_NEAR_K = 50
+MAX_NEAR_RESULTS = 5000
+
+
+def _spatial_rows(index, positions, distances=None):
+    result = index.frame.iloc[positions][[c for c in NEAR_FIELDS if c in index.frame.columns]].reset_index(drop=True)
+    result['_id'] = result['_id'].astype(str)
+    result['lat'] = index.lat[positions]
+    result['lng'] = index.lon[positions]
+    if distances is not None:
+        result['distanceM'] = np.round(distances, 1)
+    return _json_records(result)
+
+
+@app.route('/bins/near', methods=['GET'])
+def bins_near():
+    """Bins around ?lat=&lng=, nearest first: within ?radius= metres and/or the ?k= nearest."""
+    try:
+        lat = _float_arg('lat', minimum=-90, maximum=90)
+        lng = _float_arg('lng', minimum=-180, maximum=180)
+        if lat is None or lng is None:
+            raise InvalidParam("lat and lng are required")
+        radius = _float_arg('radius', minimum=0)
+        k = _int_arg('k', default=MAX_NEAR_RESULTS if radius is not None else DEFAULT_NEAR_K, minimum=1)
+        if k > MAX_NEAR_RESULTS:
+            raise InvalidParam(f"k must be at most {MAX_NEAR_RESULTS}")
+
+        index = spatial_index.get()
+        positions, distances = index.near(lat, lng, radius_m=radius, k=k)
+        return jsonify({"bins": _spatial_rows(index, positions, distances)}), 200
+    except InvalidParam as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.exception("Near bins error")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/bins/within', methods=['GET'])
+def bins_within():
+    """Bins inside ?bbox=west,south,east,north (Leaflet's toBBoxString order), at most ?limit=."""
+    try:
+        try:
+            west, south, east, north = (float(v) for v in request.args.get('bbox', '').split(','))
+        except ValueError:
+            raise InvalidParam("bbox must be west,south,east,north")
+        if not (-90 <= south <= north <= 90 and abs(west) <= 180 and abs(east) <= 180):
+            raise InvalidParam("bbox must be west,south,east,north")
+        limit = _int_arg('limit', default=MAX_NEAR_RESULTS, minimum=1)
+        if limit > MAX_NEAR_RESULTS:
+            raise InvalidParam(f"limit must be at most {MAX_NEAR_RESULTS}")
+
+        index = spatial_index.get()
+        positions = index.within(west, south, east, north)
+        return jsonify({
+            "bins": _spatial_rows(index, positions[:limit]),
+            "total": int(len(positions)),
+            "truncated": bool(len(positions) > limit),
+        }), 200
+    except InvalidParam as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.exception("Bins within error")
         return jsonify({"error": str(e)}), 500
 
 
@@ -122,102 +436,280 @@ def schedule():
 @app.route('/ml/forecast', methods=['GET'])
 def ml_forecast():
     try:
-        data = _load_bins_df()
-        if data.empty:
+        k, filters = _topk_params(10)
+        index = score_index.get()
+        if not index.size:
             return jsonify({"bins": []}), 200
 
-        # Simple forecasting: hours until full based on observed per-day quantity
-        # predictedApproxTime computed as in schedule
-        per_hour = (data['wasteQuantityPerDay'] / 24.0).replace({0.0: 1e-6})
-        data['hoursUntilFull'] = (data['totalCapacity'] - data['realTimeCapacity']) / per_hour
-        data['predictedFullDateTime'] = data.apply(
-            lambda row: (pd.Timestamp.utcnow() + timedelta(hours=float(max(row['hoursUntilFull'], 0)))).strftime('%Y-%m-%d %H:%M:%S'),
-            axis=1
+        # Hours until full from each bin's fitted fill rate (95% bounds), or from its
+        # per-day quantity while it has too little history; computed once per
+        # snapshot, return the k soonest-to-fill bins
+        forecast = index.forecast
+        top = index.top_k(index.hours_until_full, k, index.mask(filters))
+        result = index.rows(
+            top, ['_id', 'ward', 'zone', 'category', 'realTimeCapacity', 'totalCapacity'],
+            hoursUntilFull=index.hours_until_full,
+            hoursUntilFullLow=forecast["low"], hoursUntilFullHigh=forecast["high"],
+            fillRatePerHour=forecast["rate"], forecastMethod=FORECAST_METHODS[forecast["method"]],
         )
-
-        # Return top 10 soon-to-fill
-        topk = data.sort_values('hoursUntilFull').head(10).copy()
-        # Ensure _id column name is consistent
-        if '_id' not in topk.columns:
-            # In case of different naming (unlikely), create a placeholder
-            topk['_id'] = ''
-        cols = ['_id', 'ward', 'zone', 'category', 'realTimeCapacity', 'totalCapacity', 'hoursUntilFull', 'predictedFullDateTime']
-        existing_cols = [c for c in cols if c in topk.columns]
-        result = topk[existing_cols].copy()
-        if '_id' in result.columns:
-            result['_id'] = result['_id'].astype(str)
-        return jsonify({"bins": result.to_dict(orient='records')}), 200
+        now = _utcnow()
+        result['predictedFullDateTime'] = bin_math.add_hours(now, result['hoursUntilFull'].clip(lower=0))
+        result['predictedFullEarliest'] = bin_math.add_hours(now, result['hoursUntilFullLow'].clip(lower=0))
+        result['predictedFullLatest'] = bin_math.add_hours(now, result['hoursUntilFullHigh'].clip(lower=0))
+        return jsonify({"bins": _json_records(result)}), 200
+    except InvalidParam as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"Forecast error: {e}")
+        logger.exception("Forecast error")
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/ml/anomalies', methods=['GET'])
 def ml_anomalies():
     try:
-        data = _load_bins_df()
-        if data.empty:
+        k, filters = _topk_params(20)
+        # mode=full recomputes z from the snapshot instead of the running
+        # statistics; mode=validate reports whether the two agree
+        mode = request.args.get('mode', 'stream')
+        if mode not in ('stream', 'full', 'validate'):
+            raise InvalidParam("mode must be one of stream, full, validate")
+        index = score_index.get()
+        if mode == 'validate':
+            return jsonify(anomaly_engine.validate(index.frame, index.version)), 200
+        if not index.size:
             return jsonify({"bins": []}), 200
 
-        # Ward-wise z-score for realTimeCapacity
-        def zscore(group):
-            mean = group['realTimeCapacity'].mean()
-            std = group['realTimeCapacity'].std() or 1.0
-            return (group['realTimeCapacity'] - mean) / std
-
-        data['z'] = data.groupby(data.get('ward', pd.Series(['unknown'] * len(data))))['realTimeCapacity'].transform(
-            lambda s: (s - s.mean()) / (s.std() or 1.0)
-        )
-
-        anomalies = data[ data['z'].abs() >= 1.5 ].copy()
-        anomalies = anomalies.sort_values('z', key=lambda s: s.abs(), ascending=False).head(20)
-        result = anomalies[[ '_id', 'ward', 'zone', 'category', 'realTimeCapacity', 'totalCapacity', 'z' ]].copy()
-        result['_id'] = result['_id'].astype(str)
-        return jsonify({"bins": result.to_dict(orient='records')}), 200
+        # Ward-wise z-score for realTimeCapacity; largest |z| first
+        z = full_recompute_z(index.frame) if mode == 'full' else index.z
+        mask = np.abs(z) >= ANOMALY_Z_THRESHOLD
+        filter_mask = index.mask(filters)
+        if filter_mask is not None:
+            mask &= filter_mask
+
+        top = index.top_k(np.abs(z), k, mask, descending=True)
+        result = index.rows(top, ['_id', 'ward', 'zone', 'category', 'realTimeCapacity', 'totalCapacity'], z=z)
+        return jsonify({"bins": _json_records(result)}), 200
+    except InvalidParam as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"Anomaly error: {e}")
+        logger.exception("Anomaly error")
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/ml/priority', methods=['GET'])
 def ml_priority():
     try:
-        data = _load_bins_df()
-        if data.empty:
+        k, filters = _topk_params(20)
+        index = score_index.get()
+        if not index.size:
             return jsonify({"bins": []}), 200
 
-        # Compute hours until full as proxy of urgency
-        per_hour = (data['wasteQuantityPerDay'] / 24.0).replace({0.0: 1e-6})
-        data['hoursUntilFull'] = (data['totalCapacity'] - data['realTimeCapacity']) / per_hour
-
-        # Status weight
-        def status_weight(row):
-            # If backend stored status, use it, else derive from ratio
-            status = row.get('status')
-            if not isinstance(status, str):
-                ratio = row['realTimeCapacity'] / max(row['totalCapacity'], 1e-6)
-                status = 'filled' if ratio >= 0.85 else ('partially_filled' if ratio >= 0.5 else 'empty')
-            return 3 if status == 'filled' else (2 if status == 'partially_filled' else 0)
-
-        data['statusW'] = data.apply(status_weight, axis=1)
-        # Sensor absence increases priority slightly (needs manual observation)
-        sensor = data.get('sensorEnabled')
-        if sensor is None:
-            data['sensorBoost'] = 0.5
-        else:
-            data['sensorBoost'] = (~sensor.astype(bool)).astype(int) * 0.5
+        # priorityScore = status weight + sensor absence boost + 2 * urgency, precomputed per snapshot
+        top = index.top_k(index.priority_score, k, index.mask(filters), descending=True)
+        result = index.rows(
+            top, ['_id', 'ward', 'zone', 'category', 'realTimeCapacity', 'totalCapacity'],
+            hoursUntilFull=index.hours_until_full, priorityScore=index.priority_score,
+        )
+        return jsonify({"bins": _json_records(result)}), 200
+    except InvalidParam as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.exception("Priority error")
+        return jsonify({"error": str(e)}), 500
+
+
+MAX_ROUTE_BINS = 5000
+MAX_TRUCKS = 100
+MAX_TIME_BUDGET = 30.0
+# Default depot "lat,lng" and truck capacity (in realTimeCapacity units) for /ml/routes
+ROUTE_DEPOT = os.environ.get('ROUTE_DEPOT')
+ROUTE_TRUCK_CAPACITY = float(os.environ.get('ROUTE_TRUCK_CAPACITY', 2000))
 
-        # Lower hoursUntilFull means higher priority -> invert
-        max_h = max(float(data['hoursUntilFull'].max()), 1.0)
-        data['urgency'] = 1.0 - (data['hoursUntilFull'] / max_h).clip(lower=0.0, upper=1.0)
-        data['priorityScore'] = data['statusW'] + data['sensorBoost'] + 2.0 * data['urgency']
 
-        top = data.sort_values('priorityScore', ascending=False).head(20)
-        result = top[[ '_id', 'ward', 'zone', 'category', 'realTimeCapacity', 'totalCapacity', 'hoursUntilFull', 'priorityScore' ]].copy()
-        result['_id'] = result['_id'].astype(str)
-        return jsonify({"bins": result.to_dict(orient='records')}), 200
+def _route_params():
+    """trucks, per-truck capacities, depot (lat, lng), candidate count k and time budget from the query string."""
+    trucks = _int_arg('trucks', default=1, minimum=1)
+    if trucks > MAX_TRUCKS:
+        raise InvalidParam(f"trucks must be at most {MAX_TRUCKS}")
+    try:
+        capacities = [float(c) for c in request.args.get('capacity', '').split(',') if c.strip()]
+        depot = [float(c) for c in (request.args.get('depot') or ROUTE_DEPOT or '').split(',') if c.strip()]
+        time_budget = float(request.args.get('time_budget', DEFAULT_TIME_BUDGET))
+    except ValueError:
+        raise InvalidParam("capacity, depot and time_budget must be numbers")
+    if not capacities:
+        capacities = [ROUTE_TRUCK_CAPACITY]
+    if len(capacities) == 1:
+        capacities = capacities * trucks
+    if len(capacities) != trucks:
+        raise InvalidParam("capacity must be one value or one per truck")
+    if min(capacities) <= 0:
+        raise InvalidParam("capacity must be positive")
+    if len(depot) != 2 or abs(depot[0]) > 90 or abs(depot[1]) > 180:
+        raise InvalidParam("depot must be lat,lng")
+    if not 0 <= time_budget <= MAX_TIME_BUDGET:
+        raise InvalidParam(f"time_budget must be between 0 and {MAX_TIME_BUDGET} seconds")
+    k = _int_arg('k', default=200, minimum=1)
+    if k > MAX_ROUTE_BINS:
+        raise InvalidParam(f"k must be at most {MAX_ROUTE_BINS}")
+    return capacities, tuple(depot), k, time_budget
+
+
+@app.route('/ml/routes', methods=['GET'])
+def ml_routes():
+    try:
+        capacities, depot, k, time_budget = _route_params()
+        filters = {f: request.args.getlist(f) for f in FILTER_FIELDS if request.args.getlist(f)}
+        index = score_index.get()
+        depot_json = {"lat": depot[0], "lng": depot[1]}
+        if not index.size:
+            return jsonify({"depot": depot_json, "routes": [], "unassigned": []}), 200
+
+        # The k highest-priority bins are the candidates, most urgent first;
+        # each truck collects what the bins currently hold
+        candidates = index.top_k(index.priority_score, k, index.mask(filters), descending=True)
+        lat, lon = (c[candidates] for c in index.coordinates)
+        demand = index.frame['realTimeCapacity'].to_numpy(dtype='float64')[candidates]
+        cached = distance_index.get()
+
+        def distances(stops):
+            # None (computed from lat/lon instead) once the cache holds another snapshot than index
+            return cached.route_matrix(candidates[stops], depot, index.version)
+
+        plan = plan_routes(lat, lon, demand, depot, capacities, time_budget, distances)
+
+        routes = []
+        for truck, (route, capacity) in enumerate(zip(plan["routes"], capacities), start=1):
+            stops = index.rows(candidates[route["stops"]], ['_id', 'ward', 'zone', 'realTimeCapacity'],
+                               priorityScore=index.priority_score,
+                               lat=index.coordinates[0], lng=index.coordinates[1])
+            routes.append({
+                "truck": truck,
+                "capacity": capacity,
+                "load": route["load"],
+                "distanceKm": round(route["distanceKm"], 3),
+                "stops": _json_records(stops),
+            })
+        unassigned = [
+            {"_id": str(index.frame['_id'].iat[candidates[pos]]), "reason": reason}
+            for reason, positions in plan["unassigned"].items() for pos in positions
+        ]
+        return jsonify({"depot": depot_json, "routes": routes, "unassigned": unassigned, "stats": plan["stats"]}), 200
+    except InvalidParam as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"Priority error: {e}")
+        logger.exception("Routes error")
         return jsonify({"error": str(e)}), 500
+
+
+HISTORY_DEFAULT_WINDOW = pd.Timedelta(days=7)
+MAX_HISTORY_BUCKETS = 10000
+
+
+def _history_params():
+    """[start, end) from ?start=/?end= (ISO datetimes), plus ?interval= and ?how= for downsampling."""
+    try:
+        end = pd.Timestamp(request.args['end']) if request.args.get('end') else _utcnow()
+        start = pd.Timestamp(request.args['start']) if request.args.get('start') else end - HISTORY_DEFAULT_WINDOW
+        interval = pd.Timedelta(request.args['interval']) if request.args.get('interval') else None
+    except ValueError:
+        raise InvalidParam("start/end must be ISO datetimes and interval a duration such as 1h")
+    if start.tzinfo is not None:
+        start = start.tz_convert(None)
+    if end.tzinfo is not None:
+        end = end.tz_convert(None)
+    if end <= start:
+        raise InvalidParam("start must be before end")
+    if interval is not None:
+        if interval < pd.Timedelta(seconds=1):
+            raise InvalidParam("interval must be at least 1s")
+        if (end - start) / interval > MAX_HISTORY_BUCKETS:
+            raise InvalidParam(f"At most {MAX_HISTORY_BUCKETS} intervals per request")
+    how = request.args.get('how', 'mean')
+    if how not in ('mean', 'last'):
+        raise InvalidParam("how must be one of mean, last")
+    return start, end, interval, how
+
+
+def _downsampled(bin_ids, start, end, interval, how):
+    ids, edges, matrix = fill_history.downsample(bin_ids, start, end, int(interval.total_seconds()), how)
+    times = pd.DatetimeIndex(edges).strftime('%Y-%m-%dT%H:%M:%S').tolist()
+    return {
+        "interval": int(interval.total_seconds()),
+        "timestamps": times,
+        "bins": [
+            {"_id": bin_id, "values": [None if np.isnan(v) else float(v) for v in row]}
+            for bin_id, row in zip(ids, matrix)
+        ],
+    }
+
+
+@app.route('/ml/rollups', methods=['GET'])
+def ml_rollups():
+    try:
+        by = request.args.get('by', 'ward')
+        if by not in ROLLUP_GROUPS:
+            raise InvalidParam(f"by must be one of {', '.join(ROLLUP_GROUPS)}")
+        source = request.args.get('source', 'auto')
+        if source not in ROLLUP_SOURCES:
+            raise InvalidParam(f"source must be one of {', '.join(ROLLUP_SOURCES)}")
+        filters = {f: request.args.getlist(f) for f in ROLLUP_FILTERS if request.args.getlist(f)}
+        rows, used = rollups.rollup(by, filters, source)
+        return jsonify({"by": by, "source": used, "rollups": rows}), 200
+    except InvalidParam as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.exception("Rollup error")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/ml/history/<bin_id>', methods=['GET'])
+def ml_history_bin(bin_id):
+    try:
+        start, end, interval, how = _history_params()
+        if interval is not None:
+            return jsonify(_downsampled([bin_id], start, end, interval, how)), 200
+        readings = fill_history.range(bin_id, start, end)
+        return jsonify({"_id": bin_id, "readings": _json_records(readings)}), 200
+    except InvalidParam as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.exception("History error")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/ml/history', methods=['GET'])
+def ml_history_ward():
+    try:
+        ward = request.args.get('ward')
+        if not ward:
+            raise InvalidParam("ward is required")
+        start, end, interval, how = _history_params()
+        if interval is not None:
+            return jsonify(dict(_downsampled(fill_history.bins(ward), start, end, interval, how), ward=ward)), 200
+        readings = fill_history.ward_range(ward, start, end)
+        return jsonify({"ward": ward, "readings": _json_records(readings)}), 200
+    except InvalidParam as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.exception("History error")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/ml/history/stats', methods=['GET'])
+def ml_history_stats():
+    return jsonify(fill_history.stats()), 200
+
+
+@app.route('/ml/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(bins_cache.stats()), 200
+
+
+@app.route('/ml/routes/distances/stats', methods=['GET'])
+def distance_stats():
+    return jsonify(distance_matrix.stats()), 200
+
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -52,7 +52,7 @@ class SPMDemo:
         
         # Train all models
         self.print_section("Training All SPM Models")
-        result = self.make_request("/spm/models/train-all", "POST")
+        result = self.make_request("/spm/models/train-all?wait=true", "POST")
         
         if "error" in result:
             print(f"❌ Error: {result['error']}")
@@ -6,15 +6,17 @@ Demonstrates advanced AI/ML concepts in Software Project Management
 import pandas as pd
 import numpy as np
 from pymongo import MongoClient
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 from datetime import datetime, timedelta
+import importlib.util
+import threading
 import warnings
 warnings.filterwarnings('ignore')
 
 # ML Libraries
 from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier, GradientBoostingClassifier
+from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier, GradientBoostingClassifier, GradientBoostingRegressor
 from sklearn.linear_model import LinearRegression, LogisticRegression
 from sklearn.svm import SVC
 from sklearn.metrics import mean_squared_error, accuracy_score, classification_report
@@ -22,26 +24,38 @@ from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.cluster import KMeans
 from sklearn.decomposition import PCA
 
-# Deep Learning (if available)
-try:
-    import tensorflow as tf
-    from tensorflow.keras.models import Sequential
-    from tensorflow.keras.layers import Dense, LSTM, Dropout
-    from tensorflow.keras.optimizers import Adam
-    DEEP_LEARNING_AVAILABLE = True
-except ImportError:
-    DEEP_LEARNING_AVAILABLE = False
-    print("TensorFlow not available. Deep learning features disabled.")
+from bin_columnar import profile_fields
+from bin_preprocess import empty_report, preprocess_bins
+from bin_sync import IncrementalBinLoader
+from feature_store import MODEL_FEATURES, FeatureStore
+from model_registry import ModelRegistry, RegistryBackedModels, data_hash, training_key
+from prefork import request_reload
+from report_attachments import DEFAULT_THUMBNAIL_SIZE, MAX_THUMBNAIL_SIZE, REPORT_PROJECTION, AttachmentStore
+from spm_inference import FILTER_FIELDS, SPMInference
+from training_jobs import FOREST_N_JOBS, TrainingJobs
 
-# NLP Libraries (if available)
-try:
-    from transformers import pipeline, AutoTokenizer, AutoModel
-    import torch
-    NLP_AVAILABLE = True
-except ImportError:
-    NLP_AVAILABLE = False
+# Deep learning and NLP backends are optional and slow to import (seconds,
+# hundreds of MB), so only their presence is checked here; TensorFlow is
+# imported by _keras() the first time the deep-learning path runs
+DEEP_LEARNING_AVAILABLE = importlib.util.find_spec('tensorflow') is not None
+NLP_AVAILABLE = all(importlib.util.find_spec(m) is not None for m in ('transformers', 'torch'))
+if not DEEP_LEARNING_AVAILABLE:
+    print("TensorFlow not available. Deep learning features disabled.")
+if not NLP_AVAILABLE:
     print("Transformers not available. NLP features disabled.")
 
+_keras_modules = None
+
+def _keras():
+    """(Sequential, Dense, LSTM, Dropout, Adam), importing TensorFlow on first use"""
+    global _keras_modules
+    if _keras_modules is None:
+        from tensorflow.keras.models import Sequential
+        from tensorflow.keras.layers import Dense, LSTM, Dropout
+        from tensorflow.keras.optimizers import Adam
+        _keras_modules = (Sequential, Dense, LSTM, Dropout, Adam)
+    return _keras_modules
+
 app = Flask(__name__)
 CORS(app)
 
@@ -57,69 +71,139 @@ class SPMEnhancedModels:
     Enhanced ML models demonstrating SPM AI/ML concepts
     """
     
-    def __init__(self):
-        self.models = {}
-        self.scalers = {}
+    def __init__(self, registry=None, load=True):
+        # Trained models persist in the registry and are loaded on first use,
+        # so a restart keeps serving the last promoted version of each model
+        self.registry = registry or ModelRegistry()
+        self.models = RegistryBackedModels(self.registry, 'model')
+        self.scalers = RegistryBackedModels(self.registry, 'scaler')
         self.encoders = {}
-        self.load_data()
+        self.forest_n_jobs = FOREST_N_JOBS
+        # Bumped whenever bins_df is replaced; keys the feature store and prediction cache
+        self.data_version = 0
+        self.feature_store = FeatureStore()
+        self.data_quality = empty_report()
+        self._bins_loader = IncrementalBinLoader(
+            wastebins_collection, self.preprocess_bins, fields=profile_fields('spm')
+        )
+        if load:
+            self.load_data()
+        else:
+            # Training worker: the caller hands over bins_df
+            self.bins_df = pd.DataFrame()
+            self.reports_df = pd.DataFrame()
+            self.users_df = pd.DataFrame()
     
-    def load_data(self):
-        """Load and preprocess data from MongoDB"""
+    def load_data(self, incremental=False):
+        """
+        Load and preprocess data from MongoDB
+
+        With incremental=True and bins already loaded, only bins changed since
+        the last load are fetched and patched into bins_df (see bin_sync).
+        Returns False when MongoDB could not be read (the frames are left empty).
+        """
         try:
+            if incremental and self._bins_loader.frame is not None:
+                frame = self._bins_loader.refresh()
+                # Nothing changed when the loader hands back the same frame
+                if frame is not self.bins_df:
+                    self.bins_df = frame
+                    self.data_version += 1
+                print(f"Bins refreshed incrementally: {self._bins_loader.last_refresh}")
+                return True
+
             # Load waste bins data
-            bins_data = list(wastebins_collection.find())
-            self.bins_df = pd.DataFrame(bins_data)
+            self.bins_df = self._bins_loader.load_full()
+            self.data_version += 1
             
-            # Load reports data
-            reports_data = list(reports_collection.find())
+            # Load reports data; attachment images stay in MongoDB (see attachment_store)
+            reports_data = list(reports_collection.find({}, REPORT_PROJECTION))
             self.reports_df = pd.DataFrame(reports_data)
             
             # Load users data
             users_data = list(users_collection.find())
             self.users_df = pd.DataFrame(users_data)
             
-            self.preprocess_data()
             print("Data loaded successfully")
+            return True
             
         except Exception as e:
             print(f"Error loading data: {e}")
             self.bins_df = pd.DataFrame()
+            self.data_version += 1
             self.reports_df = pd.DataFrame()
             self.users_df = pd.DataFrame()
+            return False
     
     def preprocess_data(self):
         """Preprocess data for ML models"""
         if self.bins_df.empty:
             return
         
-        # Clean and normalize waste bins data
-        self.bins_df['wasteQuantityPerDay'] = pd.to_numeric(
-            self.bins_df['wasteQuantityPerDay'].astype(str).str.replace(' tonnes', ''), 
-            errors='coerce'
-        ).fillna(0.0)
-        
-        self.bins_df['totalCapacity'] = pd.to_numeric(
-            self.bins_df['totalCapacity'], errors='coerce'
-        ).fillna(0.0)
-        
-        self.bins_df['realTimeCapacity'] = pd.to_numeric(
-            self.bins_df['realTimeCapacity'], errors='coerce'
-        ).fillna(0.0)
-        
-        # Calculate derived features
-        self.bins_df['capacity_ratio'] = self.bins_df['realTimeCapacity'] / self.bins_df['totalCapacity']
-        self.bins_df['remaining_capacity'] = self.bins_df['totalCapacity'] - self.bins_df['realTimeCapacity']
-        self.bins_df['fill_rate'] = self.bins_df['wasteQuantityPerDay'] / 24.0  # per hour
-        
-        # Status classification
-        self.bins_df['status'] = self.bins_df['capacity_ratio'].apply(
-            lambda x: 'filled' if x >= 0.8 else ('partially_filled' if x >= 0.3 else 'empty')
-        )
-        
+        self.bins_df = self.preprocess_bins(self.bins_df)
+        self.data_version += 1
         print("Data preprocessing completed")
     
+    def preprocess_bins(self, bins_df):
+        """Clean bin documents and add derived features; works on any subset of bins"""
+        # Vectorized and validated (see bin_preprocess); the report covers the
+        # rows of this call: the whole fleet on a full load, the changed bins on a refresh
+        bins_df, self.data_quality = preprocess_bins(bins_df)
+        return bins_df
+    
+    @property
+    def features(self):
+        """float32 feature matrix of the current bins_df (see feature_store)"""
+        return self.feature_store.get(self.bins_df, self.data_version)
+    
+    def _register(self, name, model, X, y=None, metrics=None, scaler=None, best_model=None,
+                  cache_key=None, result=None, scaled_input=False):
+        """Persist a trained model (and scaler) as the new current registry version"""
+        artifacts = {'model': model}
+        if scaler is not None:
+            artifacts['scaler'] = scaler
+        arrays = [X] if y is None else [X, y]
+        version = self.registry.save(name, artifacts, {
+            'dataHash': data_hash(*arrays),
+            'cacheKey': cache_key,
+            'features': list(X.columns),
+            'rows': len(X),
+            'bestModel': best_model,
+            'modelClass': type(model).__name__,
+            # Predict on scaler.transform(X) instead of X
+            'scaledInput': scaled_input,
+            'metrics': metrics or {},
+            'result': result,
+        })
+        return version
+    
+    def _cached_training(self, name, key, force=False):
+        """
+        Trainer response of a stored version trained on the same data and
+        hyperparameters, promoting that version if needed; None means train
+        """
+        if force:
+            return None
+        version = self.registry.find(name, key)
+        if version is None:
+            return None
+        meta = self.registry.metadata(name, version)
+        if meta.get('result') is None:
+            return None
+        if self.registry.current(name) != version:
+            self.registry.promote(name, version)
+        return dict(meta['result'], version=version, cached=True)
+    
+    @staticmethod
+    def _scalar_metrics(results):
+        """Per candidate model, only the scalar metrics (no predictions/reports)"""
+        return {
+            name: {k: v for k, v in r.items() if isinstance(v, (int, float, np.number))}
+            for name, r in results.items()
+        }
+    
     # 1. PROJECT PLANNING & ESTIMATION
-    def train_effort_estimation_model(self):
+    def train_effort_estimation_model(self, force=False):
         """
         SPM Category 1: Project Planning & Estimation
         ML Regression Models for predicting project effort & cost
@@ -128,8 +212,8 @@ class SPMEnhancedModels:
             return {"error": "No data available"}
         
         # Features for effort estimation
-        features = ['totalCapacity', 'realTimeCapacity', 'wasteQuantityPerDay', 'capacity_ratio']
-        X = self.bins_df[features].fillna(0)
+        features = MODEL_FEATURES
+        X = self.features.frame(features)
         
         # Target: estimated collection time (hours)
         y = (self.bins_df['remaining_capacity'] / (self.bins_df['fill_rate'] + 1e-6)).fillna(0)
@@ -145,10 +229,16 @@ class SPMEnhancedModels:
         # Train multiple models
         models = {
             'Linear Regression': LinearRegression(),
-            'Random Forest': RandomForestRegressor(n_estimators=100, random_state=42),
-            'Gradient Boosting': GradientBoostingClassifier(random_state=42)
+            'Random Forest': RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=self.forest_n_jobs),
+            'Gradient Boosting': GradientBoostingRegressor(random_state=42)
         }
         
+        # Same data, hyperparameters and library versions: reuse the stored model
+        key = training_key([X, y], models)
+        cached = self._cached_training('effort_estimation', key, force)
+        if cached is not None:
+            return cached
+        
         results = {}
         for name, model in models.items():
             if name == 'Linear Regression':
@@ -167,17 +257,20 @@ class SPMEnhancedModels:
         
         # Store the best model
         best_model = min(results.keys(), key=lambda x: results[x]['mse'])
-        self.models['effort_estimation'] = models[best_model]
-        self.scalers['effort_estimation'] = scaler
-        
-        return {
+        result = {
             'best_model': best_model,
             'results': results,
-            'feature_importance': dict(zip(features, self.models['effort_estimation'].feature_importances_)) if hasattr(self.models['effort_estimation'], 'feature_importances_') else None
+            'feature_importance': dict(zip(features, models[best_model].feature_importances_)) if hasattr(models[best_model], 'feature_importances_') else None
         }
+        result['version'] = self._register('effort_estimation', models[best_model], X, y,
+                                           self._scalar_metrics(results), scaler=scaler, best_model=best_model,
+                                           cache_key=key, result=result,
+                                           scaled_input=best_model == 'Linear Regression')
+        result['cached'] = False
+        return result
     
     # 2. SCHEDULING & RESOURCE ALLOCATION
-    def train_resource_allocation_model(self):
+    def train_resource_allocation_model(self, force=False):
         """
         SPM Category 2: Scheduling & Resource Allocation
         ML models for optimizing resource allocation
@@ -186,8 +279,8 @@ class SPMEnhancedModels:
             return {"error": "No data available"}
         
         # Features for resource allocation
-        features = ['totalCapacity', 'realTimeCapacity', 'wasteQuantityPerDay', 'capacity_ratio']
-        X = self.bins_df[features].fillna(0)
+        features = MODEL_FEATURES
+        X = self.features.frame(features)
         
         # Target: priority score (higher = more urgent)
         y = self.bins_df['capacity_ratio'] * 3 + (1 - self.bins_df['capacity_ratio']) * 2
@@ -199,11 +292,16 @@ class SPMEnhancedModels:
         
         # Train models
         models = {
-            'Random Forest': RandomForestClassifier(n_estimators=100, random_state=42),
+            'Random Forest': RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=self.forest_n_jobs),
             'SVM': SVC(random_state=42),
             'Logistic Regression': LogisticRegression(random_state=42)
         }
         
+        key = training_key([X, priority_levels], models)
+        cached = self._cached_training('resource_allocation', key, force)
+        if cached is not None:
+            return cached
+        
         results = {}
         for name, model in models.items():
             model.fit(X_train, y_train)
@@ -217,15 +315,18 @@ class SPMEnhancedModels:
         
         # Store the best model
         best_model = max(results.keys(), key=lambda x: results[x]['accuracy'])
-        self.models['resource_allocation'] = models[best_model]
-        
-        return {
+        result = {
             'best_model': best_model,
             'results': results
         }
+        result['version'] = self._register('resource_allocation', models[best_model], X, priority_levels,
+                                           self._scalar_metrics(results), best_model=best_model,
+                                           cache_key=key, result=result)
+        result['cached'] = False
+        return result
     
     # 3. RISK MANAGEMENT
-    def train_risk_assessment_model(self):
+    def train_risk_assessment_model(self, force=False):
         """
         SPM Category 3: Risk Management
         ML Classification Models for predicting project risks
@@ -234,8 +335,8 @@ class SPMEnhancedModels:
             return {"error": "No data available"}
         
         # Features for risk assessment
-        features = ['totalCapacity', 'realTimeCapacity', 'wasteQuantityPerDay', 'capacity_ratio']
-        X = self.bins_df[features].fillna(0)
+        features = MODEL_FEATURES
+        X = self.features.frame(features)
         
         # Risk factors: high capacity ratio + high waste quantity = high risk
         risk_score = self.bins_df['capacity_ratio'] * 0.6 + (self.bins_df['wasteQuantityPerDay'] / 10) * 0.4
@@ -245,11 +346,16 @@ class SPMEnhancedModels:
         
         # Train models
         models = {
-            'Random Forest': RandomForestClassifier(n_estimators=100, random_state=42),
+            'Random Forest': RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=self.forest_n_jobs),
             'Gradient Boosting': GradientBoostingClassifier(random_state=42),
             'SVM': SVC(random_state=42)
         }
         
+        key = training_key([X, risk_levels], models)
+        cached = self._cached_training('risk_assessment', key, force)
+        if cached is not None:
+            return cached
+        
         results = {}
         for name, model in models.items():
             model.fit(X_train, y_train)
@@ -263,15 +369,18 @@ class SPMEnhancedModels:
         
         # Store the best model
         best_model = max(results.keys(), key=lambda x: results[x]['accuracy'])
-        self.models['risk_assessment'] = models[best_model]
-        
-        return {
+        result = {
             'best_model': best_model,
             'results': results
         }
+        result['version'] = self._register('risk_assessment', models[best_model], X, risk_levels,
+                                           self._scalar_metrics(results), best_model=best_model,
+                                           cache_key=key, result=result)
+        result['cached'] = False
+        return result
     
     # 4. QUALITY MANAGEMENT
-    def train_quality_prediction_model(self):
+    def train_quality_prediction_model(self, force=False):
         """
         SPM Category 4: Quality Management
         ML models for predicting quality issues
@@ -280,8 +389,8 @@ class SPMEnhancedModels:
             return {"error": "No data available"}
         
         # Features for quality prediction
-        features = ['totalCapacity', 'realTimeCapacity', 'wasteQuantityPerDay', 'capacity_ratio']
-        X = self.bins_df[features].fillna(0)
+        features = MODEL_FEATURES
+        X = self.features.frame(features)
         
         # Quality issues: bins that are consistently full or have high waste quantity
         quality_score = self.bins_df['capacity_ratio'] * 0.7 + (self.bins_df['wasteQuantityPerDay'] / 5) * 0.3
@@ -291,10 +400,15 @@ class SPMEnhancedModels:
         
         # Train models
         models = {
-            'Random Forest': RandomForestClassifier(n_estimators=100, random_state=42),
+            'Random Forest': RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=self.forest_n_jobs),
             'Gradient Boosting': GradientBoostingClassifier(random_state=42)
         }
         
+        key = training_key([X, quality_levels], models)
+        cached = self._cached_training('quality_prediction', key, force)
+        if cached is not None:
+            return cached
+        
         results = {}
         for name, model in models.items():
             model.fit(X_train, y_train)
@@ -308,15 +422,18 @@ class SPMEnhancedModels:
         
         # Store the best model
         best_model = max(results.keys(), key=lambda x: results[x]['accuracy'])
-        self.models['quality_prediction'] = models[best_model]
-        
-        return {
+        result = {
             'best_model': best_model,
             'results': results
         }
+        result['version'] = self._register('quality_prediction', models[best_model], X, quality_levels,
+                                           self._scalar_metrics(results), best_model=best_model,
+                                           cache_key=key, result=result)
+        result['cached'] = False
+        return result
     
     # 5. MONITORING & CONTROL
-    def train_anomaly_detection_model(self):
+    def train_anomaly_detection_model(self, force=False):
         """
         SPM Category 6: Monitoring & Control
         Anomaly Detection for identifying unusual patterns
@@ -325,14 +442,22 @@ class SPMEnhancedModels:
             return {"error": "No data available"}
         
         # Features for anomaly detection
-        features = ['totalCapacity', 'realTimeCapacity', 'wasteQuantityPerDay', 'capacity_ratio']
-        X = self.bins_df[features].fillna(0)
+        features = MODEL_FEATURES
+        X = self.features.frame(features)
         
         # Use Isolation Forest for anomaly detection
         from sklearn.ensemble import IsolationForest
         
         # Train Isolation Forest
-        iso_forest = IsolationForest(contamination=0.1, random_state=42)
+        iso_forest = IsolationForest(contamination=0.1, random_state=42, n_jobs=self.forest_n_jobs)
+        
+        # The response lists bins by id/ward/zone, so those are part of the key
+        key = training_key([X, self.bins_df['_id'], self.bins_df.get('ward'), self.bins_df.get('zone')],
+                           {'Isolation Forest': iso_forest})
+        cached = self._cached_training('anomaly_detection', key, force)
+        if cached is not None:
+            return cached
+        
         anomaly_labels = iso_forest.fit_predict(X)
         
         # Calculate anomaly scores
@@ -341,14 +466,19 @@ class SPMEnhancedModels:
         # Identify anomalies
         anomalies = self.bins_df[anomaly_labels == -1].copy()
         anomalies['anomaly_score'] = anomaly_scores[anomaly_labels == -1]
+        anomalies['_id'] = anomalies['_id'].astype(str)
         
-        self.models['anomaly_detection'] = iso_forest
-        
-        return {
+        result = {
             'total_anomalies': len(anomalies),
             'anomaly_percentage': (len(anomalies) / len(self.bins_df)) * 100,
             'anomalies': anomalies[['_id', 'ward', 'zone', 'capacity_ratio', 'anomaly_score']].to_dict('records')[:10]
         }
+        result['version'] = self._register('anomaly_detection', iso_forest, X, metrics={
+            'total_anomalies': result['total_anomalies'],
+            'anomaly_percentage': result['anomaly_percentage'],
+        }, cache_key=key, result=result)
+        result['cached'] = False
+        return result
     
     # 6. DEEP LEARNING MODELS (if available)
     def train_deep_learning_model(self):
@@ -363,11 +493,10 @@ class SPMEnhancedModels:
             return {"error": "No data available"}
         
         # Prepare data for LSTM
-        features = ['totalCapacity', 'realTimeCapacity', 'wasteQuantityPerDay', 'capacity_ratio']
-        X = self.bins_df[features].fillna(0).values
+        X = self.features.view()
         
         # Target: capacity ratio (for time series prediction)
-        y = self.bins_df['capacity_ratio'].fillna(0).values
+        y = self.features.column('capacity_ratio')
         
         # Reshape for LSTM (samples, timesteps, features)
         # For demonstration, we'll use a simple approach
@@ -377,6 +506,7 @@ class SPMEnhancedModels:
         X_train, X_test, y_train, y_test = train_test_split(X_reshaped, y, test_size=0.2, random_state=42)
         
         # Build LSTM model
+        Sequential, Dense, LSTM, Dropout, Adam = _keras()
         model = Sequential([
             LSTM(50, return_sequences=True, input_shape=(X_train.shape[1], X_train.shape[2])),
             Dropout(0.2),
@@ -407,7 +537,7 @@ class SPMEnhancedModels:
         }
     
     # 7. CLUSTERING FOR PATTERN ANALYSIS
-    def perform_clustering_analysis(self):
+    def perform_clustering_analysis(self, force=False):
         """
         SPM Category: Data Analysis
         Clustering for identifying patterns in waste management
@@ -416,24 +546,29 @@ class SPMEnhancedModels:
             return {"error": "No data available"}
         
         # Features for clustering
-        features = ['totalCapacity', 'realTimeCapacity', 'wasteQuantityPerDay', 'capacity_ratio']
-        X = self.bins_df[features].fillna(0)
+        features = MODEL_FEATURES
+        X = self.features.frame(features)
         
         # Scale features
         scaler = StandardScaler()
+        kmeans = KMeans(n_clusters=3, random_state=42)
+        
+        # The cluster summary also reads status
+        key = training_key([X, self.bins_df['status']], {'KMeans': kmeans})
+        cached = self._cached_training('clustering', key, force)
+        if cached is not None:
+            return cached
+        
         X_scaled = scaler.fit_transform(X)
         
         # Perform K-means clustering
-        kmeans = KMeans(n_clusters=3, random_state=42)
         clusters = kmeans.fit_predict(X_scaled)
         
-        # Add cluster labels to dataframe
-        self.bins_df['cluster'] = clusters
-        
-        # Analyze clusters
+        # Analyze clusters; the labels stay out of bins_df, which the loader
+        # and the feature store share and never expect to change
         cluster_analysis = {}
         for i in range(3):
-            cluster_data = self.bins_df[self.bins_df['cluster'] == i]
+            cluster_data = self.bins_df[clusters == i]
             cluster_analysis[f'cluster_{i}'] = {
                 'count': len(cluster_data),
                 'avg_capacity_ratio': cluster_data['capacity_ratio'].mean(),
@@ -441,16 +576,85 @@ class SPMEnhancedModels:
                 'common_status': cluster_data['status'].mode().iloc[0] if not cluster_data.empty else 'unknown'
             }
         
-        self.models['clustering'] = kmeans
-        self.scalers['clustering'] = scaler
-        
-        return {
+        result = {
             'clusters': cluster_analysis,
             'silhouette_score': None  # Could be calculated if needed
         }
+        result['version'] = self._register('clustering', kmeans, X, metrics={
+            'inertia': kmeans.inertia_,
+            'counts': {k: v['count'] for k, v in cluster_analysis.items()},
+        }, scaler=scaler, cache_key=key, result=result, scaled_input=True)
+        result['cached'] = False
+        return result
+
+# Trainers run by train-all; each saves its model to the registry
+TRAINERS = {
+    'effort_estimation': 'train_effort_estimation_model',
+    'resource_allocation': 'train_resource_allocation_model',
+    'risk_assessment': 'train_risk_assessment_model',
+    'quality_prediction': 'train_quality_prediction_model',
+    'anomaly_detection': 'train_anomaly_detection_model',
+    'clustering': 'perform_clustering_analysis',
+}
+
+def _train_in_worker(method, bins_df, registry_root, force=False):
+    """Run one trainer in a pool worker on the bins handed over by the server"""
+    trainer = SPMEnhancedModels(registry=ModelRegistry(registry_root), load=False)
+    trainer.bins_df = bins_df
+    return getattr(trainer, method)(force=force)
+
+def _force_arg():
+    """?force=true retrains even when a model for the same data is stored"""
+    return request.args.get('force', 'false').lower() == 'true'
+
+
+# Initialize the enhanced models; data is loaded by warm_up(), not at import
+spm_models = SPMEnhancedModels(load=False)
+training_jobs = TrainingJobs()
+inference = SPMInference(spm_models)
+attachment_store = AttachmentStore(reports_collection)
 
-# Initialize the enhanced models
-spm_models = SPMEnhancedModels()
+_warm = threading.Event()
+_warm_lock = threading.Lock()
+
+def warm_up():
+    """
+    Load the bins, reports and users from MongoDB once, and the current
+    version of every stored model
+
+    Run before serving when started directly; under a WSGI server that only
+    imports the app, the first request runs it instead. If MongoDB cannot be
+    read, the next call (the next request) tries again. Returns bins_df,
+    which the prefork master (serve.py) compares to decide on a worker swap.
+    """
+    if _warm.is_set():
+        return spm_models.bins_df
+    with _warm_lock:
+        if not _warm.is_set() and spm_models.load_data():
+            for name in spm_models.registry.names():
+                spm_models.registry.load(name)
+            _warm.set()
+    return spm_models.bins_df
+
+def reload_data(full=False):
+    """Prefork master: pick up bins changed since the last load, or reload everything"""
+    spm_models.load_data(incremental=not full)
+
+@app.before_request
+def _ensure_warm():
+    warm_up()
+
+def _predictions_response(name, key, only=None):
+    """
+    Cached predictions of one model for ?ids= (repeatable or comma-separated)
+    and ?ward=/?zone= filters; without them the whole fleet
+    """
+    ids = [i for value in request.args.getlist('ids') for i in value.split(',') if i]
+    filters = {f: request.args.getlist(f) for f in FILTER_FIELDS if request.args.getlist(f)}
+    records = inference.records(name, ids=ids, filters=filters, only=only)
+    if records is None:
+        return jsonify({"error": "Model not trained yet"})
+    return jsonify({key: records})
 
 # API Endpoints
 @app.route('/spm/effort-estimation', methods=['GET', 'POST'])
@@ -458,103 +662,47 @@ def effort_estimation():
     """SPM Category 1: Project Planning & Estimation"""
     if request.method == 'POST':
         # Train the model
-        result = spm_models.train_effort_estimation_model()
+        result = spm_models.train_effort_estimation_model(force=_force_arg())
         return jsonify(result)
     else:
         # Get predictions
-        if 'effort_estimation' in spm_models.models:
-            # Make predictions for all bins
-            features = ['totalCapacity', 'realTimeCapacity', 'wasteQuantityPerDay', 'capacity_ratio']
-            X = spm_models.bins_df[features].fillna(0)
-            predictions = spm_models.models['effort_estimation'].predict(X)
-            
-            result = spm_models.bins_df[['_id', 'ward', 'zone']].copy()
-            result['estimated_effort_hours'] = predictions
-            result['_id'] = result['_id'].astype(str)
-            
-            return jsonify({"predictions": result.to_dict('records')})
-        else:
-            return jsonify({"error": "Model not trained yet"})
+        return _predictions_response('effort_estimation', 'predictions')
 
 @app.route('/spm/resource-allocation', methods=['GET', 'POST'])
 def resource_allocation():
     """SPM Category 2: Scheduling & Resource Allocation"""
     if request.method == 'POST':
-        result = spm_models.train_resource_allocation_model()
+        result = spm_models.train_resource_allocation_model(force=_force_arg())
         return jsonify(result)
     else:
-        if 'resource_allocation' in spm_models.models:
-            features = ['totalCapacity', 'realTimeCapacity', 'wasteQuantityPerDay', 'capacity_ratio']
-            X = spm_models.bins_df[features].fillna(0)
-            priorities = spm_models.models['resource_allocation'].predict(X)
-            
-            result = spm_models.bins_df[['_id', 'ward', 'zone']].copy()
-            result['priority_level'] = priorities
-            result['_id'] = result['_id'].astype(str)
-            
-            return jsonify({"allocations": result.to_dict('records')})
-        else:
-            return jsonify({"error": "Model not trained yet"})
+        return _predictions_response('resource_allocation', 'allocations')
 
 @app.route('/spm/risk-assessment', methods=['GET', 'POST'])
 def risk_assessment():
     """SPM Category 3: Risk Management"""
     if request.method == 'POST':
-        result = spm_models.train_risk_assessment_model()
+        result = spm_models.train_risk_assessment_model(force=_force_arg())
         return jsonify(result)
     else:
-        if 'risk_assessment' in spm_models.models:
-            features = ['totalCapacity', 'realTimeCapacity', 'wasteQuantityPerDay', 'capacity_ratio']
-            X = spm_models.bins_df[features].fillna(0)
-            risks = spm_models.models['risk_assessment'].predict(X)
-            
-            result = spm_models.bins_df[['_id', 'ward', 'zone']].copy()
-            result['risk_level'] = risks
-            result['_id'] = result['_id'].astype(str)
-            
-            return jsonify({"risks": result.to_dict('records')})
-        else:
-            return jsonify({"error": "Model not trained yet"})
+        return _predictions_response('risk_assessment', 'risks')
 
 @app.route('/spm/quality-prediction', methods=['GET', 'POST'])
 def quality_prediction():
     """SPM Category 4: Quality Management"""
     if request.method == 'POST':
-        result = spm_models.train_quality_prediction_model()
+        result = spm_models.train_quality_prediction_model(force=_force_arg())
         return jsonify(result)
     else:
-        if 'quality_prediction' in spm_models.models:
-            features = ['totalCapacity', 'realTimeCapacity', 'wasteQuantityPerDay', 'capacity_ratio']
-            X = spm_models.bins_df[features].fillna(0)
-            qualities = spm_models.models['quality_prediction'].predict(X)
-            
-            result = spm_models.bins_df[['_id', 'ward', 'zone']].copy()
-            result['quality_level'] = qualities
-            result['_id'] = result['_id'].astype(str)
-            
-            return jsonify({"qualities": result.to_dict('records')})
-        else:
-            return jsonify({"error": "Model not trained yet"})
+        return _predictions_response('quality_prediction', 'qualities')
 
 @app.route('/spm/anomaly-detection', methods=['GET', 'POST'])
 def anomaly_detection():
     """SPM Category 6: Monitoring & Control"""
     if request.method == 'POST':
-        result = spm_models.train_anomaly_detection_model()
+        result = spm_models.train_anomaly_detection_model(force=_force_arg())
         return jsonify(result)
     else:
-        if 'anomaly_detection' in spm_models.models:
-            features = ['totalCapacity', 'realTimeCapacity', 'wasteQuantityPerDay', 'capacity_ratio']
-            X = spm_models.bins_df[features].fillna(0)
-            anomalies = spm_models.models['anomaly_detection'].predict(X)
-            
-            result = spm_models.bins_df[['_id', 'ward', 'zone']].copy()
-            result['is_anomaly'] = (anomalies == -1).astype(int)
-            result['_id'] = result['_id'].astype(str)
-            
-            return jsonify({"anomalies": result[result['is_anomaly'] == 1].to_dict('records')})
-        else:
-            return jsonify({"error": "Model not trained yet"})
+        return _predictions_response('anomaly_detection', 'anomalies', only=lambda is_anomaly: is_anomaly == 1)
 
 @app.route('/spm/deep-learning', methods=['GET', 'POST'])
 def deep_learning():
@@ -569,13 +717,11 @@ def deep_learning():
 def clustering():
     """SPM Category: Data Analysis - Clustering"""
     if request.method == 'POST':
-        result = spm_models.perform_clustering_analysis()
+        result = spm_models.perform_clustering_analysis(force=_force_arg())
         return jsonify(result)
     else:
         if 'clustering' in spm_models.models:
-            result = spm_models.bins_df[['_id', 'ward', 'zone', 'cluster']].copy()
-            result['_id'] = result['_id'].astype(str)
-            return jsonify({"clusters": result.to_dict('records')})
+            return _predictions_response('clustering', 'clusters')
         else:
             return jsonify({"error": "Clustering not performed yet"})
 
@@ -585,6 +731,8 @@ def models_status():
     return jsonify({
         "trained_models": list(spm_models.models.keys()),
         "available_scalers": list(spm_models.scalers.keys()),
+        "registry": spm_models.registry.status(),
+        "inference": inference.status(),
         "data_status": {
             "bins_count": len(spm_models.bins_df),
             "reports_count": len(spm_models.reports_df),
@@ -594,34 +742,147 @@ def models_status():
         "nlp_available": NLP_AVAILABLE
     })
 
+@app.route('/spm/models/<name>/versions', methods=['GET'])
+def model_versions(name):
+    """Registry versions of one model with their training metadata"""
+    registry = spm_models.registry
+    versions = registry.versions(name)
+    if not versions:
+        return jsonify({"error": f"No versions of {name}"}), 404
+    return jsonify({
+        "current": registry.current(name),
+        "versions": {v: registry.metadata(name, v) for v in versions}
+    })
+
+@app.route('/spm/models/<name>/promote', methods=['POST'])
+def promote_model(name):
+    """Serve another stored version of a model (?version=N)"""
+    try:
+        version = int(request.args.get('version', ''))
+        return jsonify({"model": name, "current": spm_models.registry.promote(name, version)})
+    except ValueError:
+        return jsonify({"error": "version must be an integer"}), 400
+    except KeyError as e:
+        return jsonify({"error": str(e.args[0])}), 404
+
+@app.route('/spm/models/<name>/rollback', methods=['POST'])
+def rollback_model(name):
+    """Go back to the previous version of a model"""
+    try:
+        return jsonify({"model": name, "current": spm_models.registry.rollback(name)})
+    except KeyError as e:
+        return jsonify({"error": str(e.args[0])}), 404
+
+@app.route('/spm/data/quality', methods=['GET'])
+def data_quality():
+    """Rows coerced, clamped and dropped by the last bins preprocessing"""
+    return jsonify(spm_models.data_quality)
+
+@app.route('/spm/data/refresh', methods=['POST'])
+def refresh_data():
+    """Reload bins from MongoDB; incremental unless ?full=true"""
+    incremental = request.args.get('full', 'false').lower() != 'true'
+    if request_reload(full=not incremental):
+        # Prefork worker: the master reloads and forks workers with the new data
+        return jsonify({"status": "reloading"}), 202
+    spm_models.load_data(incremental=incremental)
+    return jsonify({
+        "bins_count": len(spm_models.bins_df),
+        "refresh": spm_models._bins_loader.last_refresh
+    })
+
 @app.route('/spm/models/train-all', methods=['POST'])
 def train_all_models():
-    """Train all SPM models at once"""
-    results = {}
+    """
+    Train all SPM models in a background job and return its id (202)
+
+    The trainers run in parallel worker processes; poll /spm/jobs/<id>.
+    ?wait=true blocks until the job is done and returns all results.
+    """
+    if spm_models.bins_df.empty:
+        return jsonify({"status": "error", "message": "No data available", "results": {}})
     
-    try:
-        results['effort_estimation'] = spm_models.train_effort_estimation_model()
-        results['resource_allocation'] = spm_models.train_resource_allocation_model()
-        results['risk_assessment'] = spm_models.train_risk_assessment_model()
-        results['quality_prediction'] = spm_models.train_quality_prediction_model()
-        results['anomaly_detection'] = spm_models.train_anomaly_detection_model()
-        results['clustering'] = spm_models.perform_clustering_analysis()
-        
-        if DEEP_LEARNING_AVAILABLE:
-            results['deep_learning'] = spm_models.train_deep_learning_model()
-        
-        return jsonify({
-            "status": "success",
-            "message": "All models trained successfully",
-            "results": results
-        })
-        
-    except Exception as e:
+    bins_df = spm_models.bins_df
+    tasks = {
+        name: (_train_in_worker, (method, bins_df, spm_models.registry.root, _force_arg()))
+        for name, method in TRAINERS.items()
+    }
+    # The Keras model is not persisted, so it has to train in this process
+    inline = {'deep_learning': spm_models.train_deep_learning_model} if DEEP_LEARNING_AVAILABLE else None
+    job_id = training_jobs.submit(tasks, inline)
+    
+    if request.args.get('wait', 'false').lower() == 'true':
+        job = training_jobs.wait(job_id)
+        ok = job['status'] == 'succeeded'
         return jsonify({
-            "status": "error",
-            "message": str(e),
-            "results": results
+            "status": "success" if ok else "error",
+            "message": "All models trained successfully" if ok else f"Training {job['status']}",
+            "jobId": job_id,
+            "results": {
+                name: entry.get('result', {"error": entry.get('error')})
+                for name, entry in job['models'].items()
+            }
         })
+    
+    return jsonify({
+        "status": "queued",
+        "jobId": job_id,
+        "statusUrl": f"/spm/jobs/{job_id}"
+    }), 202
+
+@app.route('/spm/jobs', methods=['GET'])
+def list_jobs():
+    """Recent training jobs"""
+    return jsonify({"jobs": training_jobs.summaries()})
+
+@app.route('/spm/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Per-model progress, duration and peak memory of a training job"""
+    job = training_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+def _attachment_response(data, content_type):
+    # Uploaded bytes: never let the browser sniff them into something else
+    headers = {
+        "Cache-Control": "private, max-age=3600",
+        "Content-Disposition": "inline",
+        "X-Content-Type-Options": "nosniff",
+    }
+    return Response(data, mimetype=content_type, headers=headers)
+
+@app.route('/spm/reports/<report_id>/attachment', methods=['GET'])
+def report_attachment(report_id):
+    """A report's uploaded image, read on demand and kept in a bounded LRU cache"""
+    try:
+        attachment = attachment_store.get(report_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if attachment is None:
+        return jsonify({"error": "No attachment"}), 404
+    return _attachment_response(*attachment)
+
+@app.route('/spm/reports/<report_id>/attachment/thumbnail', methods=['GET'])
+def report_attachment_thumbnail(report_id):
+    """JPEG thumbnail of a report's image (?size= max edge in px); the original if thumbnails are unavailable"""
+    try:
+        size = int(request.args.get('size', DEFAULT_THUMBNAIL_SIZE))
+    except ValueError:
+        return jsonify({"error": "size must be an integer"}), 400
+    if not 16 <= size <= MAX_THUMBNAIL_SIZE:
+        return jsonify({"error": f"size must be between 16 and {MAX_THUMBNAIL_SIZE}"}), 400
+    try:
+        attachment = attachment_store.thumbnail(report_id, size) or attachment_store.get(report_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if attachment is None:
+        return jsonify({"error": "No attachment"}), 404
+    return _attachment_response(*attachment)
+
+@app.route('/spm/reports/attachments/stats', methods=['GET'])
+def attachment_stats():
+    return jsonify(attachment_store.stats())
 
 if __name__ == '__main__':
     print("🚀 Starting SPM Enhanced ML Server...")
@@ -633,8 +894,15 @@ if __name__ == '__main__':
     print("   6. Monitoring & Control")
     print("   + Advanced ML (Deep Learning, Clustering)")
     print("\n🔗 API Endpoints:")
-    print("   POST /spm/models/train-all - Train all models")
+    print("   POST /spm/models/train-all - Train all models in the background (?wait=true blocks, ?force=true skips the training cache)")
+    print("   GET  /spm/jobs/<id> - Training job progress")
+    print("   POST /spm/data/refresh - Reload bins (incremental unless ?full=true)")
+    print("   GET  /spm/data/quality - Data-quality report of the last bins preprocessing")
+    print("   GET  /spm/reports/<id>/attachment[/thumbnail] - Report image (loaded on demand)")
     print("   GET  /spm/models/status - Check model status")
+    print("   GET  /spm/models/<name>/versions - Stored model versions")
+    print("   POST /spm/models/<name>/promote?version=N - Serve a stored version")
+    print("   POST /spm/models/<name>/rollback - Serve the previous version")
     print("   POST /spm/effort-estimation - Train effort estimation model")
     print("   GET  /spm/effort-estimation - Get effort predictions")
     print("   POST /spm/resource-allocation - Train resource allocation model")
@@ -649,4 +917,5 @@ if __name__ == '__main__':
     print("   POST /spm/clustering - Perform clustering analysis")
     print("   GET  /spm/clustering - Get clustering results")
     
+    warm_up()
     app.run(debug=True, port=5001)
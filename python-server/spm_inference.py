@@ -0,0 +1,148 @@
+"""
+Batched, cached inference for the /spm/* GET endpoints.
+
+Predictions of every trained model are computed for the whole fleet in one
+pass over the snapshot's shared feature matrix (see feature_store), and kept until either the bins
+data or that model's registry version changes. Requests then only select the
+rows they ask for (ids, ward, zone) and serialize those.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Model name -> (output column, postprocess of the raw predictions or None)
+PREDICTORS = {
+    'effort_estimation': ('estimated_effort_hours', None),
+    'resource_allocation': ('priority_level', None),
+    'risk_assessment': ('risk_level', None),
+    'quality_prediction': ('quality_level', None),
+    'anomaly_detection': ('is_anomaly', lambda p: (p == -1).astype(int)),
+    'clustering': ('cluster', None),
+}
+
+# Models trained on StandardScaler output regardless of metadata
+ALWAYS_SCALED = {'clustering'}
+
+FILTER_FIELDS = ('ward', 'zone')
+
+
+class SPMInference:
+    """
+    Prediction cache over an SPMEnhancedModels instance.
+
+    Entries are keyed by (data_version, model version); a model is
+    re-predicted only when one of the two moves.
+    """
+
+    def __init__(self, spm, predictors=PREDICTORS):
+        self.spm = spm
+        self.predictors = predictors
+        self._lock = threading.Lock()
+        self._data_version = None
+        self._frame = None
+        self._positions = None
+        self._predictions = {}  # name -> (model version, array)
+        self.stats = {"passes": 0, "predicted": 0, "hits": 0}
+
+    def _model_version(self, name):
+        return self.spm.models.version(name)
+
+    def _needs_scaling(self, name):
+        if name in ALWAYS_SCALED:
+            return True
+        meta = self.spm.registry.metadata(name) if self.spm.registry.current(name) is not None else None
+        return bool(meta and meta.get('scaledInput'))
+
+    def _refresh(self):
+        """Predict every model whose cached entry is stale."""
+        # Version first: if bins_df is swapped in between, the next call sees a new version
+        data_version = self.spm.data_version
+        if data_version != self._data_version:
+            self._predictions = {}
+            self._positions = None
+            self._frame = self.spm.bins_df
+            self._data_version = data_version
+
+        stale = []
+        for name in self.predictors:
+            if name not in self.spm.models:
+                continue
+            version = self._model_version(name)
+            cached = self._predictions.get(name)
+            if cached is None or cached[0] != version:
+                stale.append((name, version))
+        if not stale or self._frame.empty:
+            self.stats["hits"] += 1
+            return
+
+        features = self.spm.feature_store.get(self._frame, self._data_version)
+        for name, version in stale:
+            _, post = self.predictors[name]
+            model = self.spm.models[name]
+            inputs = features.scaled(self.spm.scalers[name]) if self._needs_scaling(name) else features.frame()
+            centers = getattr(model, 'cluster_centers_', None)
+            if centers is not None and inputs.dtype != centers.dtype:
+                # KMeans only predicts in the dtype it was fitted with (float64 before the feature store)
+                inputs = inputs.astype(centers.dtype)
+            predictions = np.asarray(model.predict(inputs))
+            if predictions.ndim > 1:
+                predictions = predictions.ravel()
+            self._predictions[name] = (version, post(predictions) if post else predictions)
+        self.stats["passes"] += 1
+        self.stats["predicted"] += len(stale)
+
+    def predictions(self, name):
+        """(bins frame, _id index, predictions aligned with the frame); predictions is None if untrained."""
+        with self._lock:
+            self._refresh()
+            entry = self._predictions.get(name)
+            if self._positions is None and self._frame is not None:
+                self._positions = pd.Index(self._frame['_id'].astype(str).to_numpy())
+            return self._frame, self._positions, None if entry is None else entry[1]
+
+    def status(self):
+        with self._lock:
+            return dict(self.stats, dataVersion=self._data_version,
+                        cached={name: entry[0] for name, entry in self._predictions.items()})
+
+    @staticmethod
+    def select(bins_df, id_index, ids=None, filters=None):
+        """Row positions for the requested ids and {field: [values]} filters; None = all rows."""
+        mask = None
+        if ids:
+            positions = id_index.get_indexer(ids)
+            mask = np.zeros(len(bins_df), dtype=bool)
+            mask[positions[positions >= 0]] = True
+        for field, values in (filters or {}).items():
+            if not values:
+                continue
+            if field not in bins_df.columns:
+                return np.empty(0, dtype=int)
+            field_mask = bins_df[field].isin(values).to_numpy()
+            mask = field_mask if mask is None else (mask & field_mask)
+        return None if mask is None else np.flatnonzero(mask)
+
+    def records(self, name, ids=None, filters=None, only=None):
+        """
+        JSON-ready rows (_id, ward, zone, prediction) for the selected bins.
+
+        only: optional predicate on the prediction array to keep rows
+        (e.g. anomalies only). Returns None when the model is not trained.
+        """
+        bins_df, id_index, predictions = self.predictions(name)
+        if predictions is None:
+            return [] if bins_df is not None and bins_df.empty and name in self.spm.models else None
+        column, _ = self.predictors[name]
+        positions = self.select(bins_df, id_index, ids, filters)
+        if only is not None:
+            keep = only(predictions)
+            positions = np.flatnonzero(keep) if positions is None else positions[keep[positions]]
+        if positions is None:
+            positions = np.arange(len(predictions))
+
+        result = bins_df.iloc[positions][['_id', 'ward', 'zone']].reset_index(drop=True)
+        result[column] = predictions[positions]
+        result['_id'] = result['_id'].astype(str)
+        return result.to_dict('records')
@@ -0,0 +1,82 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# The server modules live flat in python-server/, next to this directory, and the
+# benchmark fixtures (fleet, local_mongo) in python-server/benchmarks/
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.append(os.path.join(ROOT, 'benchmarks'))
+
+bench_results = pytest.StashKey()
+bench_scratch = pytest.StashKey()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('bench', "endpoint benchmarks (tests marked bench)")
+    group.addoption('--bench', action='store_true', help="run the benchmarks; they are skipped otherwise")
+    group.addoption('--bench-bins', type=int, default=10_000, help="synthetic fleet size (default 10000)")
+    group.addoption('--bench-rounds', type=int, default=20, help="timed calls per case (default 20)")
+    group.addoption('--bench-json', metavar='FILE', help="write the results to FILE, to diff against an earlier run")
+    group.addoption('--bench-mongo-uri', metavar='URI',
+                    help="seed a real scratch MongoDB instead of the in-memory stand-in")
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', "bench: end-to-end benchmark, only run with --bench")
+    config.stash[bench_results] = []
+    if not config.getoption('bench'):
+        return
+    # The servers read their storage directories when they are imported, so they
+    # must point at scratch space before any test module is collected
+    scratch = tempfile.mkdtemp(prefix='bench-endpoints-')
+    config.stash[bench_scratch] = scratch
+    for var in ('FILL_HISTORY_DIR', 'DISTANCE_MATRIX_DIR', 'SPM_MODEL_DIR'):
+        os.environ[var] = os.path.join(scratch, var.lower())
+    if not config.getoption('bench_mongo_uri'):
+        # mongomock answers the snapshot watcher's polls with full scans; rely on the TTL
+        os.environ.setdefault('BIN_CACHE_WATCH', '0')
+
+
+def pytest_unconfigure(config):
+    scratch = config.stash.get(bench_scratch, None)
+    if scratch:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('bench'):
+        return
+    skip = pytest.mark.skip(reason="benchmark; run with --bench")
+    for item in items:
+        if 'bench' in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope='session')
+def bench_report(pytestconfig):
+    """List the benchmark cases append their results to; printed at the end of the run."""
+    return pytestconfig.stash[bench_results]
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    results = config.stash.get(bench_results, None)
+    if not results:
+        return
+    write = terminalreporter.write_line
+    terminalreporter.section(f"endpoint benchmarks, {config.getoption('bench_bins'):,} bins")
+    write(f"{'case':<64} {'status':>6} {'cold ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'peak MB':>8} "
+          f"{'worker MB':>9}")
+    for case in results:
+        worker = case.get('workerPeakRssMb')
+        write(f"{case['case'][:64]:<64} {case['status']:>6} {case['coldMs']:>9.1f} {case['p50Ms']:>9.1f} "
+              f"{case['p95Ms']:>9.1f} {case['maxMs']:>9.1f} {case['peakRssMb']:>8.0f} "
+              f"{'-' if worker is None else format(worker, '.0f'):>9}")
+    path = config.getoption('bench_json')
+    if path:
+        with open(path, 'w') as f:
+            json.dump({"bins": config.getoption('bench_bins'), "cases": results}, f, indent=2)
@@ -0,0 +1,141 @@
+"""
+End-to-end benchmarks of the ML (server.py) and SPM (spm_enhanced_models.py)
+endpoints on a synthetic fleet. They are skipped unless pytest runs with --bench:
+
+    pytest tests/test_bench_endpoints.py --bench [--bench-bins N] [--bench-rounds N] [--bench-json FILE]
+
+The module seeds a MongoDB stand-in (local_mongo; --bench-mongo-uri uses a
+real scratch server instead) with a fleet.fleet_documents() fleet plus users
+and reports. It then imports both apps and drives them through the Flask test
+client. Every case is called once cold, then timed over --bench-rounds calls.
+The summary at the end of the run shows p50 / p95 / max latency and the peak
+RSS reached during the calls (training_jobs.measured). train-all trains in
+worker processes, so its row also shows the largest peak RSS of one training
+worker, from the jobs' per-model peakRssMb. Run one fleet size per session;
+the apps load the fleet once, when they are imported.
+"""
+
+import numpy as np
+import pymongo
+import pytest
+
+pytestmark = pytest.mark.bench
+
+ML_CASES = [
+    ('GET', '/schedule'),
+    ('GET', '/schedule?limit=100'),
+    ('GET', '/ml/forecast'),
+    ('GET', '/ml/anomalies'),
+    ('GET', '/ml/priority'),
+]
+TRAIN_ALL = ('POST', '/spm/models/train-all?wait=true&force=true')
+# Retraining everything is slow; it gets fewer rounds than the reads
+TRAIN_ROUNDS = 3
+
+
+def run_case(client, method, path, rounds):
+    from training_jobs import measured
+
+    def call():
+        response = client.open(path, method=method)
+        response.get_data()  # drain streamed bodies
+        return response
+
+    response, cold, cold_peak = measured(call)
+    times, peaks = [], [cold_peak]
+    for _ in range(rounds):
+        response, seconds, peak = measured(call)
+        times.append(seconds)
+        peaks.append(peak)
+    times = np.array(times) * 1e3 if times else np.array([cold * 1e3])
+    return {
+        "case": f"{method} {path}",
+        "status": response.status_code,
+        "rounds": rounds,
+        "coldMs": cold * 1e3,
+        "p50Ms": float(np.percentile(times, 50)),
+        "p95Ms": float(np.percentile(times, 95)),
+        "maxMs": float(times.max()),
+        "peakRssMb": max(peaks),
+    }, response
+
+
+def worker_peak_rss(client):
+    """Largest per-model peak RSS (MB) over the training jobs run so far, or None."""
+    peaks = []
+    for job in client.get('/spm/jobs').get_json()['jobs']:
+        status = client.get(f"/spm/jobs/{job['id']}").get_json()
+        peaks += [m['peakRssMb'] for m in status['models'].values() if m.get('peakRssMb') is not None]
+    return max(peaks) if peaks else None
+
+
+def spm_get_paths(app, values):
+    """Every GET route under /spm, with its URL variables filled from values."""
+    adapter = app.url_map.bind('localhost')
+    paths = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if 'GET' in rule.methods and rule.rule.startswith('/spm'):
+            paths.append(adapter.build(rule.endpoint, {name: values[name] for name in rule.arguments}))
+    return paths
+
+
+@pytest.fixture(scope='module')
+def apps(pytestconfig):
+    """Seeded stand-in plus both apps; a dict the cases share state through."""
+    mongo_uri = pytestconfig.getoption('bench_mongo_uri')
+    if not mongo_uri:
+        pytest.importorskip('mongomock')
+    local_mongo = pytest.importorskip('local_mongo')
+    fleet = pytest.importorskip('fleet')
+
+    n = pytestconfig.getoption('bench_bins')
+    original = pymongo.MongoClient
+    client = local_mongo.install(mongo_uri)
+    try:
+        bins = fleet.fleet_documents(n)
+        users = fleet.user_documents(max(10, n // 100))
+        reports = fleet.report_documents(bins, users, max(10, n // 1000))
+        local_mongo.seed(client, bins, users, reports)
+        del bins
+
+        import server
+        import spm_enhanced_models
+        yield {
+            'ml': server.app.test_client(),
+            'spm_app': spm_enhanced_models.app,
+            'spm': spm_enhanced_models.app.test_client(),
+            'values': {'name': 'risk_assessment', 'job_id': 'unknown', 'report_id': str(reports[0]['_id'])},
+        }
+    finally:
+        pymongo.MongoClient = original
+
+
+@pytest.fixture
+def rounds(pytestconfig):
+    return pytestconfig.getoption('bench_rounds')
+
+
+@pytest.mark.parametrize('method,path', ML_CASES)
+def test_ml_endpoint(apps, rounds, bench_report, method, path):
+    result, _ = run_case(apps['ml'], method, path, rounds)
+    bench_report.append(result)
+    assert result['status'] == 200
+
+
+def test_train_all(apps, rounds, bench_report):
+    # Runs before the /spm GETs, so the prediction routes have models
+    result, response = run_case(apps['spm'], *TRAIN_ALL, min(rounds, TRAIN_ROUNDS))
+    result["workerPeakRssMb"] = worker_peak_rss(apps['spm'])
+    bench_report.append(result)
+    apps['values']['job_id'] = (response.get_json() or {}).get('jobId', 'unknown')
+    assert result['status'] == 200
+
+
+def test_spm_get_routes(apps, rounds, bench_report):
+    failed = []
+    for path in spm_get_paths(apps['spm_app'], apps['values']):
+        result, _ = run_case(apps['spm'], 'GET', path, rounds)
+        bench_report.append(result)
+        if result['status'] != 200:
+            failed.append((path, result['status']))
+    assert not failed
@@ -0,0 +1,141 @@
+"""WardAnomalyEngine's running statistics must give the same z as full_recompute_z."""
+
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bin_anomaly import WardAnomalyEngine, full_recompute_z
+
+WARDS = ['Aundh', 'Baner', 'Kothrud', 'Viman Nagar', None]
+
+
+def bins(rows):
+    """Snapshot frame from (id, ward, realTimeCapacity) rows."""
+    return pd.DataFrame(rows, columns=['_id', 'ward', 'realTimeCapacity'])
+
+
+def assert_agrees(engine, frame, version):
+    z = engine.sync(frame, version)
+    np.testing.assert_allclose(z, full_recompute_z(frame), rtol=1e-9, atol=1e-9, equal_nan=True)
+    return z
+
+
+def test_first_sync_matches_full_recompute():
+    frame = bins([(1, 'Aundh', 10.0), (2, 'Aundh', 30.0), (3, 'Baner', 50.0), (4, 'Baner', 50.0), (5, 'Kothrud', 7.0)])
+    z = assert_agrees(WardAnomalyEngine(), frame, 1)
+    # A ward whose bins all read the same has std 0, replaced by 1; a single bin gives NaN
+    assert z[2] == z[3] == 0.0
+    assert math.isnan(z[4])
+
+
+def test_inserts_updates_deletes_and_ward_moves():
+    engine = WardAnomalyEngine()
+    frame = bins([(i, WARDS[i % 4], float(10 * i % 97)) for i in range(40)])
+    assert_agrees(engine, frame, 1)
+
+    # Insert
+    frame = pd.concat([frame, bins([(100, 'Aundh', 88.0), (101, 'Kothrud', 3.0)])], ignore_index=True)
+    assert_agrees(engine, frame, 2)
+    assert engine.last_sync == {"mode": "incremental", "updated": 2}
+
+    # Update readings
+    frame = frame.copy()
+    frame.loc[frame['_id'].isin([3, 7, 100]), 'realTimeCapacity'] = [99.0, 0.0, 42.5]
+    assert_agrees(engine, frame, 3)
+    assert engine.last_sync["updated"] == 3
+
+    # Delete
+    frame = frame[~frame['_id'].isin([0, 5, 101])].reset_index(drop=True)
+    assert_agrees(engine, frame, 4)
+    assert engine.last_sync["updated"] == 3
+
+    # Move bins to another ward, and one to a new ward
+    frame = frame.copy()
+    frame.loc[frame['_id'] == 1, 'ward'] = 'Kothrud'
+    frame.loc[frame['_id'] == 2, 'ward'] = 'Hadapsar'
+    assert_agrees(engine, frame, 5)
+
+    # Reordered rows are matched by _id, not by position
+    assert_agrees(engine, frame.iloc[::-1].reset_index(drop=True), 6)
+
+
+def test_random_changes_stay_in_line():
+    rng = np.random.default_rng(7)
+    engine = WardAnomalyEngine()
+    frame = bins([(i, WARDS[rng.integers(len(WARDS))], float(rng.uniform(0, 100))) for i in range(200)])
+    next_id = 200
+    for version in range(1, 30):
+        assert_agrees(engine, frame, version)
+        frame = frame.copy()
+        touched = rng.choice(len(frame), 10, replace=False)
+        frame.loc[touched[:5], 'realTimeCapacity'] = rng.uniform(0, 100, 5)
+        frame.loc[touched[5:8], 'ward'] = [WARDS[w] for w in rng.integers(len(WARDS), size=3)]
+        frame = frame.drop(index=touched[8:]).reset_index(drop=True)
+        added = bins([(next_id + j, WARDS[rng.integers(len(WARDS))], float(rng.uniform(0, 100))) for j in range(3)])
+        frame = pd.concat([frame, added], ignore_index=True)
+        next_id += 3
+
+
+def test_periodic_rebuild_agrees():
+    engine = WardAnomalyEngine(rebuild_every=2)
+    frame = bins([(i, WARDS[i % 3], float(i)) for i in range(12)])
+    assert_agrees(engine, frame, 1)
+    frame = frame.assign(realTimeCapacity=frame['realTimeCapacity'] * 2)
+    assert_agrees(engine, frame, 2)
+    assert engine.last_sync["mode"] == "incremental"
+    frame = frame.assign(realTimeCapacity=frame['realTimeCapacity'] + 1)
+    assert_agrees(engine, frame, 3)
+    assert engine.last_sync["mode"] == "rebuild"
+
+
+def test_missing_wards_form_one_group():
+    engine = WardAnomalyEngine()
+    frame = bins([(1, None, 10.0), (2, np.nan, 20.0), (3, None, 60.0), (4, 'Aundh', 5.0), (5, 'Aundh', 15.0)])
+    z = assert_agrees(engine, frame, 1)
+    # score() looks missing wards up the same way sync() files them
+    assert engine.score(None, 60.0) == pytest.approx(z[2])
+    assert engine.score(float('nan'), 60.0) == pytest.approx(z[2])
+    assert engine.score(pd.NA, 60.0) == pytest.approx(z[2])
+    assert math.isnan(engine.score('Baner', 60.0))
+
+
+def test_categorical_wards():
+    engine = WardAnomalyEngine()
+    frame = bins([(1, 'Aundh', 10.0), (2, 'Aundh', 20.0), (3, None, 1.0), (4, None, 3.0)])
+    frame['ward'] = frame['ward'].astype('category')
+    assert_agrees(engine, frame, 1)
+    frame = frame.copy()
+    frame.loc[2, 'realTimeCapacity'] = 9.0
+    assert_agrees(engine, frame, 2)
+
+
+def test_observe_then_sync_same_reading():
+    engine = WardAnomalyEngine()
+    frame = bins([(i, WARDS[i % 2], float(i * 3)) for i in range(10)])
+    assert_agrees(engine, frame, 1)
+    z = engine.observe(4, WARDS[0], 77.0)
+
+    frame = frame.copy()
+    frame.loc[frame['_id'] == 4, 'realTimeCapacity'] = 77.0
+    after = assert_agrees(engine, frame, 2)
+    assert engine.last_sync["updated"] == 0
+    assert after[4] == pytest.approx(z)
+
+
+def test_validate_reports_agreement():
+    engine = WardAnomalyEngine()
+    frame = bins([(i, WARDS[i % 4], float(i % 11)) for i in range(30)])
+    engine.sync(frame, 1)
+    frame = frame.iloc[3:].reset_index(drop=True)
+    report = engine.validate(frame, 2)
+    assert report["agree"] is True
+    assert report["bins"] == len(frame)
+
+
+def test_empty_snapshot():
+    engine = WardAnomalyEngine()
+    assert_agrees(engine, bins([(1, 'Aundh', 1.0), (2, 'Aundh', 2.0)]), 1)
+    assert len(engine.sync(bins([]), 2)) == 0
+    assert_agrees(engine, bins([(3, 'Baner', 4.0), (4, 'Baner', 8.0)]), 3)
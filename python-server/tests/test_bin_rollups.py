@@ -0,0 +1,84 @@
+"""The MongoDB pipeline and the snapshot path must give the same rollups.
+
+Needs a MongoDB server (4.4+) at MONGO_TEST_URI, default localhost; the
+tests are skipped when none answers.
+"""
+
+import math
+import os
+import uuid
+
+import pandas as pd
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from bin_columnar import profile_fields, read_bins
+from bin_preprocess import TONNES_SUFFIX
+from bin_rollups import ROLLUP_GROUPS, BinRollups, frame_rollups
+
+MONGO_URI = os.environ.get('MONGO_TEST_URI', 'mongodb://localhost:27017')
+
+DOCS = [
+    {'ward': 'Aundh', 'zone': 'North', 'category': 'Dry', 'status': 'filled', 'totalCapacity': 100,
+     'realTimeCapacity': 85, 'wasteQuantityPerDay': '27.21 tonnes', 'sensorEnabled': True},
+    {'ward': 'Aundh', 'zone': 'North', 'category': 'Wet', 'status': 'partial', 'totalCapacity': 200.0,
+     'realTimeCapacity': 60.5, 'wasteQuantityPerDay': 12.5, 'sensorEnabled': False},
+    {'ward': 'Baner', 'zone': 'North', 'category': 'Dry', 'status': 'empty', 'totalCapacity': '150',
+     'realTimeCapacity': 'junk', 'wasteQuantityPerDay': '3 tonnes'},
+    {'ward': 'Baner', 'zone': 'South', 'category': 'Wet', 'status': 'filled', 'totalCapacity': 0,
+     'realTimeCapacity': 10, 'wasteQuantityPerDay': 'unknown', 'sensorEnabled': True},
+    {'ward': 'Kothrud', 'zone': 'South', 'status': 'filled', 'totalCapacity': 80,
+     'realTimeCapacity': 80, 'wasteQuantityPerDay': None, 'sensorEnabled': True},
+    {'zone': 'South', 'category': 'Dry', 'status': 'partial', 'totalCapacity': 120,
+     'realTimeCapacity': 40, 'sensorEnabled': False},
+    {'ward': 'Kothrud', 'category': 'Dry', 'totalCapacity': 60, 'realTimeCapacity': 59},
+]
+
+FILTERS = [
+    None,
+    {'status': ['filled']},
+    {'ward': ['Aundh', 'Baner'], 'status': ['filled', 'partial']},
+    {'zone': ['South'], 'category': ['Dry']},
+    {'ward': ['Nowhere']},
+]
+
+
+@pytest.fixture(scope='module')
+def collection():
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command('ping')
+    except PyMongoError:
+        pytest.skip(f"no MongoDB at {MONGO_URI}")
+    db = client['rollup_test_' + uuid.uuid4().hex[:8]]
+    db.wastebins.insert_many([dict(doc) for doc in DOCS])
+    yield db.wastebins
+    client.drop_database(db)
+    client.close()
+
+
+def snapshot(collection):
+    """The bins as the ML server's snapshot holds them (server._normalize_bins' tonnes parsing)."""
+    frame, _ = read_bins(collection, fields=profile_fields('rollups'))
+    frame['wasteQuantityPerDay'] = pd.to_numeric(
+        frame['wasteQuantityPerDay'].astype(str).str.replace(TONNES_SUFFIX, '', regex=False), errors='coerce'
+    )
+    return frame
+
+
+def assert_same_rows(mongo, frame):
+    assert [row.keys() for row in mongo] == [row.keys() for row in frame]
+    for got, want in zip(mongo, frame):
+        for key, value in want.items():
+            if isinstance(value, float):
+                assert math.isclose(got[key], value, rel_tol=1e-9), (key, got, want)
+            else:
+                assert got[key] == value, (key, got, want)
+
+
+@pytest.mark.parametrize('by', ROLLUP_GROUPS)
+@pytest.mark.parametrize('filters', FILTERS)
+def test_pipeline_matches_snapshot(collection, by, filters):
+    rollups = BinRollups(collection, cache=None)
+    assert_same_rows(rollups.aggregate(by, filters), frame_rollups(snapshot(collection), by, filters))
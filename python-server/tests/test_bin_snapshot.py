@@ -0,0 +1,45 @@
+"""BinSnapshotCache versions: one per distinct frame the loader returns."""
+
+import pandas as pd
+
+from bin_snapshot import BinSnapshotCache
+
+
+class FrameLoader:
+    """Returns the same frame until replace() is called, like an incremental loader with no changes."""
+
+    def __init__(self):
+        self.frame = pd.DataFrame({'_id': [1, 2], 'realTimeCapacity': [10.0, 20.0]})
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.frame
+
+    def replace(self):
+        self.frame = self.frame.assign(realTimeCapacity=[11.0, 20.0])
+
+
+def test_refresh_without_changes_keeps_version():
+    loader = FrameLoader()
+    cache = BinSnapshotCache(loader)
+    version, frame = cache.snapshot()
+
+    cache.invalidate()
+    again, same = cache.snapshot()
+    assert again == version and same is frame
+    cache.refresh()
+    assert cache.version == version
+    assert loader.calls == 3
+
+
+def test_new_frame_bumps_version():
+    loader = FrameLoader()
+    cache = BinSnapshotCache(loader)
+    version, _ = cache.snapshot()
+
+    loader.replace()
+    cache.invalidate()
+    new_version, frame = cache.snapshot()
+    assert new_version == version + 1
+    assert frame is loader.frame
@@ -0,0 +1,62 @@
+"""IncrementalBinLoader refreshes against an in-memory collection (mongomock)."""
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from bin_sync import IncrementalBinLoader
+
+mongomock = pytest.importorskip('mongomock')
+
+NOW = datetime(2025, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def collection():
+    bins = mongomock.MongoClient().db.wastebins
+    bins.insert_many([
+        {'ward': 'Aundh', 'realTimeCapacity': 10.0 * i, 'sensorEnabled': True, 'updatedAt': NOW + timedelta(seconds=i)}
+        for i in range(5)
+    ])
+    return bins
+
+
+def loaded(collection):
+    loader = IncrementalBinLoader(collection, lambda df: df)
+    loader.load_full()
+    return loader
+
+
+def row(frame, bin_id):
+    return frame[frame['_id'] == bin_id].iloc[0]
+
+
+def test_refresh_without_changes_returns_the_same_frame(collection):
+    loader = loaded(collection)
+    frame = loader.frame
+    # Every bin is inside the clock-skew window and gets re-read, but none changed
+    assert loader.refresh() is frame
+    assert loader.last_refresh['fetched'] == 5
+    assert loader.last_refresh['changed'] == 0
+
+
+def test_update_from_a_slow_clock_is_fetched(collection):
+    loader = loaded(collection)
+    bin_id = collection.find_one({'realTimeCapacity': 0.0})['_id']
+    # Saved after the load by an app server whose clock is 30 s behind
+    collection.update_one({'_id': bin_id}, {'$set': {'realTimeCapacity': 55.0, 'updatedAt': NOW - timedelta(seconds=30)}})
+
+    frame = loader.refresh()
+    assert row(frame, bin_id)['realTimeCapacity'] == 55.0
+    assert loader.last_refresh['changed'] == 1
+
+
+def test_unset_field_is_cleared(collection):
+    loader = loaded(collection)
+    bin_id = collection.find_one({'realTimeCapacity': 40.0})['_id']
+    collection.update_many({}, {'$unset': {'sensorEnabled': ''}})
+
+    frame = loader.refresh()
+    assert pd.isna(row(frame, bin_id)['sensorEnabled'])
+    assert frame['sensorEnabled'].isna().all()
@@ -0,0 +1,70 @@
+"""Fill history fed by the incremental loader: one reading per fill-level change."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from bin_sync import IncrementalBinLoader
+from bin_writeback import BinWriteBack
+from fill_history import FillHistory
+
+mongomock = pytest.importorskip('mongomock')
+local_mongo = pytest.importorskip('local_mongo')
+
+NOW = datetime(2025, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def collection():
+    local_mongo.patch_mongomock()
+    bins = mongomock.MongoClient().db.wastebins
+    bins.insert_many([
+        {'ward': 'Aundh', 'realTimeCapacity': 10.0 * i, 'totalCapacity': 100.0, 'updatedAt': NOW}
+        for i in range(20)
+    ])
+    return bins
+
+
+@pytest.fixture
+def feed(collection, tmp_path):
+    history = FillHistory(str(tmp_path))
+    loader = IncrementalBinLoader(collection, lambda df: df, on_rows=history.record_frame)
+    loader.load_full()
+    return history, loader
+
+
+def readings(history):
+    return history.stats()['readings']
+
+
+def test_write_back_adds_no_readings(collection, feed):
+    history, loader = feed
+    before = readings(history)
+    frame = loader.frame
+    writes = BinWriteBack(collection).write(
+        frame['_id'].tolist(), {'predictedApproxTime': [5.0] * len(frame), 'status': ['partial'] * len(frame)}
+    )
+    assert writes['sent'] == len(frame)
+
+    loader.refresh()
+    assert readings(history) == before
+
+
+def test_restamped_bin_with_the_same_fill_adds_no_reading(collection, feed):
+    history, loader = feed
+    before = readings(history)
+    # Another field changed: the document is re-read with a new updatedAt, realTimeCapacity as it was
+    collection.update_many({}, {'$set': {'status': 'partial', 'updatedAt': NOW + timedelta(minutes=5)}})
+
+    loader.refresh()
+    assert readings(history) == before
+
+
+def test_fill_change_adds_one_reading(collection, feed):
+    history, loader = feed
+    before = readings(history)
+    collection.update_one({'realTimeCapacity': 30.0},
+                          {'$set': {'realTimeCapacity': 45.0, 'updatedAt': NOW + timedelta(minutes=5)}})
+
+    loader.refresh()
+    assert readings(history) == before + 1
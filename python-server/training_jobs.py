@@ -0,0 +1,200 @@
+"""
+Background model-training jobs.
+
+A job trains several independent models. Each trainer runs in a worker
+process of a shared pool, so train-all no longer blocks an HTTP worker and
+the models train side by side. Per model the job records its status, wall
+time and peak RSS of the worker while it trained.
+
+The pool starts its workers through a forkserver (spawn where there is
+none), never by forking the server itself: the server is multithreaded
+(request threads, pymongo monitors), and a forked child can inherit a lock
+another thread held at fork time and deadlock on it. Workers therefore
+import the trainer functions by name, so those must be module-level.
+"""
+
+import multiprocessing
+import os
+import resource
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+CPU_COUNT = os.cpu_count() or 1
+TRAIN_WORKERS = int(os.environ.get('SPM_TRAIN_WORKERS', min(4, CPU_COUNT)))
+# Threads per forest (n_jobs); defaults to splitting the cores between the workers
+FOREST_N_JOBS = int(os.environ.get('SPM_FOREST_N_JOBS', max(1, CPU_COUNT // max(TRAIN_WORKERS, 1))))
+# Finished jobs kept for /spm/jobs/<id>
+MAX_FINISHED_JOBS = 50
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def _reset_peak_rss():
+    # Linux: writing 5 to clear_refs resets VmHWM, so each trainer gets its own peak
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    # ru_maxrss: KiB on Linux, bytes on macOS; peak over the process lifetime
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if os.uname().sysname == 'Darwin' else peak / 1024.0
+
+
+def measured(fn, *args):
+    """Run fn(*args) and return (result, seconds, peak RSS in MB); used inside workers."""
+    _reset_peak_rss()
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started, _peak_rss_mb()
+
+
+def _now():
+    return datetime.utcnow().isoformat()
+
+
+class TrainingJobs:
+    """Submits train jobs to a lazily created process pool and tracks their progress."""
+
+    def __init__(self, workers=TRAIN_WORKERS):
+        self.workers = max(int(workers), 1)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(START_METHOD))
+            return self._pool
+
+    def _discard(self, pool):
+        # A worker died (e.g. OOM-killed): release the broken pool; the next job gets a fresh one
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, tasks, inline=None):
+        """
+        Start a job and return its id.
+
+        tasks: {name: (fn, args)} run in worker processes; fn must be a
+            module-level function and args picklable.
+        inline: {name: callable} run in the job's own thread after the pool
+            tasks, for trainers whose models cannot leave this process.
+        """
+        job_id = uuid.uuid4().hex
+        names = list(tasks) + list(inline or {})
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "submittedAt": _now(),
+            "startedAt": None,
+            "finishedAt": None,
+            "durationSeconds": None,
+            "models": {name: {"status": "queued"} for name in names},
+        }
+        thread = threading.Thread(target=self._run, args=(job, tasks, inline or {}), daemon=True,
+                                  name=f"train-job-{job_id[:8]}")
+        job["_thread"] = thread
+        with self._lock:
+            self._jobs[job_id] = job
+            self._trim()
+        thread.start()
+        return job_id
+
+    def _run(self, job, tasks, inline):
+        job["status"] = "running"
+        job["startedAt"] = _now()
+        started = time.perf_counter()
+
+        pool = None
+        try:
+            pool = self._executor()
+            futures = {}
+            for name, (fn, args) in tasks.items():
+                futures[pool.submit(measured, fn, *args)] = name
+                job["models"][name]["status"] = "running"
+            broken = False
+            for future in as_completed(futures):
+                self._record(job["models"][futures[future]], future.result)
+                broken = broken or isinstance(future.exception(), BrokenProcessPool)
+            if broken:
+                self._discard(pool)
+        except Exception as e:
+            # submit() raises BrokenProcessPool too
+            if isinstance(e, BrokenProcessPool):
+                self._discard(pool)
+            # Mark whatever did not finish
+            for entry in job["models"].values():
+                if entry["status"] in ("queued", "running"):
+                    entry.update(status="failed", error=str(e))
+
+        for name, fn in inline.items():
+            job["models"][name]["status"] = "running"
+            self._record(job["models"][name], lambda: measured(fn))
+
+        failed = sum(1 for m in job["models"].values() if m["status"] == "failed")
+        job["status"] = "succeeded" if not failed else ("failed" if failed == len(job["models"]) else "partial")
+        job["durationSeconds"] = time.perf_counter() - started
+        job["finishedAt"] = _now()
+
+    @staticmethod
+    def _record(entry, get_result):
+        try:
+            result, seconds, peak = get_result()
+        except Exception as e:
+            entry.update(status="failed", error=str(e), traceback=traceback.format_exc(limit=5))
+            return
+        failed = isinstance(result, dict) and "error" in result
+        entry.update(
+            status="failed" if failed else "succeeded",
+            durationSeconds=seconds,
+            peakRssMb=peak,
+            result=result,
+        )
+
+    def _trim(self):
+        finished = [j for j in self._jobs.values() if j["finishedAt"] is not None]
+        for job in sorted(finished, key=lambda j: j["finishedAt"])[:-MAX_FINISHED_JOBS]:
+            del self._jobs[job["id"]]
+
+    def get(self, job_id):
+        """Job status without the internal fields, or None for an unknown id."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            # Copies: the job thread keeps updating the entries while the caller serializes them
+            status = {k: v for k, v in job.items() if not k.startswith('_')}
+            status["models"] = {name: dict(entry) for name, entry in job["models"].items()}
+            return status
+
+    def wait(self, job_id, timeout=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            job["_thread"].join(timeout)
+        return self.get(job_id)
+
+    def summaries(self):
+        with self._lock:
+            return [
+                {k: job[k] for k in ("id", "status", "submittedAt", "finishedAt", "durationSeconds")}
+                for job in self._jobs.values()
+            ]
@@ -59,6 +59,9 @@ const wasteBinSchema = new Schema({
         type: String,
         required: true
     }
+}, {
+    // updatedAt lets the ML service refresh only the bins that changed
+    timestamps: true
 });
 
 export default mongoose.model("WasteBin", wasteBinSchema);
@@ -24,6 +24,7 @@ const optimizeDatabase = async () => {
     await WasteBin.collection.createIndex({ binType: 1 });
     await WasteBin.collection.createIndex({ sensorEnabled: 1 });
     await WasteBin.collection.createIndex({ realTimeCapacity: -1 });
+    await WasteBin.collection.createIndex({ updatedAt: -1 }); // For incremental ML snapshot refresh
     await WasteBin.collection.createIndex({ location: '2dsphere' }); // For geospatial queries
 
     // Create indexes for User collection
@@ -36,7 +37,7 @@ const optimizeDatabase = async () => {
     console.log('Database optimization completed successfully!');
     console.log('Indexes created for:');
     console.log('- UserReport: user_id, admin_status, wc_status, bin, createdAt');
-    console.log('- WasteBin: status, ward, zone, category, binType, sensorEnabled, realTimeCapacity, location');
+    console.log('- WasteBin: status, ward, zone, category, binType, sensorEnabled, realTimeCapacity, updatedAt, location');
     console.log('- User: phoneNo, email, isAdmin, isWasteCollector, blacklisted');
 
   } catch (error) {